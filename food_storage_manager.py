@@ -1,28 +1,203 @@
 import sqlite3
-import tkinter as tk
-from tkinter import ttk, messagebox
 import datetime
+import time
+import csv
+import json
+import queue
+import threading
+import functools
+import collections
+import os
+import re
+import sys
+import argparse
+import itertools
+import array
+import struct
+import weakref
+
+# tkinter is only imported when the GUI starts (see import_tkinter), so the library and the
+# command-line interface load quickly and work without a display
+tk = None
+ttk = None
+
+# numpy is optional: the quantity totals are vectorized when it is installed, see import_numpy
+numpy = None
 
 # Global variables
-global CONNECTION, CURSOR
+global DATABASE_WORKER, STATUS_LABEL
 global ROOT, ENTRY_NAME, ENTRY_QUANTITY, ENTRY_UNITY, ENTRY_EXPIRATION_DATE, FOOD_TYPE_NAME_COMBOBOX, FOOD_STORAGE_TREE
-global FOOD_TYPE_NAME_ENTRY, FOOD_TYPE_TREE, TAB_CONTROL
+global FOOD_TYPE_NAME_ENTRY, FOOD_TYPE_TREE, TAB_CONTROL, FOOD_STORAGE_SCROLLBAR, FOOD_STORAGE_SEARCH_ENTRY
+global DIAGNOSTICS_TREE, DIAGNOSTICS_ENABLED
+
+# Inventories bigger than VIRTUAL_TABLE_THRESHOLD are shown in the virtualized table mode:
+# the food storage Treeview only holds the visible rows plus FOOD_STORAGE_OVERSCAN_ROWS above and below,
+# and scrolling reads the pages it needs from the database.
+VIRTUAL_TABLE_THRESHOLD = 5000
+FOOD_STORAGE_VISIBLE_ROWS = 10
+FOOD_STORAGE_OVERSCAN_ROWS = 20
+FOOD_STORAGE_PAGE_SIZE = 100
+
+# Searching shows the best matches only, see search_food_storage
+FOOD_STORAGE_SEARCH_LIMIT = 200
+
+# Columns of the food storage Treeview; its listings read only these, as compact rows
+FOOD_STORAGE_TREE_COLUMNS = ("id", "name", "quantity", "unit", "food_type_name", "expiration_date")
+
+# Values currently shown by each Treeview, keyed by item id (the database id as a string)
+FOOD_STORAGE_ROWS = {}
+FOOD_TYPE_ROWS = {}
+DIAGNOSTICS_ROWS = {}
+
+FOOD_STORAGE_VIEW = {
+    "virtual": False,
+    "total": 0,
+    "first_visible": 0,
+    "rendered_from": 0,
+    "rendered_to": -1,
+    "pages": {},
+    "page_cursors": {},
+    "generation": 0,
+    "loading_pages": False,
+    "search_query": ""
+}
+
+# Refreshes of each view running on the database worker, see request_refresh
+PENDING_REFRESHES = {}
+
+# Changes made by other instances of the application are polled from the change_log table
+CHANGE_POLL_INTERVAL_MS = 1000
+CHANGE_POLL_LIMIT = 1000
+CHANGE_SYNC = {
+    "sequence": None,
+    "polling": False
+}
 
 
 # DATABASE SETTING UP
 
-def database_connection():
+DATABASE_PATH = 'food_storage.db'
+
+# With DATABASE_IN_MEMORY the database file is loaded into memory when a connection opens and every read and
+# write is served from memory, so commits do not wait for the disk. checkpoint_database saves it back to the
+# file with the online backup API, every CHECKPOINT_INTERVAL_SECONDS and when the application stops; the changes
+# made since the last checkpoint are lost if the process dies. Each checkpoint replaces the file, so no other
+# process may use it meanwhile.
+# The ":memory:" database is always in memory and never saved.
+DATABASE_IN_MEMORY = False
+CHECKPOINT_INTERVAL_SECONDS = 30
+
+
+class FoodStorageConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection of the application.
+    Connections with the same registry_key share the in-memory food type registry.
+    Connections to a database loaded into memory have the checkpoint_path of its file.
+    """
+    registry_key = None
+    checkpoint_path = None
+    # total_changes at the last checkpoint; -1 until the first one, which always saves
+    checkpoint_changes = -1
+
+
+def is_memory_database(database=None, in_memory=None):
+    """
+    :param database: str with the database file, DATABASE_PATH by default
+    :param in_memory: bool, DATABASE_IN_MEMORY by default
+    :return: bool, True when the connections to the database are served from memory
+    """
+    database = database or DATABASE_PATH
+    in_memory = DATABASE_IN_MEMORY if in_memory is None else in_memory
+
+    return in_memory or database == ":memory:"
+
+
+def open_database(database=None, in_memory=None, check_same_thread=True):
+    """
+    Open a configured connection to a database file, or to a copy of it in memory (see DATABASE_IN_MEMORY).
+    The schema is not migrated.
+
+    :param database: str with the database file, DATABASE_PATH by default
+    :param in_memory: bool, DATABASE_IN_MEMORY by default
+    :param check_same_thread: bool, passed to sqlite3.connect
+    :return: FoodStorageConnection
+    """
+    database = database or DATABASE_PATH
+
+    # ":memory:" is opened as it is, there is no file to load
+    if database == ":memory:" or not is_memory_database(database, in_memory):
+        connection = sqlite3.connect(database, check_same_thread=check_same_thread, factory=FoodStorageConnection)
+    else:
+        connection = sqlite3.connect(":memory:", check_same_thread=check_same_thread, factory=FoodStorageConnection)
+
+        if os.path.exists(database):
+            source = sqlite3.connect(database)
+            try:
+                source.backup(connection)
+            finally:
+                source.close()
+
+        connection.checkpoint_path = database
+
+    configure_connection(connection)
+
+    return connection
+
+
+def configure_connection(connection):
+    """
+    Tune a connection for the application:
+    - journal_mode=WAL lets readers work while another connection writes
+    - synchronous=NORMAL only syncs the WAL at checkpoints, which is safe in WAL mode
+    - busy_timeout waits for a locked database instead of failing at once
+    - cache_size keeps up to 16 MB of pages in memory
+    - a trace callback records the statements while the instrumentation is enabled
+
+    :param connection: sqlite3.Connection
+    :return: None
     """
-    Connect to the database and create tables if they do not exist.
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA busy_timeout = 5000")
+    connection.execute("PRAGMA cache_size = -16000")
+
+    with INSTRUMENTATION["lock"]:
+        INSTRUMENTATION["connections"].add(connection)
+
+        # The callback is only installed while it is needed, SQLite calls it for every statement
+        if INSTRUMENTATION["enabled"]:
+            connection.set_trace_callback(_trace_statement)
+
+
+def database_connection(database=None, in_memory=None):
+    """
+    Connect to the database and bring its schema up to date.
     The table schema is as follows:
     - food_storage: id, name, quantity, unit, food_type_id, expiration_date, created_at, updated_at
     - food_type: id, name, created_at, updated_at
+    - food_storage_search: FTS5 index of the food storage names and food type names, kept in sync by triggers
+    - food_type_summary: food_type_id, unit, item_count, total_quantity, nearest_expiration_date,
+      kept current by triggers on food_storage
+    - change_log: sequence, table_name, row_id, operation, changed_at, filled by triggers on both tables
+    - quantity_history: food_storage_id, changed_at, quantity, filled by triggers on food_storage
+
+    created_at and updated_at are stored as epoch seconds and expiration_date as a day number
+    (days since 1970-01-01). The CRUD functions convert them back to text.
+
+    :param database: str with the database file, DATABASE_PATH by default
+    :param in_memory: bool, serve the database from memory (see DATABASE_IN_MEMORY), DATABASE_IN_MEMORY by default
 
     :return: connection, cursor
     """
-    connection = sqlite3.connect('food_storage.db')
+    connection = open_database(database, in_memory)
     cursor = connection.cursor()
 
+    migrate_database(cursor)
+
+    return connection, cursor
+
+
+def _migration_create_tables(cursor):
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS food_type (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -45,510 +220,3921 @@ def database_connection():
         FOREIGN KEY (food_type_id) REFERENCES food_type (id)
     )
     """)
-    return connection, cursor
 
 
-def seed_food_types(cursor):
+def _migration_add_indexes(cursor):
+    # Older databases may hold duplicated food type names, which would make the UNIQUE index fail.
+    # Keep the oldest food type of each name and move the food storage items of the others to it.
+    cursor.execute("""
+    UPDATE food_storage
+    SET food_type_id = (
+        SELECT MIN(kept.id)
+        FROM food_type AS kept
+        JOIN food_type AS duplicated ON duplicated.name = kept.name
+        WHERE duplicated.id = food_storage.food_type_id
+    )
+    WHERE food_type_id NOT IN (SELECT MIN(id) FROM food_type GROUP BY name)
+    AND food_type_id IN (SELECT id FROM food_type)
+    """)
+
+    cursor.execute("""
+    DELETE FROM food_type
+    WHERE id NOT IN (SELECT MIN(id) FROM food_type GROUP BY name)
+    """)
+
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS food_type_name_index ON food_type (name)")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS food_storage_food_type_id_index
+    ON food_storage (food_type_id, expiration_date)
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS food_storage_expiration_date_index
+    ON food_storage (expiration_date)
+    """)
+
+
+def _migration_compact_columns(cursor):
+    # Timestamps become epoch seconds and expiration dates days since 1970-01-01.
+    # The old timestamps are local times, like datetime.datetime.now() wrote them.
+    # SQLite cannot change the type of a column, so both tables are rebuilt.
+    cursor.execute("SELECT name, seq FROM sqlite_sequence WHERE name IN ('food_type', 'food_storage')")
+    sequences = cursor.fetchall()
+
+    timestamp = "COALESCE(CAST(strftime('%s', {0}, 'utc') AS INTEGER), CAST(strftime('%s', 'now') AS INTEGER))"
+
+    # The old dates were checked with strptime, which also accepts unpadded dates like 2030-1-5 that julianday
+    # rejects, so they are converted with the same parser as the new ones
+    cursor.connection.create_function(
+        "food_storage_day_number", 1,
+        lambda date_text: _iso_date_to_day_number(date_text) if isinstance(date_text, str) else None,
+        deterministic=True
+    )
+
+    cursor.execute("""
+    CREATE TABLE food_type_compact (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL
+    )
+    """)
+    cursor.execute(f"""
+    INSERT INTO food_type_compact (id, name, created_at, updated_at)
+    SELECT id, name, {timestamp.format("created_at")}, {timestamp.format("updated_at")}
+    FROM food_type
+    """)
+    cursor.execute("DROP TABLE food_type")
+    cursor.execute("ALTER TABLE food_type_compact RENAME TO food_type")
+
+    cursor.execute("""
+    CREATE TABLE food_storage_compact (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        quantity REAL NOT NULL,
+        unit TEXT NOT NULL,
+        food_type_id INTEGER NOT NULL,
+        expiration_date INTEGER,
+        created_at INTEGER NOT NULL,
+        updated_at INTEGER NOT NULL,
+        FOREIGN KEY (food_type_id) REFERENCES food_type (id)
+    )
+    """)
+    cursor.execute(f"""
+    INSERT INTO food_storage_compact (id, name, quantity, unit, food_type_id, expiration_date, created_at, updated_at)
+    SELECT id, name, quantity, unit, food_type_id,
+        food_storage_day_number(expiration_date),
+        {timestamp.format("created_at")}, {timestamp.format("updated_at")}
+    FROM food_storage
+    """)
+    cursor.execute("DROP TABLE food_storage")
+    cursor.execute("ALTER TABLE food_storage_compact RENAME TO food_storage")
+
+    # Dropping the tables dropped their indexes and AUTOINCREMENT counters
+    _migration_add_indexes(cursor)
+
+    for name, seq in sequences:
+        cursor.execute("DELETE FROM sqlite_sequence WHERE name = ?", (name,))
+        cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, seq))
+
+
+def _migration_add_search_index(cursor):
+    # Full-text index over the food storage names and their food type names, keyed by food_storage.id.
+    # prefix='1 2 3' keeps short prefixes indexed so "m*" does not scan the whole term list.
+    cursor.execute("""
+    CREATE VIRTUAL TABLE food_storage_search USING fts5 (
+        name,
+        food_type_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '1 2 3'
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER food_storage_search_insert AFTER INSERT ON food_storage
+    BEGIN
+        INSERT INTO food_storage_search (rowid, name, food_type_name)
+        VALUES (new.id, new.name, (SELECT name FROM food_type WHERE id = new.food_type_id));
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER food_storage_search_update AFTER UPDATE OF name, food_type_id ON food_storage
+    BEGIN
+        UPDATE food_storage_search
+        SET name = new.name, food_type_name = (SELECT name FROM food_type WHERE id = new.food_type_id)
+        WHERE rowid = new.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER food_storage_search_delete AFTER DELETE ON food_storage
+    BEGIN
+        DELETE FROM food_storage_search WHERE rowid = old.id;
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER food_type_search_update AFTER UPDATE OF name ON food_type
+    BEGIN
+        UPDATE food_storage_search
+        SET food_type_name = new.name
+        WHERE rowid IN (SELECT id FROM food_storage WHERE food_type_id = new.id);
+    END
+    """)
+
+    cursor.execute("""
+    INSERT INTO food_storage_search (rowid, name, food_type_name)
+    SELECT food_storage.id, food_storage.name, food_type.name
+    FROM food_storage
+    LEFT JOIN food_type
+    ON food_storage.food_type_id = food_type.id
+    """)
+
+
+def _migration_add_type_summary(cursor):
+    # Per food type and unit totals, kept current by triggers so dashboards never aggregate food_storage.
+    # The nearest expiration date is only searched again, through food_storage_food_type_id_index,
+    # when the item holding it leaves the group.
+    cursor.execute("""
+    CREATE TABLE food_type_summary (
+        food_type_id INTEGER NOT NULL,
+        unit TEXT NOT NULL,
+        item_count INTEGER NOT NULL,
+        total_quantity REAL NOT NULL,
+        nearest_expiration_date INTEGER,
+        PRIMARY KEY (food_type_id, unit)
+    ) WITHOUT ROWID
+    """)
+
+    add_item = """
+        INSERT INTO food_type_summary (food_type_id, unit, item_count, total_quantity, nearest_expiration_date)
+        VALUES (new.food_type_id, new.unit, 1, new.quantity, new.expiration_date)
+        ON CONFLICT (food_type_id, unit) DO UPDATE SET
+            item_count = item_count + 1,
+            total_quantity = total_quantity + excluded.total_quantity,
+            nearest_expiration_date = COALESCE(
+                MIN(nearest_expiration_date, excluded.nearest_expiration_date),
+                nearest_expiration_date,
+                excluded.nearest_expiration_date
+            );
     """
-    Seed the food_type table with initial data.
+    remove_item = """
+        UPDATE food_type_summary SET
+            item_count = item_count - 1,
+            total_quantity = total_quantity - old.quantity,
+            nearest_expiration_date = CASE
+                WHEN old.expiration_date = nearest_expiration_date THEN (
+                    SELECT MIN(expiration_date)
+                    FROM food_storage
+                    WHERE food_type_id = old.food_type_id AND unit = old.unit
+                )
+                ELSE nearest_expiration_date
+            END
+        WHERE food_type_id = old.food_type_id AND unit = old.unit;
+
+        DELETE FROM food_type_summary
+        WHERE food_type_id = old.food_type_id AND unit = old.unit AND item_count = 0;
+    """
+
+    cursor.execute(f"""
+    CREATE TRIGGER food_type_summary_insert AFTER INSERT ON food_storage
+    BEGIN
+        {add_item}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER food_type_summary_update AFTER UPDATE OF quantity, unit, food_type_id, expiration_date
+    ON food_storage
+    BEGIN
+        {remove_item}
+        {add_item}
+    END
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER food_type_summary_delete AFTER DELETE ON food_storage
+    BEGIN
+        {remove_item}
+    END
+    """)
+
+    cursor.execute("""
+    INSERT INTO food_type_summary (food_type_id, unit, item_count, total_quantity, nearest_expiration_date)
+    SELECT food_type_id, unit, COUNT(*), SUM(quantity), MIN(expiration_date)
+    FROM food_storage
+    GROUP BY food_type_id, unit
+    """)
+
+
+def _migration_add_change_log(cursor):
+    # Every insert, update and delete of food types and food storage items gets a change_log row,
+    # so other instances of the application can apply the changes made since the last one they saw.
+    # AUTOINCREMENT keeps the sequence numbers increasing even after the oldest rows are pruned.
+    cursor.execute("""
+    CREATE TABLE change_log (
+        sequence INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        operation TEXT NOT NULL,
+        changed_at INTEGER NOT NULL
+    )
+    """)
+
+    for table_name in ("food_type", "food_storage"):
+        for operation, row in (("insert", "new"), ("update", "new"), ("delete", "old")):
+            cursor.execute(f"""
+            CREATE TRIGGER {table_name}_change_log_{operation} AFTER {operation.upper()} ON {table_name}
+            BEGIN
+                INSERT INTO change_log (table_name, row_id, operation, changed_at)
+                VALUES ('{table_name}', {row}.id, '{operation}', CAST(strftime('%s', 'now') AS INTEGER));
+            END
+            """)
+
+
+def _migration_add_quantity_history(cursor):
+    # Every quantity a food storage item had, so its consumption can be fitted, see forecast_depletion.
+    # The history of an item is clustered by its primary key, and one point per second is kept.
+    # Quantities in another unit cannot be compared, so changing the unit of an item starts a new history.
+    cursor.execute("""
+    CREATE TABLE quantity_history (
+        food_storage_id INTEGER NOT NULL,
+        changed_at INTEGER NOT NULL,
+        quantity REAL NOT NULL,
+        PRIMARY KEY (food_storage_id, changed_at)
+    ) WITHOUT ROWID
+    """)
+
+    cursor.execute("""
+    CREATE TRIGGER quantity_history_insert AFTER INSERT ON food_storage
+    BEGIN
+        INSERT OR REPLACE INTO quantity_history (food_storage_id, changed_at, quantity)
+        VALUES (new.id, new.updated_at, new.quantity);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER quantity_history_update AFTER UPDATE OF quantity, unit ON food_storage
+    WHEN new.quantity IS NOT old.quantity OR new.unit IS NOT old.unit
+    BEGIN
+        DELETE FROM quantity_history WHERE food_storage_id = new.id AND new.unit IS NOT old.unit;
+        INSERT OR REPLACE INTO quantity_history (food_storage_id, changed_at, quantity)
+        VALUES (new.id, new.updated_at, new.quantity);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER quantity_history_delete AFTER DELETE ON food_storage
+    BEGIN
+        DELETE FROM quantity_history WHERE food_storage_id = old.id;
+    END
+    """)
+
+    cursor.execute("""
+    INSERT INTO quantity_history (food_storage_id, changed_at, quantity)
+    SELECT id, updated_at, quantity FROM food_storage
+    """)
+
+
+def _migration_add_sort_indexes(cursor):
+    # One index per sort column of the food storage listings, so their keyset pages read a range of it
+    # instead of sorting the whole table. The rowid ends every index entry, which makes them (column, id).
+    for column in ("name", "quantity", "unit", "created_at", "updated_at"):
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS food_storage_{column}_index ON food_storage ({column})")
+
+
+# Each migration runs once, in order. The database schema version is the number of
+# migrations already applied and is kept in PRAGMA user_version.
+# Only append new migrations at the end of this list.
+MIGRATIONS = [
+    _migration_create_tables,
+    _migration_add_indexes,
+    _migration_compact_columns,
+    _migration_add_search_index,
+    _migration_add_type_summary,
+    _migration_add_change_log,
+    _migration_add_quantity_history,
+    _migration_add_sort_indexes,
+]
+
+
+def migrate_database(cursor):
+    """
+    Apply the pending schema migrations to the database.
+    Every migration runs in its own transaction together with the user_version bump,
+    so an interrupted upgrade leaves the database at the last completed version.
+    The version is read again once the write lock is held, so a migration already applied by another
+    process upgrading the same database at the same time is skipped.
 
     :param cursor: sqlite3.Cursor
-    :return: None
+    :return: int with the schema version of the database
     """
-    food_types = [
-        ('Fruit',),
-        ('Vegetable',),
-        ('Grain',),
-        ('Protein',),
-        ('Dairy',),
-        ('Beverage',),
-        ('Snack',),
-        ('Condiment',),
-        ('Frozen',),
-        ('Canned',),
-        ('Baking',),
-        ('Spice',),
-        ('Other',)
-    ]
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
 
-    for food_type in food_types:
-        create_food_type(cursor, food_type[0])
+    if cursor.connection.in_transaction:
+        cursor.connection.commit()
 
+    while version < len(MIGRATIONS):
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("PRAGMA user_version")
+            version = cursor.fetchone()[0]
 
-# CRUD OPERATIONS FOR FOOD TYPES
+            if version >= len(MIGRATIONS):
+                cursor.connection.rollback()
+                break
 
-def create_food_type(cursor, name):
+            MIGRATIONS[version](cursor)
+            cursor.execute(f"PRAGMA user_version = {version + 1}")
+        except BaseException:
+            cursor.connection.rollback()
+            raise
+        cursor.connection.commit()
+        version += 1
+        invalidate_food_type_registry()
+
+    return version
+
+
+def _begin_savepoint(cursor, name):
     """
-    Create a new food type in the database.
+    Open a savepoint so a multi-statement operation can be rolled back on its own.
+    A transaction is started first when none is open, so releasing the savepoint
+    never commits on behalf of the caller.
 
     :param cursor: sqlite3.Cursor
     :param name: str
+    :return: None
+    """
+    if not cursor.connection.in_transaction:
+        cursor.execute("BEGIN")
+    cursor.execute(f"SAVEPOINT {name}")
 
-    :return: dict
+
+def _release_savepoint(cursor, name):
+    cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+
+def _rollback_savepoint(cursor, name):
+    cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+    cursor.execute(f"RELEASE SAVEPOINT {name}")
+
+
+_EPOCH_DATE_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def _date_to_day_number(date):
+    return date.toordinal() - _EPOCH_DATE_ORDINAL
+
+
+def _day_number_to_text(day_number):
+    if day_number is None:
+        return None
+
+    return datetime.date.fromordinal(day_number + _EPOCH_DATE_ORDINAL).isoformat()
+
+
+@functools.lru_cache(maxsize=65536)
+def _iso_date_to_day_number(date_text):
     """
-    if not name or name.isspace():
-        return "A food type name cannot be empty."
+    Parse a YYYY-MM-DD date without strptime, which is slow and the bulk of validating a batch.
+    Inventories repeat few dates, so the parsed ones are cached.
+
+    :param date_text: str
+    :return: int with the day number, or None when the text is not a valid date
+    """
+    if len(date_text) == 10 and date_text[4] == "-" and date_text[7] == "-":
+        year, month, day = date_text[:4], date_text[5:7], date_text[8:]
+
+        if year.isascii() and year.isdigit() and month.isascii() and month.isdigit() and day.isascii() and \
+                day.isdigit():
+            try:
+                return datetime.date(int(year), int(month), int(day)).toordinal() - _EPOCH_DATE_ORDINAL
+            except ValueError:
+                return None
+
+    # strptime also accepts single-digit months and days
+    try:
+        return _date_to_day_number(datetime.datetime.strptime(date_text, "%Y-%m-%d").date())
+    except ValueError:
+        return None
+
+
+def _date_text_to_day_number(date_text):
+    day_number = _iso_date_to_day_number(date_text)
+
+    if day_number is None:
+        raise ValueError(f"Invalid date {date_text!r}.")
+
+    return day_number
+
+
+def _timestamp_now():
+    return int(time.time())
+
+
+def _timestamp_to_text(timestamp):
+    # Same text as strftime("%Y-%m-%d %H:%M:%S"), several times faster
+    return datetime.datetime.fromtimestamp(timestamp).isoformat(" ", "seconds")
+
+
+# INSTRUMENTATION
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000,
+                      10000, float("inf")]
+
+INSTRUMENTATION = {
+    "enabled": False,
+    "lock": threading.Lock(),
+    # Histograms keyed by "kind:name", see instrumented
+    "operations": {},
+    # Statement counts keyed by (operation, normalized statement)
+    "statements": {},
+    "recent_statements": collections.deque(maxlen=500),
+    # Open connections, which get the trace callback while the instrumentation is enabled
+    "connections": weakref.WeakSet()
+}
+
+_INSTRUMENTATION_CONTEXT = threading.local()
+
+_STATEMENT_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def enable_instrumentation():
+    """
+    Start recording the latency of the instrumented functions and the statements sent to SQLite.
+    The instrumentation is off by default and costs one flag check per call while it is off.
+    """
+    _set_trace_callbacks(True)
+
+
+def disable_instrumentation():
+    _set_trace_callbacks(False)
+
+
+def _set_trace_callbacks(enabled):
+    with INSTRUMENTATION["lock"]:
+        INSTRUMENTATION["enabled"] = enabled
+
+        for connection in list(INSTRUMENTATION["connections"]):
+            try:
+                connection.set_trace_callback(_trace_statement if enabled else None)
+            except sqlite3.ProgrammingError:
+                # Closed, or bound to another thread, which then goes without the statement trace
+                pass
+
+
+def reset_instrumentation():
+    with INSTRUMENTATION["lock"]:
+        INSTRUMENTATION["operations"].clear()
+        INSTRUMENTATION["statements"].clear()
+        INSTRUMENTATION["recent_statements"].clear()
+
+
+def _current_operations():
+    if not hasattr(_INSTRUMENTATION_CONTEXT, "operations"):
+        _INSTRUMENTATION_CONTEXT.operations = []
+
+    return _INSTRUMENTATION_CONTEXT.operations
+
+
+def _result_row_count(result):
+    if isinstance(result, list):
+        return len(result)
+
+    if isinstance(result, dict):
+        return len(result["food_storage"]) if "food_storage" in result else 1
+
+    return 0
+
+
+def record_latency(name, seconds, rows=0, changes=0, error=False):
+    """
+    Add one call to the latency histogram of an operation.
+
+    :param name: str, "kind:name" of the operation
+    :param seconds: float
+    :param rows: int with the number of rows returned
+    :param changes: int with the number of rows inserted, updated or deleted, triggers included
+    :param error: bool, True when the call returned an error message or raised
+    """
+    milliseconds = seconds * 1000
+    bucket = next(index for index, bound in enumerate(LATENCY_BUCKETS_MS) if milliseconds <= bound)
+
+    with INSTRUMENTATION["lock"]:
+        histogram = INSTRUMENTATION["operations"].get(name)
+
+        if histogram is None:
+            histogram = INSTRUMENTATION["operations"][name] = {
+                "count": 0,
+                "errors": 0,
+                "total_ms": 0.0,
+                "min_ms": milliseconds,
+                "max_ms": milliseconds,
+                "rows": 0,
+                "changes": 0,
+                "buckets": [0] * len(LATENCY_BUCKETS_MS)
+            }
+
+        histogram["count"] += 1
+        histogram["errors"] += error
+        histogram["total_ms"] += milliseconds
+        histogram["min_ms"] = min(histogram["min_ms"], milliseconds)
+        histogram["max_ms"] = max(histogram["max_ms"], milliseconds)
+        histogram["rows"] += rows
+        histogram["changes"] += changes
+        histogram["buckets"][bucket] += 1
+
+
+def instrumented(kind):
+    """
+    Record the latency of every call of a function while the instrumentation is enabled.
+    When the first argument is a sqlite3.Cursor the rows changed by the call are recorded too.
+
+    :param kind: str grouping the operations, like "crud" or "gui"
+    """
+    def decorator(function):
+        name = f"{kind}:{function.__name__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not INSTRUMENTATION["enabled"]:
+                return function(*args, **kwargs)
+
+            connection = args[0].connection if args and isinstance(args[0], sqlite3.Cursor) else None
+            total_changes = connection.total_changes if connection is not None else 0
+            operations = _current_operations()
+            operations.append(name)
+            start = time.perf_counter()
+
+            try:
+                result = function(*args, **kwargs)
+            except BaseException:
+                record_latency(name, time.perf_counter() - start, error=True)
+                raise
+            finally:
+                operations.pop()
+
+            changes = connection.total_changes - total_changes if connection is not None else 0
+            record_latency(name, time.perf_counter() - start, _result_row_count(result), changes,
+                           isinstance(result, str))
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _trace_statement(statement):
+    if not INSTRUMENTATION["enabled"]:
+        return
+
+    operations = _current_operations()
+    operation = operations[-1] if operations else ""
+    # Bound values are inlined in the traced statement, so they are masked to group its executions.
+    # Each step of a trigger is reported again with the statement that fired it.
+    normalized_statement = " ".join(_STATEMENT_LITERALS.sub("?", statement).split())
+
+    with INSTRUMENTATION["lock"]:
+        key = (operation, normalized_statement)
+        INSTRUMENTATION["statements"][key] = INSTRUMENTATION["statements"].get(key, 0) + 1
+        INSTRUMENTATION["recent_statements"].append({
+            "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "thread": threading.current_thread().name,
+            "operation": operation,
+            "statement": statement
+        })
+
+
+def _histogram_percentile(histogram, fraction):
+    # Upper bound of the bucket holding the percentile, capped by the slowest call
+    rank = fraction * histogram["count"]
+    seen = 0
+
+    for bound, count in zip(LATENCY_BUCKETS_MS, histogram["buckets"]):
+        seen += count
+        if seen >= rank:
+            return min(bound, histogram["max_ms"])
+
+    return histogram["max_ms"]
+
+
+def read_instrumentation():
+    """
+    Retrieve a snapshot of the recorded latencies and statements.
+
+    Returns (dict):
+        - enabled: bool
+        - operations: list of dictionaries, slowest in total first
+            - Each dictionary contains the following
+                - operation: str
+                - count: int
+                - errors: int
+                - total_ms: float
+                - mean_ms: float
+                - min_ms: float
+                - p50_ms: float (upper bound of its histogram bucket)
+                - p99_ms: float (upper bound of its histogram bucket)
+                - max_ms: float
+                - rows: int
+                - changes: int
+                - buckets: dict of bucket upper bound (str, milliseconds) to count
+        - statements: list of dictionaries with operation, statement and count, most executed first
+        - recent_statements: list of dictionaries with time, thread, operation and statement, oldest first
+    """
+    with INSTRUMENTATION["lock"]:
+        operations = [(name, dict(histogram, buckets=list(histogram["buckets"])))
+                      for name, histogram in INSTRUMENTATION["operations"].items()]
+        statements = list(INSTRUMENTATION["statements"].items())
+        recent_statements = list(INSTRUMENTATION["recent_statements"])
+
+    return {
+        "enabled": INSTRUMENTATION["enabled"],
+        "operations": sorted(({
+            "operation": name,
+            "count": histogram["count"],
+            "errors": histogram["errors"],
+            "total_ms": histogram["total_ms"],
+            "mean_ms": histogram["total_ms"] / histogram["count"],
+            "min_ms": histogram["min_ms"],
+            "p50_ms": _histogram_percentile(histogram, 0.50),
+            "p99_ms": _histogram_percentile(histogram, 0.99),
+            "max_ms": histogram["max_ms"],
+            "rows": histogram["rows"],
+            "changes": histogram["changes"],
+            "buckets": {str(bound): count for bound, count in zip(LATENCY_BUCKETS_MS, histogram["buckets"])}
+        } for name, histogram in operations), key=lambda operation: operation["total_ms"], reverse=True),
+        "statements": [{"operation": operation, "statement": statement, "count": count}
+                       for (operation, statement), count in sorted(statements, key=lambda item: item[1],
+                                                                  reverse=True)],
+        "recent_statements": recent_statements
+    }
+
+
+def dump_instrumentation(file_path):
+    """
+    Write a snapshot of the instrumentation to a file: the whole snapshot of read_instrumentation
+    when the file name ends with .json, otherwise the operation latencies as CSV.
+
+    :param file_path: str
+    :return: None
+    """
+    snapshot = read_instrumentation()
+
+    if file_path.lower().endswith(".json"):
+        with open(file_path, "w", encoding="utf-8") as json_file:
+            json.dump(snapshot, json_file, indent=2)
+        return
+
+    columns = ["operation", "count", "errors", "total_ms", "mean_ms", "min_ms", "p50_ms", "p99_ms", "max_ms",
+               "rows", "changes"]
+
+    with open(file_path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(snapshot["operations"])
+
+
+# DATABASE REPOSITORY
+
+class FoodStorageRepository:
+    """
+    Thread-safe access to the database through a pool of connections.
+    In WAL mode any number of readers run in parallel with the writer; writes are serialized by a lock
+    and each one runs in its own transaction.
+
+    The module-level CRUD functions accept a repository in place of a cursor, for example
+    read_all_food_storage(repository), and then run on a pooled connection.
+
+    A database served from memory (see DATABASE_IN_MEMORY) lives in a single connection, so the pool holds only
+    that one; it is checkpointed to its file every checkpoint_interval seconds and when the repository closes.
+    """
+
+    def __init__(self, database=None, pool_size=4, in_memory=None, checkpoint_interval=None):
+        self.database = database or DATABASE_PATH
+        self.in_memory = is_memory_database(self.database, in_memory)
+        self.pool_size = 1 if self.in_memory else pool_size
+        self.checkpoint_interval = checkpoint_interval or CHECKPOINT_INTERVAL_SECONDS
+        self._connections = []
+        self._idle_connections = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+        connection = self._open_connection()
+        migrate_database(connection.cursor())
+        self._idle_connections.put(connection)
+
+        self._checkpoint_stop = threading.Event()
+        self._checkpoint_thread = None
+
+        if connection.checkpoint_path is not None:
+            self._checkpoint_thread = threading.Thread(target=self._checkpoint_periodically,
+                                                       name="database-checkpoint", daemon=True)
+            self._checkpoint_thread.start()
+
+    def _open_connection(self):
+        connection = open_database(self.database, self.in_memory, check_same_thread=False)
+        # Every write commits or rolls back (dropping the registry) before its connection is reused,
+        # so the pooled connections can share the food types read by any of them
+        connection.registry_key = self
+        self._connections.append(connection)
+        return connection
+
+    def _acquire(self):
+        try:
+            return self._idle_connections.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if len(self._connections) < self.pool_size:
+                return self._open_connection()
+
+        return self._idle_connections.get()
+
+    def _release(self, connection):
+        self._idle_connections.put(connection)
+
+    def read(self, function, *args, **kwargs):
+        """
+        Run a function that only reads from the database on a pooled connection.
+
+        :param function: callable taking a sqlite3.Cursor as first argument
+        :return: the result of the function
+        """
+        connection = self._acquire()
+        try:
+            return function(connection.cursor(), *args, **kwargs)
+        finally:
+            if connection.in_transaction:
+                connection.rollback()
+            self._release(connection)
+
+    def write(self, function, *args, **kwargs):
+        """
+        Run a function that changes the database in its own transaction.
+        The transaction is committed, or rolled back when the function returns an error message or raises.
+
+        :param function: callable taking a sqlite3.Cursor as first argument
+        :return: the result of the function
+        """
+        with self._write_lock:
+            connection = self._acquire()
+            try:
+                cursor = connection.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                result = function(cursor, *args, **kwargs)
+            except BaseException:
+                connection.rollback()
+                # The registry may hold food types of the rolled back transaction
+                invalidate_food_type_registry()
+                raise
+            else:
+                if isinstance(result, str):
+                    connection.rollback()
+                    invalidate_food_type_registry()
+                else:
+                    connection.commit()
+                    _publish_food_type_registry(connection)
+                return result
+            finally:
+                self._release(connection)
+
+    def _checkpoint_periodically(self):
+        while not self._checkpoint_stop.wait(self.checkpoint_interval):
+            try:
+                checkpoint_database(self)
+            except (OSError, sqlite3.Error) as e:
+                # The next checkpoint tries again
+                print(f"Checkpoint of {self.database} failed: {e}", file=sys.stderr)
+
+    def close(self):
+        if self._checkpoint_thread is not None:
+            self._checkpoint_stop.set()
+            self._checkpoint_thread.join()
+            self._checkpoint_thread = None
+            checkpoint_database(self)
+
+        with self._pool_lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
+            self._idle_connections = queue.LifoQueue()
+
+
+def _repository_operation(writes):
+    """
+    Let a CRUD function be called with a FoodStorageRepository in place of its cursor,
+    and record its latency while the instrumentation is enabled.
+
+    :param writes: bool, True when the function changes the database
+    """
+    def decorator(function):
+        function = instrumented("crud")(function)
+
+        @functools.wraps(function)
+        def wrapper(cursor, *args, **kwargs):
+            if isinstance(cursor, FoodStorageRepository):
+                if writes:
+                    return cursor.write(function, *args, **kwargs)
+                return cursor.read(function, *args, **kwargs)
+
+            return function(cursor, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@_repository_operation(writes=True)
+def seed_food_types(cursor):
+    """
+    Seed the food_type table with initial data.
+
+    :param cursor: sqlite3.Cursor
+    :return: None
+    """
+    food_types = [
+        ('Fruit',),
+        ('Vegetable',),
+        ('Grain',),
+        ('Protein',),
+        ('Dairy',),
+        ('Beverage',),
+        ('Snack',),
+        ('Condiment',),
+        ('Frozen',),
+        ('Canned',),
+        ('Baking',),
+        ('Spice',),
+        ('Other',)
+    ]
+
+    for food_type in food_types:
+        create_food_type(cursor, food_type[0])
+
+
+def seed_empty_database(cursor):
+    if not read_all_food_types(cursor):
+        seed_food_types(cursor)
+
+
+# FOOD TYPE REGISTRY
+
+# Food types are few and rarely change, so they are read once and kept in memory.
+# The registry belongs to the connection it was loaded from, or to all the connections of a
+# FoodStorageRepository, and is read again when another connection is used.
+# The food type CRUD functions keep it up to date; changes made to the food_type table in any other way
+# must be followed by invalidate_food_type_registry().
+# Changes made inside a transaction are only seen by its connection. Once the transaction ends the registry is
+# read again, unless FoodStorageRepository.write published it on commit.
+FOOD_TYPE_REGISTRY = {
+    "key": None,
+    # Connection whose open transaction made changes to the registry
+    "transaction": None,
+    "by_id": {},
+    "by_name": {}
+}
+
+
+def invalidate_food_type_registry():
+    """
+    Drop the in-memory food types, so they are read again from the database on next use.
+
+    :return: None
+    """
+    FOOD_TYPE_REGISTRY["key"] = None
+    FOOD_TYPE_REGISTRY["transaction"] = None
+    FOOD_TYPE_REGISTRY["by_id"] = {}
+    FOOD_TYPE_REGISTRY["by_name"] = {}
+
+
+def _publish_food_type_registry(connection):
+    """
+    Keep the registry changes of a connection's transaction after it was committed.
+
+    :param connection: sqlite3.Connection
+    :return: None
+    """
+    if FOOD_TYPE_REGISTRY["transaction"] is connection:
+        FOOD_TYPE_REGISTRY["transaction"] = None
+
+
+def _food_type_row_to_dict(food_type):
+    return {
+        "id": food_type[0],
+        "name": food_type[1],
+        "created_at": _timestamp_to_text(food_type[2]),
+        "updated_at": _timestamp_to_text(food_type[3])
+    }
+
+
+def _load_food_type_registry(cursor):
+    """
+    Return the food type registry of the cursor's connection, reading the food types when needed.
+
+    :param cursor: sqlite3.Cursor
+    :return: dict with by_id and by_name maps
+    """
+    key = getattr(cursor.connection, "registry_key", None) or cursor.connection
+    transaction = FOOD_TYPE_REGISTRY["transaction"]
+
+    transaction_open = transaction is not None and _transaction_is_open(transaction)
+
+    if transaction_open and transaction is not cursor.connection:
+        # The registry holds the uncommitted changes of another connection, this one gets its own copy
+        return _read_food_type_registry(cursor, key)
+
+    if transaction is not None and not transaction_open:
+        # Committed or rolled back, the registry can't tell which
+        invalidate_food_type_registry()
+
+    if FOOD_TYPE_REGISTRY["key"] is not key:
+        FOOD_TYPE_REGISTRY.update(_read_food_type_registry(cursor, key))
+
+    return FOOD_TYPE_REGISTRY
+
+
+def _transaction_is_open(connection):
+    try:
+        return connection.in_transaction
+    except sqlite3.ProgrammingError:
+        # Closed, which rolled back its transaction
+        return False
+
+
+def _read_food_type_registry(cursor, key):
+    cursor.execute("SELECT * FROM food_type ORDER BY id")
+    food_types = [_food_type_row_to_dict(food_type) for food_type in cursor.fetchall()]
+
+    return {
+        "key": key,
+        "transaction": None,
+        "by_id": {food_type["id"]: food_type for food_type in food_types},
+        "by_name": {food_type["name"]: food_type for food_type in food_types}
+    }
+
+
+def _food_type_registry_for_change(cursor):
+    registry = _load_food_type_registry(cursor)
+
+    if registry is FOOD_TYPE_REGISTRY and cursor.connection.in_transaction:
+        FOOD_TYPE_REGISTRY["transaction"] = cursor.connection
+
+    return registry
+
+
+def _register_food_type(cursor, food_type):
+    registry = _food_type_registry_for_change(cursor)
+    previous_food_type = registry["by_id"].get(food_type["id"])
+
+    if previous_food_type is not None:
+        del registry["by_name"][previous_food_type["name"]]
+
+    registry["by_id"][food_type["id"]] = food_type
+    registry["by_name"][food_type["name"]] = food_type
+
+
+def _unregister_food_type(cursor, food_type_id):
+    registry = _food_type_registry_for_change(cursor)
+    food_type = registry["by_id"].pop(food_type_id, None)
+
+    if food_type is not None:
+        del registry["by_name"][food_type["name"]]
+
+
+# CRUD OPERATIONS FOR FOOD TYPES
+
+@_repository_operation(writes=True)
+def create_food_type(cursor, name):
+    """
+    Create a new food type in the database.
+
+    :param cursor: sqlite3.Cursor
+    :param name: str
+
+    :return: dict
+    """
+    if not name or name.isspace():
+        return "A food type name cannot be empty."
+
+    name = name.strip()
+
+    if name in _load_food_type_registry(cursor)["by_name"]:
+        return "A food type with this name already exists."
+
+    created_at = _timestamp_now()
+    updated_at = created_at
+
+    # The unique name index catches names created by another connection since the registry was read
+    try:
+        cursor.execute("""
+        INSERT INTO food_type (name, created_at, updated_at)
+        VALUES (?, ?, ?)
+        RETURNING id, name, created_at, updated_at
+        """, (name, created_at, updated_at))
+    except sqlite3.IntegrityError:
+        return "A food type with this name already exists."
+
+    new_food_type = _food_type_row_to_dict(cursor.fetchone())
+
+    _register_food_type(cursor, new_food_type)
+
+    return dict(new_food_type)
+
+
+@_repository_operation(writes=False)
+def read_all_food_types(cursor):
+    """
+    Retrieve all food types from the database.
+
+    :param cursor: sqlite3.Cursor
+
+    Returns (list):
+    list of dictionaries
+        - Each dictionary contains the following
+            - id: int
+            - name: str
+            - created_at: str
+            - updated_at: str
+    """
+    food_types = _load_food_type_registry(cursor)["by_id"]
+
+    return [dict(food_types[food_type_id]) for food_type_id in sorted(food_types)]
+
+
+@_repository_operation(writes=False)
+def read_food_type_by_id(cursor, food_type_id):
+    """
+    Retrieve a food type by id from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param food_type_id: int
+
+    Returns (dict):
+        - id: int
+        - name: str
+        - created_at: str
+        - updated_at: str
+    """
+    try:
+        food_type = _load_food_type_registry(cursor)["by_id"].get(int(food_type_id))
+    except (TypeError, ValueError):
+        food_type = None
+
+    if food_type is None:
+        return 'A food type with this id does not exist.'
+
+    return dict(food_type)
+
+
+@_repository_operation(writes=False)
+def read_food_type_by_name(cursor, food_type_name):
+    """
+    Retrieve a food type by name from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param food_type_name: str
+
+    Returns (dict):
+        - id: int
+        - name: str
+        - created_at: str
+        - updated_at: str
+    """
+    food_type = _load_food_type_registry(cursor)["by_name"].get(food_type_name)
+
+    if food_type is None:
+        return 'A food type with this name does not exist.'
+
+    return dict(food_type)
+
+
+@_repository_operation(writes=True)
+def update_food_type_by_id(cursor, food_type_id, name):
+    """
+    Update a food type by id in the database.
+
+    :param cursor: sqlite3.Cursor
+    :param food_type_id: int
+    :param name: str
+
+    Returns (dict):
+        - id: int
+        - name: str
+        - created_at: str
+        - updated_at: str
+    """
+    existing_food_type = read_food_type_by_id(cursor, food_type_id)
+
+    if isinstance(existing_food_type, str):
+        return existing_food_type
+
+    if existing_food_type["name"] == "Other":
+        return "Cannot update the default food type."
+
+    if not name or name.isspace():
+        return "A food type name cannot be empty."
+
+    if name in _load_food_type_registry(cursor)["by_name"]:
+        return "A food type with this name already exists."
+
+    updated_at = _timestamp_now()
+
+    try:
+        cursor.execute("""
+        UPDATE food_type
+        SET name = ?, updated_at = ?
+        WHERE id = ?
+        RETURNING id, name, created_at, updated_at
+        """, (name, updated_at, existing_food_type["id"]))
+    except sqlite3.IntegrityError:
+        return "A food type with this name already exists."
+
+    food_type = cursor.fetchone()
+
+    # Deleted by another connection since the registry was read
+    if food_type is None:
+        _unregister_food_type(cursor, food_type_id)
+        return "A food type with this id does not exist."
+
+    food_type = _food_type_row_to_dict(food_type)
+
+    _register_food_type(cursor, food_type)
+
+    return dict(food_type)
+
+
+@_repository_operation(writes=True)
+def delete_food_type_by_id(cursor, food_type_id):
+    """
+    Delete a food type by id from the database.
+    Its food storage items are moved to the default food type "Other".
+
+    :param cursor: sqlite3.Cursor
+    :param food_type_id: int
+    :return: str
+    """
+    existing_food_type = read_food_type_by_id(cursor, food_type_id)
+
+    if isinstance(existing_food_type, str):
+        return existing_food_type
+
+    if existing_food_type["name"] == "Other":
+        return "Cannot delete the default food type."
+
+    default_food_type = read_food_type_by_name(cursor, "Other")
+
+    if isinstance(default_food_type, str):
+        return default_food_type
+
+    updated_at = _timestamp_now()
+
+    # The food storage items of the deleted food type are moved to "Other" in the same savepoint,
+    # through the food_type_id index, so only the rows of this food type are touched.
+    _begin_savepoint(cursor, "delete_food_type")
+
+    try:
+        cursor.execute("""
+        UPDATE food_storage
+        SET food_type_id = ?, updated_at = ?
+        WHERE food_type_id = ?
+        """, (default_food_type["id"], updated_at, existing_food_type["id"]))
+
+        cursor.execute("""
+        DELETE FROM food_type
+        WHERE id = ?
+        """, (existing_food_type["id"],))
+    except sqlite3.Error:
+        _rollback_savepoint(cursor, "delete_food_type")
+        raise
+
+    _release_savepoint(cursor, "delete_food_type")
+
+    _unregister_food_type(cursor, existing_food_type["id"])
+
+
+@_repository_operation(writes=True)
+def reassign_orphaned_food_storage(cursor):
+    """
+    Move the food storage items whose food type no longer exists to the default food type "Other".
+    Runs as a single UPDATE, so it is only needed to repair databases edited outside of
+    delete_food_type_by_id, which already moves the items of the deleted food type.
+
+    :param cursor: sqlite3.Cursor
+    :return: int with the number of moved items, or str with the error
+    """
+    default_food_type = read_food_type_by_name(cursor, "Other")
+
+    if isinstance(default_food_type, str):
+        return default_food_type
+
+    cursor.execute("""
+    UPDATE food_storage
+    SET food_type_id = ?, updated_at = ?
+    WHERE food_type_id NOT IN (SELECT id FROM food_type)
+    """, (default_food_type["id"], _timestamp_now()))
+
+    return cursor.rowcount
+
+
+@_repository_operation(writes=False)
+def read_food_type_summary(cursor):
+    """
+    Retrieve the inventory totals of every food type.
+    The totals are read from the food_type_summary table, so the cost depends on the number of food types
+    and units only, not on the number of food storage items.
+
+    :param cursor: sqlite3.Cursor
+
+    Returns (list):
+    list of dictionaries, ordered by id
+        - Each dictionary contains the following
+            - id: int
+            - name: str
+            - item_count: int
+            - quantities: dict of unit to the total quantity of the items in that unit
+            - nearest_expiration_date: str, or None when no item has an expiration date
+    """
+    cursor.execute("""
+        SELECT
+            food_type.id,
+            food_type.name,
+            food_type_summary.unit,
+            food_type_summary.item_count,
+            food_type_summary.total_quantity,
+            food_type_summary.nearest_expiration_date
+        FROM food_type
+        LEFT JOIN food_type_summary
+        ON food_type_summary.food_type_id = food_type.id
+        ORDER BY food_type.id, food_type_summary.unit
+    """)
+
+    summary = []
+
+    for food_type_id, name, unit, item_count, total_quantity, nearest_expiration_date in cursor.fetchall():
+        if not summary or summary[-1]["id"] != food_type_id:
+            summary.append({
+                "id": food_type_id,
+                "name": name,
+                "item_count": 0,
+                "quantities": {},
+                "nearest_expiration_date": None
+            })
+
+        if unit is None:
+            continue
+
+        food_type = summary[-1]
+        food_type["item_count"] += item_count
+        # The totals are kept by adding and subtracting, so float noise is rounded away
+        food_type["quantities"][unit] = round(total_quantity, 9)
+
+        if nearest_expiration_date is not None:
+            nearest_expiration_date = _day_number_to_text(nearest_expiration_date)
+            if food_type["nearest_expiration_date"] is None or \
+                    nearest_expiration_date < food_type["nearest_expiration_date"]:
+                food_type["nearest_expiration_date"] = nearest_expiration_date
+
+    return summary
+
+
+# VALIDATION FOR FOOD STORAGE
+
+# The single writes, the bulk import and the GUI all check the food storage inputs with check_food_storage_fields,
+# so they accept the same values and give the same messages.
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and (not value or value.isspace()))
+
+
+def check_food_storage_fields(food_storage, food_types_by_id=None, food_types_by_name=None):
+    """
+    Check every field of a food storage item, collecting all the errors instead of stopping at the first.
+    The food type is given by food_type_id or, when that is empty, by food_type_name. It is only looked up
+    when the food type maps are given, otherwise it is kept as given.
+
+    :param food_storage: dict with the keys name, quantity, unit, food_type_id or food_type_name, expiration_date
+    :param food_types_by_id: dict of id to food type, like the by_id map of the food type registry
+    :param food_types_by_name: dict of name to food type, like the by_name map of the food type registry
+
+    Returns (tuple):
+        - tuple (name, quantity, unit, food_type, expiration_day) with the cleaned values, or None when invalid
+        - list of (field, message) tuples in the order of the fields, empty when the item is valid
+    """
+    errors = []
+
+    name = food_storage.get("name")
+
+    if _is_blank(name):
+        errors.append(("name", "Name cannot be empty."))
+    elif not isinstance(name, str):
+        errors.append(("name", "Name must be text."))
+    else:
+        name = name.strip()
+
+    quantity = food_storage.get("quantity")
+
+    if _is_blank(quantity):
+        errors.append(("quantity", "Quantity cannot be empty."))
+    else:
+        try:
+            quantity = float(quantity)
+        except (TypeError, ValueError):
+            errors.append(("quantity", "Quantity must be a number."))
+        else:
+            # NaN passes every comparison, so it is rejected with the infinities
+            if quantity != quantity or quantity in (float("inf"), float("-inf")):
+                errors.append(("quantity", "Quantity must be a number."))
+            elif quantity < 0:
+                errors.append(("quantity", "Quantity cannot be negative."))
+
+    unit = food_storage.get("unit")
+
+    if _is_blank(unit):
+        errors.append(("unit", "Unit cannot be empty."))
+    elif not isinstance(unit, str):
+        errors.append(("unit", "Unit must be text."))
+    else:
+        unit = unit.strip()
+
+    food_type = food_storage.get("food_type_id")
+
+    if not _is_blank(food_type):
+        if food_types_by_id is not None:
+            try:
+                food_type = food_types_by_id[int(food_type)]["id"]
+            except (KeyError, TypeError, ValueError):
+                errors.append(("food_type_id", "A food type with this id does not exist."))
+    else:
+        food_type = food_storage.get("food_type_name")
+
+        if _is_blank(food_type):
+            errors.append(("food_type_name", "Food Type cannot be empty."))
+        elif food_types_by_name is not None:
+            try:
+                food_type = food_types_by_name[food_type]["id"]
+            except (KeyError, TypeError):
+                errors.append(("food_type_name", "A food type with this name does not exist."))
+
+    expiration_date = food_storage.get("expiration_date")
+    expiration_day = None
+
+    if _is_blank(expiration_date):
+        errors.append(("expiration_date", "Expiration Date cannot be empty."))
+    else:
+        if isinstance(expiration_date, str):
+            expiration_day = _iso_date_to_day_number(expiration_date)
+
+        if expiration_day is None:
+            errors.append(("expiration_date", "Expiration Date must be in the format YYYY-MM-DD."))
+
+    if errors:
+        return None, errors
+
+    return (name, quantity, unit, food_type, expiration_day), errors
+
+
+@_repository_operation(writes=False)
+def validate_food_storage_batch(cursor, food_storage_items):
+    """
+    Validate a batch of food storage items in one pass, reporting every error of every item.
+    The food types are read once for the whole batch.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_items: iterable of dict, shaped like the ones of create_food_storage_many
+
+    Returns (dict):
+        - row_count: int
+        - rows: list of tuples (name, quantity, unit, food_type_id, expiration_day), one per valid item
+        - errors: list of dictionaries, ordered by row and field
+            - Each dictionary contains the following
+                - row: int, starting at 1
+                - field: str with the key of the invalid value
+                - message: str
+    """
+    registry = _load_food_type_registry(cursor)
+    food_types_by_id = registry["by_id"]
+    food_types_by_name = registry["by_name"]
+
+    row_count = 0
+    rows = []
+    errors = []
+
+    for row_count, food_storage in enumerate(food_storage_items, start=1):
+        values, row_errors = check_food_storage_fields(food_storage, food_types_by_id, food_types_by_name)
+
+        if values is None:
+            errors.extend({"row": row_count, "field": field, "message": message} for field, message in row_errors)
+        else:
+            rows.append(values)
+
+    return {"row_count": row_count, "rows": rows, "errors": errors}
+
+
+def _check_food_storage_arguments(cursor, name, quantity, unit, food_type_id, expiration_date):
+    """
+    Check the arguments of the single food storage writes.
+
+    :return: tuple (name, quantity, unit, food_type_id, expiration_day), or str with the first error
+    """
+    registry = _load_food_type_registry(cursor)
+    values, errors = check_food_storage_fields({
+        "name": name,
+        "quantity": quantity,
+        "unit": unit,
+        "food_type_id": food_type_id,
+        "expiration_date": expiration_date
+    }, registry["by_id"], registry["by_name"])
+
+    if errors:
+        return errors[0][1]
+
+    return values
+
+
+# CRUD OPERATIONS FOR FOOD STORAGE
+
+# The writes are single statements: RETURNING gives back the written row, no row means the item does not exist,
+# and a food type deleted by another connection since the registry was read makes the subquery NULL,
+# which fails the NOT NULL constraint of food_type_id.
+_FOOD_STORAGE_TABLE_COLUMNS = "id, name, quantity, unit, food_type_id, expiration_date, created_at, updated_at"
+_EXISTING_FOOD_TYPE_ID = "(SELECT id FROM food_type WHERE id = ?)"
+
+def _food_storage_table_row_to_dict(food_storage):
+    return {
+        "id": food_storage[0],
+        "name": food_storage[1],
+        # RETURNING gives an integral REAL back as an int, the reads give a float
+        "quantity": float(food_storage[2]),
+        "unit": food_storage[3],
+        "food_type_id": food_storage[4],
+        "expiration_date": _day_number_to_text(food_storage[5]),
+        "created_at": _timestamp_to_text(food_storage[6]),
+        "updated_at": _timestamp_to_text(food_storage[7])
+    }
+
+
+@_repository_operation(writes=True)
+def create_food_storage(cursor, name, quantity, unit, food_type_id, expiration_date):
+    """
+    Create a new food storage item in the database.
+
+    :param cursor: sqlite3.Cursor
+    :param name: str
+    :param quantity: float
+    :param unit: str
+    :param food_type_id: int
+    :param expiration_date: str
+
+    Returns (dict):
+        - id: int
+        - name: str
+        - quantity: float
+        - unit: str
+        - food_type_id: int
+        - expiration_date: str
+        - created_at: str
+        - updated_at: str
+    """
+    values = _check_food_storage_arguments(cursor, name, quantity, unit, food_type_id, expiration_date)
+
+    if isinstance(values, str):
+        return values
+
+    name, quantity, unit, food_type_id, expiration_day = values
+
+    created_at = _timestamp_now()
+    updated_at = created_at
+
+    try:
+        cursor.execute(f"""
+        INSERT INTO food_storage (name, quantity, unit, food_type_id, expiration_date, created_at, updated_at)
+        VALUES (?, ?, ?, {_EXISTING_FOOD_TYPE_ID}, ?, ?, ?)
+        RETURNING {_FOOD_STORAGE_TABLE_COLUMNS}
+        """, (name, quantity, unit, food_type_id, expiration_day, created_at, updated_at))
+    except sqlite3.IntegrityError:
+        _unregister_food_type(cursor, food_type_id)
+        return "A food type with this id does not exist."
+
+    return _food_storage_table_row_to_dict(cursor.fetchone())
+
+
+@_repository_operation(writes=False)
+def read_all_food_storage(cursor, columns=None):
+    """
+    Retrieve all food storage items from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param columns: sequence of keys of FOOD_STORAGE_COLUMNS to read only those, as compact rows
+
+    Returns (list):
+    list of dictionaries, or of FoodStorageRow tuples when columns are given (see food_storage_row_type)
+        - Each dictionary contains the following
+            - id: int
+            - name: str
+            - quantity: float
+            - unit: str
+            - food_type_id: int
+            - food_type_name: str
+            - expiration_date: str
+            - created_at: str
+            - updated_at: str
+    """
+    if columns is not None:
+        columns = _food_storage_columns(columns)
+
+        if isinstance(columns, str):
+            return columns
+
+        sql, parameters = _build_food_storage_query("id", False, None, None, None, None, columns=columns)
+        cursor.execute(sql, parameters)
+
+        return _food_storage_rows(cursor.fetchall(), columns)
+
+    cursor.execute("""
+        SELECT
+            food_storage.id,
+            food_storage.name,
+            food_storage.quantity,
+            food_storage.unit,
+            food_storage.food_type_id,
+            food_type.name,
+            food_storage.expiration_date,
+            food_storage.created_at,
+            food_storage.updated_at
+        FROM food_storage
+        LEFT JOIN food_type
+        ON food_storage.food_type_id = food_type.id
+        ORDER BY food_storage.id
+    """)
+
+    return [_food_storage_row_to_dict(food_storage) for food_storage in cursor.fetchall()]
+
+
+@_repository_operation(writes=False)
+def read_food_storage_by_id(cursor, food_storage_id):
+    """
+    Retrieve a food storage item by id from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_id: int
+
+    Returns (dict):
+        - id: int
+        - name: str
+        - quantity: float
+        - unit: str
+        - food_type_id: int
+        - expiration_date: str
+        - created_at: str
+        - updated_at: str
+    """
+    cursor.execute("""
+    SELECT * FROM food_storage
+    WHERE id = ?
+    """, (food_storage_id,))
+    food_storage = cursor.fetchone()
+
+    if food_storage is None:
+        return "A food storage with this id does not exist."
+
+    return _food_storage_table_row_to_dict(food_storage)
+
+
+@_repository_operation(writes=True)
+def update_food_storage_by_id(cursor, food_storage_id, name, quantity, unit, food_type_id, expiration_date):
+    """
+    Update a food storage item by id in the database.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_id: int
+    :param name: str
+    :param quantity: float
+    :param unit: str
+    :param food_type_id: int
+    :param expiration_date: str
+
+    Returns (dict):
+        - id: int
+        - name: str
+        - quantity: float
+        - unit: str
+        - food_type_id: int
+        - expiration_date: str
+        - created_at: str
+        - updated_at: str
+    """
+    values = _check_food_storage_arguments(cursor, name, quantity, unit, food_type_id, expiration_date)
+
+    if isinstance(values, str):
+        return values
+
+    name, quantity, unit, food_type_id, expiration_day = values
+
+    updated_at = _timestamp_now()
+
+    try:
+        cursor.execute(f"""
+        UPDATE food_storage
+        SET name = ?, quantity = ?, unit = ?, food_type_id = {_EXISTING_FOOD_TYPE_ID}, expiration_date = ?,
+            updated_at = ?
+        WHERE id = ?
+        RETURNING {_FOOD_STORAGE_TABLE_COLUMNS}
+        """, (name, quantity, unit, food_type_id, expiration_day, updated_at, food_storage_id))
+    except sqlite3.IntegrityError:
+        _unregister_food_type(cursor, food_type_id)
+        return "A food type with this id does not exist."
+
+    food_storage = cursor.fetchone()
+
+    if food_storage is None:
+        return "A food storage with this id does not exist."
+
+    return _food_storage_table_row_to_dict(food_storage)
+
+
+@_repository_operation(writes=True)
+def delete_food_storage_by_id(cursor, food_storage_id):
+    """
+    Delete a food storage item by id from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_id: int
+    :return: None
+    """
+    cursor.execute("""
+    DELETE FROM food_storage
+    WHERE id = ?
+    RETURNING id
+    """, (food_storage_id,))
+
+    if cursor.fetchone() is None:
+        return "A food storage with this id does not exist."
+
+
+# PAGINATED AND STREAMING READS FOR FOOD STORAGE
+
+# Columns of the food storage listings, in the order of the dictionaries of read_all_food_storage.
+# The listings take some of them as columns to read only those values, as compact rows.
+FOOD_STORAGE_COLUMNS = {
+    "id": "food_storage.id",
+    "name": "food_storage.name",
+    "quantity": "food_storage.quantity",
+    "unit": "food_storage.unit",
+    "food_type_id": "food_storage.food_type_id",
+    "food_type_name": "food_type.name",
+    "expiration_date": "food_storage.expiration_date",
+    "created_at": "food_storage.created_at",
+    "updated_at": "food_storage.updated_at"
+}
+
+# Columns stored as numbers and returned as text, like in the dictionaries
+FOOD_STORAGE_COLUMN_CONVERTERS = {
+    "expiration_date": _day_number_to_text,
+    "created_at": _timestamp_to_text,
+    "updated_at": _timestamp_to_text
+}
+
+
+@functools.lru_cache(maxsize=None)
+def food_storage_row_type(columns):
+    """
+    The compact row type of a column projection. Rows are named tuples: the values are read by attribute
+    (row.name) or by position, and a row takes about a third of the memory of the dictionary of an item.
+    row._asdict() gives the dictionary back.
+
+    :param columns: tuple of keys of FOOD_STORAGE_COLUMNS
+    :return: collections.namedtuple class named FoodStorageRow
+    """
+    return collections.namedtuple("FoodStorageRow", columns)
+
+
+def _food_storage_columns(columns):
+    """
+    Check a column projection.
+
+    :return: tuple of keys of FOOD_STORAGE_COLUMNS, or str with the error
+    """
+    columns = tuple(columns)
+
+    if not columns:
+        return "Columns cannot be empty."
+
+    for column in columns:
+        if column not in FOOD_STORAGE_COLUMNS:
+            return f"Unknown column {column}."
+
+    if len(set(columns)) != len(columns):
+        return "Columns cannot be repeated."
+
+    return columns
+
+
+def _food_storage_select_list(columns):
+    return ",\n            ".join(FOOD_STORAGE_COLUMNS[column] for column in columns)
+
+
+def _food_storage_rows(rows, columns):
+    """
+    Turn fetched rows starting with the projected columns into FoodStorageRow tuples.
+    Extra columns at the end of the fetched rows, like the keyset values, are dropped.
+
+    :param rows: list of tuples
+    :param columns: tuple of keys of FOOD_STORAGE_COLUMNS
+    :return: list of FoodStorageRow
+    """
+    make_row = food_storage_row_type(columns)._make
+    width = len(columns)
+    converters = [(index, FOOD_STORAGE_COLUMN_CONVERTERS[column]) for index, column in enumerate(columns)
+                  if column in FOOD_STORAGE_COLUMN_CONVERTERS]
+
+    if not converters:
+        return [make_row(row[:width]) for row in rows]
+
+    food_storage_rows = []
+
+    for row in rows:
+        values = list(row[:width])
+        for index, converter in converters:
+            values[index] = converter(values[index])
+        food_storage_rows.append(make_row(values))
+
+    return food_storage_rows
+
+
+# Columns the food storage listings can be sorted by. Every sort is made unique by the id,
+# which is also the tie-breaker of the keyset cursors.
+# Every column of food_storage has an index in this order (see _migration_add_sort_indexes). The food type
+# name belongs to the joined food_type table, so sorting by it sorts all the matching items for each page.
+FOOD_STORAGE_SORT_COLUMNS = {
+    "id": "food_storage.id",
+    "name": "food_storage.name",
+    "quantity": "food_storage.quantity",
+    "unit": "food_storage.unit",
+    "food_type_name": "food_type.name",
+    "expiration_date": "food_storage.expiration_date",
+    "created_at": "food_storage.created_at",
+    "updated_at": "food_storage.updated_at"
+}
+
+
+# Sort columns that can be NULL: items without an expiration date, and orphaned items without a food type name
+FOOD_STORAGE_NULLABLE_SORT_COLUMNS = {"expiration_date", "food_type_name"}
+
+
+def _food_storage_row_to_dict(food_storage):
+    return {
+        "id": food_storage[0],
+        "name": food_storage[1],
+        "quantity": food_storage[2],
+        "unit": food_storage[3],
+        "food_type_id": food_storage[4],
+        "food_type_name": food_storage[5],
+        "expiration_date": _day_number_to_text(food_storage[6]),
+        "created_at": _timestamp_to_text(food_storage[7]),
+        "updated_at": _timestamp_to_text(food_storage[8])
+    }
+
+
+def _food_storage_filter_conditions(food_type_id, name, expiration_date_from, expiration_date_to):
+    """
+    Build the WHERE conditions of the food storage listing filters, on columns of food_storage only.
+
+    :return: tuple (conditions, parameters) or str with the error
+    """
+    try:
+        expiration_day_from = _date_text_to_day_number(expiration_date_from) if expiration_date_from else None
+        expiration_day_to = _date_text_to_day_number(expiration_date_to) if expiration_date_to else None
+    except (TypeError, ValueError):
+        return "Dates must be in the format YYYY-MM-DD."
+
+    conditions = []
+    parameters = []
+
+    if food_type_id is not None:
+        conditions.append("food_storage.food_type_id = ?")
+        parameters.append(food_type_id)
+
+    if name:
+        escaped_name = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        conditions.append("food_storage.name LIKE ? ESCAPE '\\'")
+        parameters.append(f"%{escaped_name}%")
+
+    if expiration_day_from is not None:
+        conditions.append("food_storage.expiration_date >= ?")
+        parameters.append(expiration_day_from)
+
+    if expiration_day_to is not None:
+        conditions.append("food_storage.expiration_date <= ?")
+        parameters.append(expiration_day_to)
+
+    return conditions, parameters
+
+
+def _build_food_storage_query(sort_by, descending, food_type_id, name, expiration_date_from, expiration_date_to,
+                              after=None, columns=None):
+    """
+    Build the listing query of food storage items with its filters, keyset condition and order.
+    The rows have the given columns, all of FOOD_STORAGE_COLUMNS by default, followed by the sort value and the id.
+
+    :return: tuple (sql, parameters) or str with the error
+    """
+    if sort_by not in FOOD_STORAGE_SORT_COLUMNS:
+        return f"Cannot sort by {sort_by}."
+
+    filters = _food_storage_filter_conditions(food_type_id, name, expiration_date_from, expiration_date_to)
+
+    if isinstance(filters, str):
+        return filters
+
+    sort_column = FOOD_STORAGE_SORT_COLUMNS[sort_by]
+    conditions, parameters = filters
+
+    # Keyset conditions, each one a range of the sort index. When there are two, both ranges are read in
+    # sort order and merged with UNION ALL, since an OR of them would scan the index from its start.
+    keyset_ranges = []
+
+    if after is not None:
+        # NULL sorts first in ascending order and last in descending order, and compares to nothing,
+        # so the NULL sort values of the nullable columns get their own range
+        after_value, after_id = after
+        nullable = sort_by in FOOD_STORAGE_NULLABLE_SORT_COLUMNS
+        operator = "<" if descending else ">"
+
+        if nullable and after_value is None:
+            keyset_ranges.append((f"{sort_column} IS NULL AND food_storage.id {operator} ?", [after_id]))
+
+            if not descending:
+                keyset_ranges.append((f"{sort_column} IS NOT NULL", []))
+        else:
+            keyset_ranges.append((f"({sort_column}, food_storage.id) {operator} (?, ?)", list(after)))
+
+            if nullable and descending:
+                keyset_ranges.append((f"{sort_column} IS NULL", []))
+
+    direction = "DESC" if descending else "ASC"
+
+    select = f"""
+        SELECT
+            {_food_storage_select_list(columns or FOOD_STORAGE_COLUMNS)},
+            {sort_column} AS sort_value,
+            food_storage.id AS sort_id
+        FROM food_storage
+        LEFT JOIN food_type
+        ON food_storage.food_type_id = food_type.id
+    """
+
+    if len(keyset_ranges) < 2:
+        for condition, condition_parameters in keyset_ranges:
+            conditions.append(condition)
+            parameters.extend(condition_parameters)
+
+        sql = f"""
+            {select}
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY {sort_column} {direction}, food_storage.id {direction}
+        """
+    else:
+        sql = " UNION ALL ".join(f"{select} WHERE {' AND '.join(conditions + [condition])}"
+                                 for condition, _ in keyset_ranges)
+        sql += f" ORDER BY sort_value {direction}, sort_id {direction}"
+        parameters = [parameter for _, condition_parameters in keyset_ranges
+                      for parameter in parameters + condition_parameters]
+
+    return sql, parameters
+
+
+@_repository_operation(writes=False)
+def read_food_storage_page(cursor, limit=100, after=None, sort_by="id", descending=False, food_type_id=None,
+                           name=None, expiration_date_from=None, expiration_date_to=None, offset=0, columns=None):
+    """
+    Retrieve one page of food storage items from the database.
+    Pages are addressed with keyset cursors, so reading a page costs the same wherever it is in the listing,
+    except when sorting by food_type_name, which has no index and sorts the matching items for every page.
+
+    :param cursor: sqlite3.Cursor
+    :param limit: int with the maximum number of items in the page
+    :param after: str with the next_cursor of the previous page, or None for the first page
+    :param sort_by: str, one of FOOD_STORAGE_SORT_COLUMNS
+    :param descending: bool
+    :param food_type_id: int, only items of this food type
+    :param name: str, only items whose name contains this text
+    :param expiration_date_from: str (YYYY-MM-DD), only items expiring on or after this date
+    :param expiration_date_to: str (YYYY-MM-DD), only items expiring on or before this date
+    :param offset: int with the number of items to skip after the cursor. Skipping costs one index step
+        per item, so it is meant for jumping to a position, while after is used for the following pages.
+    :param columns: sequence of keys of FOOD_STORAGE_COLUMNS to read only those, as compact rows
+
+    Returns (dict):
+        - food_storage: list of dictionaries shaped like the ones of read_all_food_storage,
+          or of FoodStorageRow tuples when columns are given
+        - next_cursor: str to pass as after to read the next page, or None on the last page
+    """
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return "Limit must be a number."
+
+    if limit < 1:
+        return "Limit must be greater than zero."
+
+    try:
+        offset = int(offset)
+    except (TypeError, ValueError):
+        return "Offset must be a number."
+
+    if offset < 0:
+        return "Offset cannot be negative."
+
+    if after is not None:
+        try:
+            after = json.loads(after)
+        except (TypeError, ValueError):
+            return "Invalid page cursor."
+
+        if not isinstance(after, list) or len(after) != 2:
+            return "Invalid page cursor."
+
+        if not (after[0] is None or isinstance(after[0], (int, float, str))) or \
+                not isinstance(after[1], int) or isinstance(after[1], bool):
+            return "Invalid page cursor."
+
+    if columns is not None:
+        columns = _food_storage_columns(columns)
+
+        if isinstance(columns, str):
+            return columns
+
+    query = _build_food_storage_query(sort_by, descending, food_type_id, name, expiration_date_from,
+                                      expiration_date_to, after, columns)
+
+    if isinstance(query, str):
+        return query
+
+    sql, parameters = query
+
+    # One extra row tells whether there is a next page without a COUNT query
+    cursor.execute(sql + " LIMIT ? OFFSET ?", parameters + [limit + 1, offset])
+    rows = cursor.fetchall()
+
+    if columns is None:
+        food_storage_page = [_food_storage_row_to_dict(food_storage) for food_storage in rows[:limit]]
+    else:
+        food_storage_page = _food_storage_rows(rows[:limit], columns)
+
+    # The cursor holds the stored sort value (the column before the id), not the text shown in the dictionaries
+    next_cursor = None
+    if len(rows) > limit:
+        last_food_storage = rows[limit - 1]
+        next_cursor = json.dumps([last_food_storage[-2], last_food_storage[-1]])
+
+    return {
+        "food_storage": food_storage_page,
+        "next_cursor": next_cursor
+    }
+
+
+@_repository_operation(writes=False)
+def count_food_storage(cursor, food_type_id=None, name=None, expiration_date_from=None, expiration_date_to=None):
+    """
+    Count the food storage items matching the filters of read_food_storage_page.
+
+    :param cursor: sqlite3.Cursor
+    :param food_type_id: int
+    :param name: str
+    :param expiration_date_from: str (YYYY-MM-DD)
+    :param expiration_date_to: str (YYYY-MM-DD)
+    :return: int, or str with the error
+    """
+    filters = _food_storage_filter_conditions(food_type_id, name, expiration_date_from, expiration_date_to)
+
+    if isinstance(filters, str):
+        return filters
+
+    conditions, parameters = filters
+
+    cursor.execute(f"SELECT COUNT(*) FROM food_storage {'WHERE ' + ' AND '.join(conditions) if conditions else ''}",
+                   parameters)
+
+    return cursor.fetchone()[0]
+
+
+def iter_food_storage(cursor, chunk_size=1000, sort_by="id", descending=False, food_type_id=None, name=None,
+                      expiration_date_from=None, expiration_date_to=None, columns=None):
+    """
+    Stream the food storage items from the database, fetching chunk_size rows at a time.
+    A separate cursor is used, so the given cursor stays free while the generator is consumed.
+    The filters, sort and columns parameters are the same as the ones of read_food_storage_page.
+
+    :param cursor: sqlite3.Cursor
+    :param chunk_size: int
+
+    Yields (dict):
+        - dictionaries shaped like the ones of read_all_food_storage, or FoodStorageRow tuples when columns are given
+    """
+    if columns is not None:
+        columns = _food_storage_columns(columns)
+
+        if isinstance(columns, str):
+            raise ValueError(columns)
+
+    query = _build_food_storage_query(sort_by, descending, food_type_id, name, expiration_date_from,
+                                      expiration_date_to, columns=columns)
+
+    if isinstance(query, str):
+        raise ValueError(query)
+
+    for rows in _fetch_in_chunks(cursor, *query, chunk_size):
+        if columns is None:
+            for food_storage in rows:
+                yield _food_storage_row_to_dict(food_storage)
+        else:
+            yield from _food_storage_rows(rows, columns)
+
+
+def _fetch_in_chunks(cursor, sql, parameters, chunk_size):
+    """
+    Run a query on a separate cursor and yield its rows as lists of up to chunk_size tuples.
+    """
+    stream_cursor = cursor.connection.cursor()
+    try:
+        stream_cursor.execute(sql, parameters)
+
+        while True:
+            rows = stream_cursor.fetchmany(chunk_size)
+
+            if not rows:
+                break
+
+            yield rows
+    finally:
+        stream_cursor.close()
+
+
+# EXPIRATION QUERIES FOR FOOD STORAGE
+
+def _parse_date_argument(value, default):
+    """
+    Parse an optional YYYY-MM-DD date argument.
+
+    :return: datetime.date, or None when the value is not a valid date
+    """
+    if value is None:
+        return default
+
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return None
+
+
+@_repository_operation(writes=False)
+def read_food_storage_by_expiration_date(cursor, date_from=None, date_to=None):
+    """
+    Retrieve the food storage items expiring between two dates, both inclusive, soonest first.
+    The range is read from the expiration_date index, so the cost depends on the matching items only.
+
+    :param cursor: sqlite3.Cursor
+    :param date_from: str (YYYY-MM-DD), or None for no lower bound
+    :param date_to: str (YYYY-MM-DD), or None for no upper bound
+
+    Returns (list):
+        list of dictionaries shaped like the ones of read_all_food_storage
+    """
+    parsed_date_from = _parse_date_argument(date_from, datetime.date.min)
+    parsed_date_to = _parse_date_argument(date_to, datetime.date.max)
+
+    if parsed_date_from is None or parsed_date_to is None:
+        return "Dates must be in the format YYYY-MM-DD."
+
+    if parsed_date_from > parsed_date_to:
+        return "The start date cannot be after the end date."
+
+    sql, parameters = _build_food_storage_query("expiration_date", False, None, None, date_from, date_to)
+    cursor.execute(sql, parameters)
+
+    return [_food_storage_row_to_dict(food_storage) for food_storage in cursor.fetchall()]
+
+
+@_repository_operation(writes=False)
+def read_expiring_within(cursor, days, as_of=None):
+    """
+    Retrieve the food storage items expiring in the next days, soonest first.
+    Items expiring on as_of are included, already expired items are not (see read_expired).
+
+    :param cursor: sqlite3.Cursor
+    :param days: int
+    :param as_of: str (YYYY-MM-DD), or None for today
+
+    Returns (list):
+        list of dictionaries shaped like the ones of read_all_food_storage
+    """
+    try:
+        days = int(days)
+    except (TypeError, ValueError, OverflowError):
+        return "Days must be a number."
+
+    if days < 0:
+        return "Days cannot be negative."
+
+    as_of = _parse_date_argument(as_of, datetime.date.today())
+
+    if as_of is None:
+        return "Dates must be in the format YYYY-MM-DD."
+
+    try:
+        until = as_of + datetime.timedelta(days=days)
+    except OverflowError:
+        # Past the last date datetime can hold, which leaves out no item
+        until = datetime.date.max
+
+    return read_food_storage_by_expiration_date(cursor, as_of.isoformat(), until.isoformat())
+
+
+@_repository_operation(writes=False)
+def read_expired(cursor, as_of=None):
+    """
+    Retrieve the food storage items that expired before as_of, oldest first.
+
+    :param cursor: sqlite3.Cursor
+    :param as_of: str (YYYY-MM-DD), or None for today
+
+    Returns (list):
+        list of dictionaries shaped like the ones of read_all_food_storage
+    """
+    as_of = _parse_date_argument(as_of, datetime.date.today())
+
+    if as_of is None:
+        return "Dates must be in the format YYYY-MM-DD."
+
+    if as_of == datetime.date.min:
+        return []
+
+    return read_food_storage_by_expiration_date(cursor, None, (as_of - datetime.timedelta(days=1)).isoformat())
+
+
+# FULL-TEXT SEARCH FOR FOOD STORAGE
+
+def _build_search_match(query):
+    """
+    Turn the text typed by the user into an FTS5 query: every word must match the start of a token
+    of the item name or of its food type name. The words are quoted, so FTS5 operators in the text are ignored.
+
+    :param query: str
+    :return: str, or None when the query has no words
+    """
+    words = query.split() if isinstance(query, str) else []
+
+    if not words:
+        return None
+
+    return " ".join('"{}"*'.format(word.replace('"', '""')) for word in words)
+
+
+@_repository_operation(writes=False)
+def search_food_storage(cursor, query, limit=50, columns=None):
+    """
+    Search the food storage items by name and food type name, in id order.
+    The search reads the food_storage_search full-text index instead of scanning food_storage, and stops
+    after limit matches, so even prefixes matching most of the inventory answer quickly.
+
+    :param cursor: sqlite3.Cursor
+    :param query: str with the words to search, each one matching as a prefix ("app" finds "Apple")
+    :param limit: int with the maximum number of items
+    :param columns: sequence of keys of FOOD_STORAGE_COLUMNS to read only those, as compact rows
+
+    Returns (list):
+        list of dictionaries shaped like the ones of read_all_food_storage,
+        or of FoodStorageRow tuples when columns are given
+    """
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return "Limit must be a number."
+
+    if limit < 1:
+        return "Limit must be at least 1."
+
+    if columns is not None:
+        columns = _food_storage_columns(columns)
+
+        if isinstance(columns, str):
+            return columns
+
+    match = _build_search_match(query)
+
+    if match is None:
+        return []
+
+    cursor.execute(f"""
+        SELECT
+            {_food_storage_select_list(columns or FOOD_STORAGE_COLUMNS)}
+        FROM food_storage_search
+        JOIN food_storage
+        ON food_storage.id = food_storage_search.rowid
+        LEFT JOIN food_type
+        ON food_storage.food_type_id = food_type.id
+        WHERE food_storage_search MATCH ?
+        ORDER BY food_storage_search.rowid
+        LIMIT ?
+    """, (match, limit))
+
+    if columns is not None:
+        return _food_storage_rows(cursor.fetchall(), columns)
+
+    return [_food_storage_row_to_dict(food_storage) for food_storage in cursor.fetchall()]
+
+
+# UNITS AND QUANTITY TOTALS
+
+# Quantities of the same dimension are totaled in the canonical unit of the dimension
+CANONICAL_UNITS = {"mass": "kg", "volume": "l", "count": "unit"}
+
+# Known unit names, lowercase and without dots, to their dimension and the factor converting them to the
+# canonical unit. Units missing from the registry are totaled as they are, under their own name.
+UNIT_REGISTRY = {
+    "mg": ("mass", 0.000001), "milligram": ("mass", 0.000001), "milligrams": ("mass", 0.000001),
+    "g": ("mass", 0.001), "gram": ("mass", 0.001), "grams": ("mass", 0.001),
+    "kg": ("mass", 1.0), "kilo": ("mass", 1.0), "kilos": ("mass", 1.0),
+    "kilogram": ("mass", 1.0), "kilograms": ("mass", 1.0),
+    "oz": ("mass", 0.028349523125), "ounce": ("mass", 0.028349523125), "ounces": ("mass", 0.028349523125),
+    "lb": ("mass", 0.45359237), "lbs": ("mass", 0.45359237),
+    "pound": ("mass", 0.45359237), "pounds": ("mass", 0.45359237),
+    "ml": ("volume", 0.001), "milliliter": ("volume", 0.001), "milliliters": ("volume", 0.001),
+    "millilitre": ("volume", 0.001), "millilitres": ("volume", 0.001),
+    "cl": ("volume", 0.01), "dl": ("volume", 0.1),
+    "l": ("volume", 1.0), "liter": ("volume", 1.0), "liters": ("volume", 1.0),
+    "litre": ("volume", 1.0), "litres": ("volume", 1.0),
+    "tsp": ("volume", 0.00492892159375), "teaspoon": ("volume", 0.00492892159375),
+    "teaspoons": ("volume", 0.00492892159375),
+    "tbsp": ("volume", 0.01478676478125), "tablespoon": ("volume", 0.01478676478125),
+    "tablespoons": ("volume", 0.01478676478125),
+    "fl oz": ("volume", 0.0295735295625),
+    "cup": ("volume", 0.2365882365), "cups": ("volume", 0.2365882365),
+    "pint": ("volume", 0.473176473), "pints": ("volume", 0.473176473),
+    "quart": ("volume", 0.946352946), "quarts": ("volume", 0.946352946),
+    "gal": ("volume", 3.785411784), "gallon": ("volume", 3.785411784), "gallons": ("volume", 3.785411784),
+    "unit": ("count", 1.0), "units": ("count", 1.0), "item": ("count", 1.0), "items": ("count", 1.0),
+    "piece": ("count", 1.0), "pieces": ("count", 1.0), "pc": ("count", 1.0), "pcs": ("count", 1.0),
+    "can": ("count", 1.0), "cans": ("count", 1.0), "jar": ("count", 1.0), "jars": ("count", 1.0),
+    "bottle": ("count", 1.0), "bottles": ("count", 1.0), "box": ("count", 1.0), "boxes": ("count", 1.0),
+    "bag": ("count", 1.0), "bags": ("count", 1.0), "pack": ("count", 1.0), "packs": ("count", 1.0),
+    "dozen": ("count", 12.0)
+}
+
+
+def import_numpy():
+    """
+    Import numpy on the first call.
+
+    :return: the numpy module, or None when it is not installed
+    """
+    global numpy
+
+    if numpy is None:
+        try:
+            import numpy as numpy_module
+        except ImportError:
+            numpy = False
+        else:
+            numpy = numpy_module
+
+    return numpy or None
+
+
+def _unit_key(unit):
+    # "Fl. Oz" and "fl oz" are the same unit
+    return " ".join(unit.lower().replace(".", "").split())
+
+
+def register_unit(name, dimension, factor):
+    """
+    Add a unit to the registry, or change the conversion of a known one.
+
+    :param name: str
+    :param dimension: str, one of the keys of CANONICAL_UNITS
+    :param factor: float, the quantity in the canonical unit of the dimension of one of this unit
+
+    Returns (dict):
+        - name: str
+        - dimension: str
+        - factor: float
+    """
+    if not isinstance(name, str) or not _unit_key(name):
+        return "Unit cannot be empty."
+
+    if dimension not in CANONICAL_UNITS:
+        return f"Unknown dimension {dimension}."
+
+    try:
+        factor = float(factor)
+    except (TypeError, ValueError):
+        return "Factor must be a number."
+
+    if not factor > 0:
+        return "Factor must be greater than zero."
+
+    UNIT_REGISTRY[_unit_key(name)] = (dimension, factor)
+
+    return {"name": _unit_key(name), "dimension": dimension, "factor": factor}
+
+
+def normalize_unit(unit):
+    """
+    Find the unit the quantities of a unit are totaled in.
+
+    :param unit: str
+    :return: tuple (canonical unit, factor to multiply the quantities by); unknown units are kept as they are
+    """
+    conversion = UNIT_REGISTRY.get(_unit_key(unit))
+
+    if conversion is None:
+        return unit.strip(), 1.0
+
+    dimension, factor = conversion
+
+    return CANONICAL_UNITS[dimension], factor
+
+
+def total_quantities(keys, units, quantities):
+    """
+    Total quantities per key in canonical units.
+    The three sequences are columns: the nth quantity is in the nth unit and belongs to the nth key.
+    With numpy, the conversions and sums are vectorized; only numbering the keys runs once per row in Python.
+
+    :param keys: sequence of hashable values, like food type ids or food storage names
+    :param units: sequence of str
+    :param quantities: sequence of float
+
+    Returns (dict):
+        key to a dict of canonical unit to the total quantity
+    """
+    # Every distinct unit is converted once, whatever the number of rows
+    conversions = {unit: normalize_unit(unit) for unit in set(units)}
+    totals = {}
+    np = import_numpy()
+
+    if np is None:
+        # Plain Python fallback, one row at a time, with the sums of each canonical unit in their own dict
+        sums = {}
+        unit_sums = {unit: (sums.setdefault(canonical_unit, {}), factor)
+                     for unit, (canonical_unit, factor) in conversions.items()}
+
+        for key, unit, quantity in zip(keys, units, quantities):
+            canonical_sums, factor = unit_sums[unit]
+            canonical_sums[key] = canonical_sums.get(key, 0.0) + quantity * factor
+
+        for canonical_unit, canonical_sums in sums.items():
+            for key, total in canonical_sums.items():
+                totals.setdefault(key, {})[canonical_unit] = round(total, 9)
+
+        return totals
+
+    unit_codes = {unit: code for code, unit in enumerate(conversions)}
+    canonical_units = list(dict.fromkeys(canonical_unit for canonical_unit, _ in conversions.values()))
+    canonical_codes = np.array([canonical_units.index(canonical_unit) for canonical_unit, _ in conversions.values()],
+                               dtype=np.intp)
+    factors = np.array([factor for _, factor in conversions.values()], dtype=float)
+
+    key_codes = {}
+    key_column = np.fromiter((key_codes.setdefault(key, len(key_codes)) for key in keys), dtype=np.intp,
+                             count=len(keys))
+    unit_column = np.fromiter((unit_codes[unit] for unit in units), dtype=np.intp, count=len(units))
+
+    # One cell per key and canonical unit
+    cells = key_column * len(canonical_units) + canonical_codes[unit_column]
+    cell_count = len(key_codes) * len(canonical_units)
+    sums = np.bincount(cells, weights=np.asarray(quantities, dtype=float) * factors[unit_column],
+                       minlength=cell_count)
+    filled = np.bincount(cells, minlength=cell_count) > 0
+
+    keys_by_code = list(key_codes)
+    for cell, total in zip(np.flatnonzero(filled).tolist(), sums[filled].tolist()):
+        key_code, canonical_code = divmod(cell, len(canonical_units))
+        totals.setdefault(keys_by_code[key_code], {})[canonical_units[canonical_code]] = round(total, 9)
+
+    return totals
+
+
+@_repository_operation(writes=False)
+def read_quantity_totals(cursor, group_by="food_type", food_type_id=None):
+    """
+    Retrieve the total quantities in canonical units (see UNIT_REGISTRY) per food type or per food storage name.
+    The food type totals convert the rows of the food_type_summary table, so they do not depend on the inventory
+    size. The name totals load the name, unit and quantity columns of the items and total them with
+    total_quantities, which is faster than grouping by name in SQLite.
+
+    :param cursor: sqlite3.Cursor
+    :param group_by: str, "food_type" or "name"
+    :param food_type_id: int to total the items of one food type only, or None
+
+    Returns (list):
+    list of dictionaries, ordered by id for food types and by name for names
+        - Each dictionary contains the following
+            - id: int, for food types only
+            - name: str
+            - totals: dict of canonical unit to the total quantity
+    """
+    if group_by not in ("food_type", "name"):
+        return f"Cannot group by {group_by}."
+
+    where = "WHERE food_type_id = ?" if food_type_id is not None else ""
+    parameters = () if food_type_id is None else (food_type_id,)
+
+    if group_by == "food_type":
+        cursor.execute(f"SELECT food_type_id, unit, total_quantity FROM food_type_summary {where}", parameters)
+    else:
+        cursor.execute(f"SELECT name, unit, quantity FROM food_storage {where}", parameters)
+
+    rows = cursor.fetchall()
+    totals = total_quantities([row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows])
+
+    if group_by == "name":
+        return [{"name": name, "totals": totals[name]} for name in sorted(totals)]
+
+    return [{
+        "id": food_type["id"],
+        "name": food_type["name"],
+        "totals": totals.get(food_type["id"], {})
+    } for food_type in read_all_food_types(cursor)
+        if food_type_id is None or food_type["id"] == food_type_id]
+
+
+# QUANTITY HISTORY AND DEPLETION FORECAST
+
+# Only the quantities of the last days are fitted, so old habits do not weigh on the forecast
+FORECAST_HISTORY_DAYS = 90
+
+
+@_repository_operation(writes=False)
+def read_quantity_history(cursor, food_storage_id):
+    """
+    Retrieve the quantities a food storage item had since it was created or since its unit last changed.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_id: int
+
+    Returns (list):
+    list of dictionaries, oldest first
+        - Each dictionary contains the following
+            - changed_at: str
+            - quantity: float
+    """
+    cursor.execute("""
+    SELECT changed_at, quantity
+    FROM quantity_history
+    WHERE food_storage_id = ?
+    ORDER BY changed_at
+    """, (food_storage_id,))
+
+    return [{"changed_at": _timestamp_to_text(changed_at), "quantity": quantity}
+            for changed_at, quantity in cursor.fetchall()]
+
+
+def _fit_consumption_rates(ids, days, quantities):
+    """
+    Fit a straight line to the quantities of every item since its last restock, by least squares.
+    The points must be ordered by item and by time. A quantity going up is a restock and starts a new run.
+    With numpy, all the items are fitted at once from grouped sums.
+
+    :param ids: sequence of int, the item of each point
+    :param days: sequence of float, the time of each point in days
+    :param quantities: sequence of float
+
+    Returns (dict):
+        item id to a tuple (consumption per day or None, day of the last point, last quantity)
+    """
+    np = import_numpy()
+    rates = {}
+
+    if not len(ids):
+        return rates
+
+    if np is None:
+        # Plain Python fallback, one item at a time
+        for item_id, points in itertools.groupby(zip(ids, days, quantities), key=lambda point: point[0]):
+            points = list(points)
+            start = len(points) - 1
+            while start > 0 and points[start - 1][2] >= points[start][2]:
+                start -= 1
+
+            run = points[start:]
+            count = len(run)
+            sum_days = sum(point[1] for point in run)
+            sum_quantities = sum(point[2] for point in run)
+            sum_products = sum(point[1] * point[2] for point in run)
+            sum_squares = sum(point[1] * point[1] for point in run)
+            denominator = count * sum_squares - sum_days * sum_days
+            slope = (count * sum_products - sum_days * sum_quantities) / denominator if denominator > 0 else 0.0
+
+            rates[item_id] = (-slope if slope < 0 else None, run[-1][1], run[-1][2])
+
+        return rates
+
+    ids = np.asarray(ids)
+    days = np.asarray(days, dtype=float)
+    quantities = np.asarray(quantities, dtype=float)
+
+    new_item = np.ones(len(ids), dtype=bool)
+    new_item[1:] = ids[1:] != ids[:-1]
+    new_run = new_item.copy()
+    new_run[1:] |= quantities[1:] > quantities[:-1]
+
+    item_codes = np.cumsum(new_item) - 1
+    run_codes = np.cumsum(new_run) - 1
+    last_points = np.flatnonzero(np.append(new_item[1:], True))
+
+    # Only the points of the last run of each item are fitted
+    fitted = run_codes == run_codes[last_points][item_codes]
+    codes = item_codes[fitted]
+    fitted_days = days[fitted]
+    fitted_quantities = quantities[fitted]
+    item_count = len(last_points)
+
+    count = np.bincount(codes, minlength=item_count)
+    sum_days = np.bincount(codes, weights=fitted_days, minlength=item_count)
+    sum_quantities = np.bincount(codes, weights=fitted_quantities, minlength=item_count)
+    sum_products = np.bincount(codes, weights=fitted_days * fitted_quantities, minlength=item_count)
+    sum_squares = np.bincount(codes, weights=fitted_days * fitted_days, minlength=item_count)
+
+    denominator = count * sum_squares - sum_days * sum_days
+    safe_denominator = np.where(denominator > 0, denominator, 1.0)
+    slopes = np.where(denominator > 0, (count * sum_products - sum_days * sum_quantities) / safe_denominator, 0.0)
+
+    for item_id, slope, last_day, last_quantity in zip(ids[last_points].tolist(), slopes.tolist(),
+                                                       days[last_points].tolist(),
+                                                       quantities[last_points].tolist()):
+        rates[item_id] = (-slope if slope < 0 else None, last_day, last_quantity)
+
+    return rates
+
+
+@_repository_operation(writes=False)
+def forecast_depletion(cursor, history_days=FORECAST_HISTORY_DAYS, as_of=None):
+    """
+    Project the day every food storage item runs out, from the consumption fitted to its quantity history.
+    The history of the whole inventory is read in one query and fitted in one batch, see _fit_consumption_rates.
+
+    :param cursor: sqlite3.Cursor
+    :param history_days: int with the number of days of history to fit
+    :param as_of: str (YYYY-MM-DD) to forecast from the end of that day, or None for now
+
+    Returns (list):
+    list of dictionaries, ordered by id
+        - Each dictionary contains the following
+            - id: int
+            - name: str
+            - quantity: float
+            - unit: str
+            - daily_consumption: float, or None when the quantity is not going down
+            - depletion_date: str, or None when the quantity is not going down
+    """
+    try:
+        history_days = int(history_days)
+    except (TypeError, ValueError):
+        return "Days must be a number."
+
+    if history_days < 1:
+        return "Days must be greater than zero."
+
+    as_of_date = _parse_date_argument(as_of, None)
+
+    if as_of is not None and as_of_date is None:
+        return "Dates must be in the format YYYY-MM-DD."
+
+    if as_of_date is None:
+        reference = _timestamp_now()
+    else:
+        reference = int(time.mktime((as_of_date + datetime.timedelta(days=1)).timetuple()))
+
+    cursor.execute("""
+    SELECT food_storage_id, changed_at, quantity
+    FROM quantity_history
+    WHERE changed_at BETWEEN ? AND ?
+    ORDER BY food_storage_id, changed_at
+    """, (reference - history_days * 86400, reference))
+    history = cursor.fetchall()
+
+    # Days before the reference time, which keeps the sums of the fit small
+    rates = _fit_consumption_rates([point[0] for point in history],
+                                   [(point[1] - reference) / 86400 for point in history],
+                                   [point[2] for point in history])
+
+    cursor.execute("SELECT id, name, quantity, unit FROM food_storage ORDER BY id")
+    forecast = []
+
+    for food_storage_id, name, quantity, unit in cursor.fetchall():
+        daily_consumption, depletion_date = None, None
+        rate, last_day, last_quantity = rates.get(food_storage_id, (None, None, None))
+
+        if rate is not None:
+            daily_consumption = round(rate, 9)
+
+        if last_quantity is not None and last_quantity <= 0:
+            depletion_date = datetime.date.fromtimestamp(reference + last_day * 86400).isoformat()
+        elif rate is not None:
+            try:
+                depletion_date = datetime.date.fromtimestamp(
+                    reference + (last_day + last_quantity / rate) * 86400).isoformat()
+            except (OverflowError, OSError, ValueError):
+                # A tiny consumption runs out after the last date datetime can represent
+                pass
+
+        forecast.append({
+            "id": food_storage_id,
+            "name": name,
+            "quantity": quantity,
+            "unit": unit,
+            "daily_consumption": daily_consumption,
+            "depletion_date": depletion_date
+        })
+
+    return forecast
+
+
+# CHANGE LOG
+
+CHANGE_LOG_RETENTION_DAYS = 7
+
+
+@_repository_operation(writes=False)
+def read_last_change_sequence(cursor):
+    """
+    Retrieve the sequence number of the last change, the starting point to follow the changes with read_changes_since.
+
+    :param cursor: sqlite3.Cursor
+    :return: int, 0 when nothing changed yet
+    """
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    row = cursor.fetchone()
+
+    return row[0] if row else 0
+
+
+@_repository_operation(writes=False)
+def read_changes_since(cursor, sequence, limit=1000):
+    """
+    Retrieve the changes made to food types and food storage items after a sequence number, oldest first.
+    Only the ids of the changed rows are returned; read the rows that were not deleted to get their new values.
+
+    :param cursor: sqlite3.Cursor
+    :param sequence: int, like the last_sequence of the previous call or read_last_change_sequence
+    :param limit: int with the maximum number of changes
+
+    Returns (dict):
+        - changes: list of dictionaries
+            - Each dictionary contains the following
+                - sequence: int
+                - table_name: str, "food_type" or "food_storage"
+                - id: int
+                - operation: str, "insert", "update" or "delete"
+                - changed_at: str
+        - last_sequence: int to pass to the next call
+        - complete: bool, False when changes after sequence were already pruned and everything must be read again
+    """
+    try:
+        sequence = int(sequence)
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return "Sequence and limit must be numbers."
+
+    if limit < 1:
+        return "Limit must be greater than zero."
+
+    cursor.execute("SELECT MIN(sequence) FROM change_log")
+    first_sequence = cursor.fetchone()[0]
+
+    if first_sequence is None:
+        first_sequence = read_last_change_sequence(cursor) + 1
+
+    cursor.execute("""
+    SELECT sequence, table_name, row_id, operation, changed_at
+    FROM change_log
+    WHERE sequence > ?
+    ORDER BY sequence
+    LIMIT ?
+    """, (sequence, limit))
+
+    changes = [{
+        "sequence": change[0],
+        "table_name": change[1],
+        "id": change[2],
+        "operation": change[3],
+        "changed_at": _timestamp_to_text(change[4])
+    } for change in cursor.fetchall()]
+
+    return {
+        "changes": changes,
+        "last_sequence": changes[-1]["sequence"] if changes else sequence,
+        "complete": sequence >= first_sequence - 1
+    }
+
+
+@_repository_operation(writes=True)
+def prune_change_log(cursor, older_than_days=CHANGE_LOG_RETENTION_DAYS):
+    """
+    Delete the changes older than some days, so the change_log table does not grow forever.
+
+    :param cursor: sqlite3.Cursor
+    :param older_than_days: int
+    :return: int with the number of deleted changes
+    """
+    cursor.execute("DELETE FROM change_log WHERE changed_at < ?", (_timestamp_now() - older_than_days * 86400,))
+
+    return cursor.rowcount
+
+
+@_repository_operation(writes=False)
+def read_food_storage_by_ids(cursor, food_storage_ids):
+    """
+    Retrieve the food storage items with the given ids, like the ones changed since a sequence number.
+    Ids that do not exist are skipped.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_ids: iterable of int
+
+    Returns (list):
+        list of dictionaries shaped like the ones of read_all_food_storage, ordered by id
+    """
+    food_storage_ids = sorted(set(food_storage_ids))
+    food_storage_items = []
+
+    # Stay below the default limit of bound parameters of SQLite
+    for start in range(0, len(food_storage_ids), 500):
+        chunk = food_storage_ids[start:start + 500]
+        cursor.execute(f"""
+            SELECT
+                food_storage.id,
+                food_storage.name,
+                food_storage.quantity,
+                food_storage.unit,
+                food_storage.food_type_id,
+                food_type.name,
+                food_storage.expiration_date,
+                food_storage.created_at,
+                food_storage.updated_at
+            FROM food_storage
+            LEFT JOIN food_type
+            ON food_storage.food_type_id = food_type.id
+            WHERE food_storage.id IN ({", ".join("?" * len(chunk))})
+            ORDER BY food_storage.id
+        """, chunk)
+        food_storage_items.extend(_food_storage_row_to_dict(food_storage) for food_storage in cursor.fetchall())
+
+    return food_storage_items
+
+
+# BULK OPERATIONS FOR FOOD STORAGE
+
+@_repository_operation(writes=True)
+def create_food_storage_many(cursor, food_storage_items):
+    """
+    Create many food storage items in the database at once.
+    The whole batch is validated before anything is written (see validate_food_storage_batch),
+    and all rows are inserted with a single executemany inside one savepoint.
+    Nothing is inserted when any row is invalid.
+
+    :param cursor: sqlite3.Cursor
+    :param food_storage_items: iterable of dict
+        - Each dictionary contains the following
+            - name: str
+            - quantity: float
+            - unit: str
+            - food_type_id: int (or food_type_name: str)
+            - expiration_date: str
+
+    :return: int with the number of created items, or str with one "Row N: message" line per error
+    """
+    report = validate_food_storage_batch(cursor, food_storage_items)
+
+    if report["errors"]:
+        return "\n".join(f"Row {error['row']}: {error['message']}" for error in report["errors"])
+
+    created_at = _timestamp_now()
+    updated_at = created_at
+    rows = [values + (created_at, updated_at) for values in report["rows"]]
+
+    _begin_savepoint(cursor, "create_food_storage_many")
+
+    try:
+        cursor.executemany("""
+        INSERT INTO food_storage (name, quantity, unit, food_type_id, expiration_date, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+    except sqlite3.Error:
+        _rollback_savepoint(cursor, "create_food_storage_many")
+        raise
+
+    _release_savepoint(cursor, "create_food_storage_many")
+
+    return len(rows)
+
+
+@_repository_operation(writes=True)
+def import_food_storage_csv(cursor, file_path):
+    """
+    Import food storage items from a CSV file.
+    The first line must be a header with the columns name, quantity, unit,
+    food_type_name (or food_type_id) and expiration_date.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of created items, or str with the errors
+    """
+    with open(file_path, newline="", encoding="utf-8") as csv_file:
+        return create_food_storage_many(cursor, csv.DictReader(csv_file))
+
+
+def _load_food_storage_json(file_path):
+    """
+    :return: list of dict, or str with the error
+    """
+    with open(file_path, encoding="utf-8") as json_file:
+        try:
+            food_storage_items = json.load(json_file)
+        except ValueError:
+            return "The file is not valid JSON."
+
+    if not isinstance(food_storage_items, list) or not all(isinstance(item, dict) for item in food_storage_items):
+        return "The JSON file must contain a list of objects."
+
+    return food_storage_items
+
+
+@_repository_operation(writes=True)
+def import_food_storage_json(cursor, file_path):
+    """
+    Import food storage items from a JSON file holding a list of objects with the keys
+    name, quantity, unit, food_type_name (or food_type_id) and expiration_date.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of created items, or str with the errors
+    """
+    food_storage_items = _load_food_storage_json(file_path)
+
+    if isinstance(food_storage_items, str):
+        return food_storage_items
+
+    return create_food_storage_many(cursor, food_storage_items)
+
+
+def _load_food_storage_jsonl(file_path):
+    """
+    :return: list of dict, or str with the error
+    """
+    food_storage_items = []
+
+    with open(file_path, encoding="utf-8") as jsonl_file:
+        for line_number, line in enumerate(jsonl_file, start=1):
+            if not line or line.isspace():
+                continue
+
+            try:
+                food_storage = json.loads(line)
+            except ValueError:
+                return f"Line {line_number} is not valid JSON."
+
+            if not isinstance(food_storage, dict):
+                return f"Line {line_number} is not a JSON object."
+
+            food_storage_items.append(food_storage)
+
+    return food_storage_items
+
+
+@_repository_operation(writes=True)
+def import_food_storage_jsonl(cursor, file_path):
+    """
+    Import food storage items from a JSON Lines file holding one object per line with the keys
+    name, quantity, unit, food_type_name (or food_type_id) and expiration_date. Blank lines are skipped.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of created items, or str with the errors
+    """
+    food_storage_items = _load_food_storage_jsonl(file_path)
+
+    if isinstance(food_storage_items, str):
+        return food_storage_items
+
+    return create_food_storage_many(cursor, food_storage_items)
+
+
+def _load_food_storage_columnar(file_path):
+    """
+    :return: list of dict, or str with the error
+    """
+    with open(file_path, "rb") as columnar_file:
+        try:
+            return list(read_food_storage_columnar(columnar_file))
+        except ValueError:
+            return "The file is not a valid columnar export."
+
+
+@_repository_operation(writes=True)
+def import_food_storage_columnar(cursor, file_path):
+    """
+    Import food storage items from a file written by export_food_storage_columnar.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of created items, or str with the errors
+    """
+    food_storage_items = _load_food_storage_columnar(file_path)
+
+    if isinstance(food_storage_items, str):
+        return food_storage_items
+
+    return create_food_storage_many(cursor, food_storage_items)
+
+
+# Exported files can be imported again: the import reads the food type by name and ignores the other columns
+EXPORT_COLUMNS = ["id", "name", "quantity", "unit", "food_type_name", "expiration_date", "created_at", "updated_at"]
+
+
+def write_food_storage_csv(file, food_storage_items):
+    """
+    Write food storage items as CSV with the EXPORT_COLUMNS, one row at a time.
+
+    :param file: text file opened with newline=""
+    :param food_storage_items: iterable of dictionaries shaped like the ones of read_all_food_storage
+    :return: int with the number of written items
+    """
+    writer = csv.DictWriter(file, EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+
+    count = 0
+    for food_storage in food_storage_items:
+        writer.writerow(food_storage)
+        count += 1
+
+    return count
+
+
+def write_food_storage_json(file, food_storage_items):
+    """
+    Write food storage items as a JSON list of objects with the EXPORT_COLUMNS, one item at a time.
+
+    :param file: text file
+    :param food_storage_items: iterable of dictionaries shaped like the ones of read_all_food_storage
+    :return: int with the number of written items
+    """
+    count = 0
+    file.write("[")
+
+    for food_storage in food_storage_items:
+        file.write(",\n" if count else "\n")
+        file.write(json.dumps({column: food_storage[column] for column in EXPORT_COLUMNS}))
+        count += 1
+
+    file.write("\n]\n" if count else "]\n")
+
+    return count
+
+
+def write_food_storage_jsonl(file, food_storage_items):
+    """
+    Write food storage items as JSON Lines, one object with the EXPORT_COLUMNS per line.
+
+    :param file: text file
+    :param food_storage_items: iterable of dictionaries shaped like the ones of read_all_food_storage
+    :return: int with the number of written items
+    """
+    count = 0
+
+    for food_storage in food_storage_items:
+        file.write(json.dumps({column: food_storage[column] for column in EXPORT_COLUMNS}))
+        file.write("\n")
+        count += 1
+
+    return count
+
+
+# Compact binary columnar format of the exports. The file starts with COLUMNAR_MAGIC and a header:
+#   u16 column count, then for each column: u8 name length, the UTF-8 name and a type code,
+#   "q" for 64-bit integers, "d" for 64-bit floats or "s" for text.
+# Blocks of up to COLUMNAR_BLOCK_SIZE rows follow, each one a u32 row count and then every column in turn:
+#   u8 null flag, followed by one byte per row (1 for NULL) when the flag is set, then
+#   - "q" and "d": the values as an array of 8-byte numbers
+#   - "s": u32 byte size of the text, u32 end offset of each value in characters, and the values joined in UTF-8
+# A block of 0 rows ends the file. Numbers are little-endian. Dates and timestamps are stored like in the
+# database, as day numbers and epoch seconds, and the reader turns them back into text.
+COLUMNAR_MAGIC = b"FSMCOL\x00\x01"
+COLUMNAR_COLUMNS = (("id", "q"), ("name", "s"), ("quantity", "d"), ("unit", "s"), ("food_type_name", "s"),
+                    ("expiration_date", "q"), ("created_at", "q"), ("updated_at", "q"))
+COLUMNAR_BLOCK_SIZE = 8192
+
+
+def _columnar_array_bytes(type_code, values):
+    values = array.array(type_code, values)
+
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values.tobytes()
+
+
+def _columnar_block(columns, rows):
+    parts = [struct.pack("<I", len(rows))]
+
+    # Transposing the block gives the values of each column; extra values at the end of the rows are ignored
+    for (column, type_code), values in zip(columns, zip(*rows)):
+        if None in values:
+            parts.append(b"\x01")
+            parts.append(bytes(value is None for value in values))
+            empty = "" if type_code == "s" else 0
+            values = [empty if value is None else value for value in values]
+        else:
+            parts.append(b"\x00")
+
+        if type_code == "s":
+            text = "".join(values).encode("utf-8")
+            parts.append(struct.pack("<I", len(text)))
+            parts.append(_columnar_array_bytes("I", itertools.accumulate(map(len, values))))
+            parts.append(text)
+        else:
+            parts.append(_columnar_array_bytes(type_code, values))
+
+    return b"".join(parts)
+
+
+def write_food_storage_columnar(file, rows):
+    """
+    Write food storage rows in the binary columnar format, one block of COLUMNAR_BLOCK_SIZE rows at a time.
+
+    :param file: binary file
+    :param rows: iterable of tuples with the values of the COLUMNAR_COLUMNS as stored in the database
+    :return: int with the number of written rows
+    """
+    file.write(COLUMNAR_MAGIC)
+    file.write(struct.pack("<H", len(COLUMNAR_COLUMNS)))
+
+    for column, type_code in COLUMNAR_COLUMNS:
+        name = column.encode("utf-8")
+        file.write(struct.pack("<B", len(name)) + name + type_code.encode("ascii"))
+
+    rows = iter(rows)
+    count = 0
+
+    while True:
+        block = list(itertools.islice(rows, COLUMNAR_BLOCK_SIZE))
+
+        if not block:
+            break
+
+        file.write(_columnar_block(COLUMNAR_COLUMNS, block))
+        count += len(block)
+
+    file.write(struct.pack("<I", 0))
+
+    return count
+
+
+def _read_exactly(file, size):
+    data = file.read(size)
+
+    if len(data) != size:
+        raise ValueError("The file is not a valid columnar export.")
+
+    return data
+
+
+def _read_columnar_array(file, type_code, count):
+    values = array.array(type_code)
+    values.frombytes(_read_exactly(file, values.itemsize * count))
+
+    if sys.byteorder == "big":
+        values.byteswap()
+
+    return values
+
+
+def read_food_storage_columnar(file):
+    """
+    Stream the food storage items of a file in the binary columnar format, one block at a time.
+
+    :param file: binary file
+    :raises ValueError: when the file is not in the columnar format
+
+    Yields (dict):
+        - dictionaries with the columns of the file, the dates and timestamps as text like in read_all_food_storage
+    """
+    if file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ValueError("The file is not a valid columnar export.")
+
+    columns = []
+
+    for _ in range(struct.unpack("<H", _read_exactly(file, 2))[0]):
+        name = _read_exactly(file, struct.unpack("<B", _read_exactly(file, 1))[0]).decode("utf-8")
+        type_code = _read_exactly(file, 1).decode("ascii")
+
+        if type_code not in ("q", "d", "s"):
+            raise ValueError("The file is not a valid columnar export.")
+
+        columns.append((name, type_code))
+
+    names = [name for name, type_code in columns]
+    converters = [FOOD_STORAGE_COLUMN_CONVERTERS.get(name) for name in names]
+
+    while True:
+        row_count = struct.unpack("<I", _read_exactly(file, 4))[0]
+
+        if row_count == 0:
+            return
+
+        block = []
+
+        for (name, type_code), converter in zip(columns, converters):
+            nulls = _read_exactly(file, row_count) if _read_exactly(file, 1) == b"\x01" else None
+
+            if type_code == "s":
+                text_size = struct.unpack("<I", _read_exactly(file, 4))[0]
+                ends = _read_columnar_array(file, "I", row_count)
+                text = _read_exactly(file, text_size).decode("utf-8")
+                values = [text[start:end] for start, end in zip(itertools.chain((0,), ends), ends)]
+            else:
+                values = _read_columnar_array(file, type_code, row_count).tolist()
+
+            if converter is not None:
+                values = [converter(value) for value in values]
+
+            if nulls is not None:
+                values = [None if null else value for value, null in zip(values, nulls)]
+
+            block.append(values)
+
+        for row in zip(*block):
+            yield dict(zip(names, row))
+
+
+@_repository_operation(writes=False)
+def export_food_storage_csv(cursor, file_path):
+    """
+    Export all food storage items to a CSV file, streaming them from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of exported items
+    """
+    with open(file_path, "w", newline="", encoding="utf-8") as csv_file:
+        return write_food_storage_csv(csv_file, iter_food_storage(cursor))
+
+
+@_repository_operation(writes=False)
+def export_food_storage_json(cursor, file_path):
+    """
+    Export all food storage items to a JSON file, streaming them from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of exported items
+    """
+    with open(file_path, "w", encoding="utf-8") as json_file:
+        return write_food_storage_json(json_file, iter_food_storage(cursor))
+
+
+@_repository_operation(writes=False)
+def export_food_storage_jsonl(cursor, file_path):
+    """
+    Export all food storage items to a JSON Lines file, streaming them from the database.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of exported items
+    """
+    with open(file_path, "w", encoding="utf-8") as jsonl_file:
+        return write_food_storage_jsonl(jsonl_file, iter_food_storage(cursor))
+
+
+@_repository_operation(writes=False)
+def export_food_storage_columnar(cursor, file_path):
+    """
+    Export all food storage items to a file in the binary columnar format, streaming them from the database.
+    The values are written as stored, without building a dictionary per item.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+
+    :return: int with the number of exported items
+    """
+    columns = tuple(column for column, type_code in COLUMNAR_COLUMNS)
+    sql, parameters = _build_food_storage_query("id", False, None, None, None, None, columns=columns)
+
+    with open(file_path, "wb") as columnar_file:
+        return write_food_storage_columnar(
+            columnar_file,
+            itertools.chain.from_iterable(_fetch_in_chunks(cursor, sql, parameters, COLUMNAR_BLOCK_SIZE))
+        )
+
+
+# ONLINE BACKUP
+
+# The backup copies BACKUP_PAGES_PER_STEP pages at a time and pauses BACKUP_STEP_SLEEP seconds between steps,
+# spreading its disk reads. It runs in one read transaction of the source: in WAL mode the copy is a consistent
+# snapshot, the writes of the GUI, the server and the command-line interface go on without waiting for it,
+# and they do not make SQLite start the copy over as they would between separate read transactions.
+BACKUP_PAGES_PER_STEP = 64
+BACKUP_STEP_SLEEP = 0.002
+
+
+@_repository_operation(writes=False)
+def backup_database(cursor, file_path, pages=BACKUP_PAGES_PER_STEP, progress=None):
+    """
+    Copy the live database to a file with the SQLite online backup API.
+    The copy is made next to the file and renamed over it once complete, so file_path always holds a whole
+    database. The copy uses a rollback journal, so it is a single file that can be moved around.
+
+    :param cursor: sqlite3.Cursor
+    :param file_path: str
+    :param pages: int, number of pages copied per step, or -1 to copy them all in one step
+    :param progress: callable(remaining, total) called after each step with the numbers of pages, or None
+
+    Returns (dict):
+        - pages: int with the number of pages of the copy
+        - size: int with the size of the copy in bytes
+    """
+    if pages < 1 and pages != -1:
+        return "Pages must be greater than zero."
+
+    database_file = cursor.execute("PRAGMA database_list").fetchone()[2]
+
+    if database_file and os.path.abspath(database_file) == os.path.abspath(file_path):
+        return "Cannot back up the database onto itself."
+
+    page_count = [0]
+
+    def on_step(status, remaining, total):
+        page_count[0] = total
+
+        if progress is not None:
+            progress(remaining, total)
+
+        if remaining:
+            time.sleep(BACKUP_STEP_SLEEP)
+
+    partial_path = file_path + ".partial"
+
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    # A transaction already open on the connection is copied as it is
+    own_transaction = not cursor.connection.in_transaction
+
+    if own_transaction:
+        cursor.execute("BEGIN")
+        # The snapshot is taken by the first read
+        cursor.execute("SELECT count(*) FROM sqlite_master").fetchone()
+
+    target = sqlite3.connect(partial_path)
+    try:
+        cursor.connection.backup(target, pages=pages, progress=on_step)
+        target.execute("PRAGMA journal_mode = DELETE")
+    except BaseException:
+        target.close()
+        os.remove(partial_path)
+        raise
+    finally:
+        if own_transaction:
+            cursor.connection.rollback()
+
+    target.close()
+    os.replace(partial_path, file_path)
+
+    return {"pages": page_count[0], "size": os.path.getsize(file_path)}
+
+
+@_repository_operation(writes=False)
+def checkpoint_database(cursor):
+    """
+    Save a database served from memory back to its file (see DATABASE_IN_MEMORY), when it changed since the
+    last checkpoint. Nothing else uses the memory database, so it is copied in one step.
+
+    :param cursor: sqlite3.Cursor
+
+    Returns (dict):
+        - saved: bool, False when nothing changed since the last checkpoint
+        - pages: int with the number of pages of the file, when saved
+        - size: int with the size of the file in bytes, when saved
+    """
+    connection = cursor.connection
+    checkpoint_path = getattr(connection, "checkpoint_path", None)
+
+    if checkpoint_path is None:
+        return "The database is not loaded from a file into memory."
+
+    # Uncommitted changes are not saved
+    if connection.in_transaction:
+        return "Cannot checkpoint the database during a transaction."
+
+    total_changes = connection.total_changes
+
+    if total_changes == connection.checkpoint_changes:
+        return {"saved": False}
+
+    backup = backup_database(cursor, checkpoint_path, pages=-1)
+
+    if isinstance(backup, str):
+        return backup
+
+    connection.checkpoint_changes = total_changes
+
+    return {"saved": True, **backup}
+
+
+# COMMAND-LINE INTERFACE
+
+# File formats of the import and export commands, guessed from these file extensions
+FILE_FORMAT_EXTENSIONS = {
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".fsc": "columnar"
+}
+
+
+def _file_format(file_path, file_format):
+    if file_format:
+        return file_format
+
+    return FILE_FORMAT_EXTENSIONS.get(os.path.splitext(file_path)[1].lower(), "csv")
+
+
+def print_table(columns, rows, file=None):
+    """
+    Print rows as a plain text table with aligned columns.
+
+    :param columns: list of str
+    :param rows: list of tuples
+    :param file: text file, sys.stdout by default
+    """
+    file = file or sys.stdout
+    rows = [tuple("" if value is None else str(value) for value in row) for row in rows]
+    widths = [max([len(column)] + [len(row[index]) for row in rows]) for index, column in enumerate(columns)]
+
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)).rstrip(), file=file)
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip(), file=file)
+
+
+def print_food_storage(food_storage_items, output_format):
+    if output_format == "csv":
+        return write_food_storage_csv(sys.stdout, food_storage_items)
+
+    if output_format == "json":
+        return write_food_storage_json(sys.stdout, food_storage_items)
+
+    food_storage_items = list(food_storage_items)
+    print_table(["id", "name", "quantity", "unit", "food_type", "expiration_date"],
+                [(item["id"], item["name"], f"{item['quantity']:g}", item["unit"], item["food_type_name"],
+                  item["expiration_date"]) for item in food_storage_items])
 
-    name = name.strip()
+    return len(food_storage_items)
 
-    cursor.execute("SELECT * FROM food_type WHERE name = ?", (name,))
-    existing_food_type = cursor.fetchone()
-    if existing_food_type is not None:
-        return "A food type with this name already exists."
 
-    created_at = datetime.datetime.now()
-    updated_at = datetime.datetime.now()
+def cli_add(cursor, args):
+    food_type = read_food_type_by_name(cursor, args.food_type)
 
-    cursor.execute("""
-    INSERT INTO food_type (name, created_at, updated_at)
-    VALUES (?, ?, ?)
-    """, (name, created_at, updated_at))
+    if isinstance(food_type, str):
+        print(food_type, file=sys.stderr)
+        return 1
 
-    cursor.execute("SELECT * FROM food_type WHERE id = ?", (cursor.lastrowid,))
-    new_food_type = cursor.fetchone()
+    created_food_storage = create_food_storage(cursor, args.name, args.quantity, args.unit, food_type["id"],
+                                               args.expiration_date)
 
-    return {
-        "id": new_food_type[0],
-        "name": new_food_type[1],
-        "created_at": new_food_type[2],
-        "updated_at": new_food_type[3]
-    }
+    if isinstance(created_food_storage, str):
+        print(created_food_storage, file=sys.stderr)
+        return 1
 
+    cursor.connection.commit()
+    print(created_food_storage["id"])
 
-def read_all_food_types(cursor):
-    """
-    Retrieve all food types from the database.
+    return 0
 
-    :param cursor: sqlite3.Cursor
 
-    Returns (list):
-    list of dictionaries
-        - Each dictionary contains the following
-            - id: int
-            - name: str
-            - created_at: str
-            - updated_at: str
-    """
-    cursor.execute("""
-    SELECT * FROM food_type
-    """)
+def cli_list(cursor, args):
+    food_type_id = None
 
-    all_food_types = []
+    if args.food_type:
+        food_type = read_food_type_by_name(cursor, args.food_type)
 
-    for food_type in cursor.fetchall():
-        all_food_types.append({
-            "id": food_type[0],
-            "name": food_type[1],
-            "created_at": food_type[2],
-            "updated_at": food_type[3]
-        })
+        if isinstance(food_type, str):
+            print(food_type, file=sys.stderr)
+            return 1
 
-    return all_food_types
+        food_type_id = food_type["id"]
 
+    try:
+        food_storage_items = iter_food_storage(cursor, sort_by=args.sort_by, descending=args.descending,
+                                               food_type_id=food_type_id, name=args.name,
+                                               expiration_date_from=args.expiration_date_from,
+                                               expiration_date_to=args.expiration_date_to)
+        print_food_storage(itertools.islice(food_storage_items, args.limit), args.format)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 1
 
-def read_food_type_by_id(cursor, food_type_id):
-    """
-    Retrieve a food type by id from the database.
+    return 0
 
-    :param cursor: sqlite3.Cursor
-    :param food_type_id: int
 
-    Returns (dict):
-        - id: int
-        - name: str
-        - created_at: str
-        - updated_at: str
-    """
-    cursor.execute("""
-    SELECT * FROM food_type
-    WHERE id = ?
-    """, (food_type_id,))
-    food_type = cursor.fetchone()
+def cli_expiring(cursor, args):
+    food_storage_items = read_expiring_within(cursor, args.days, args.as_of)
 
-    if food_type is None:
-        return 'A food type with this id does not exist.'
+    if not isinstance(food_storage_items, str) and args.expired:
+        expired_food_storage = read_expired(cursor, args.as_of)
+        food_storage_items = expired_food_storage if isinstance(expired_food_storage, str) else \
+            expired_food_storage + food_storage_items
 
-    return {
-        "id": food_type[0],
-        "name": food_type[1],
-        "created_at": food_type[2],
-        "updated_at": food_type[3]
-    }
+    if isinstance(food_storage_items, str):
+        print(food_storage_items, file=sys.stderr)
+        return 1
 
+    print_food_storage(food_storage_items, args.format)
 
-def read_food_type_by_name(cursor, food_type_name):
-    """
-    Retrieve a food type by name from the database.
+    # Lets cron jobs and scripts alert when something is about to expire
+    return 2 if args.check and food_storage_items else 0
 
-    :param cursor: sqlite3.Cursor
-    :param food_type_name: str
 
-    Returns (dict):
-        - id: int
-        - name: str
-        - created_at: str
-        - updated_at: str
-    """
-    cursor.execute("""
-    SELECT * FROM food_type
-    WHERE name = ?
-    """, (food_type_name,))
-    food_type = cursor.fetchone()
+def _load_food_storage_csv(file_path):
+    with open(file_path, newline="", encoding="utf-8") as csv_file:
+        return list(csv.DictReader(csv_file))
 
-    if food_type is None:
-        return 'A food type with this name does not exist.'
 
-    return {
-        "id": food_type[0],
-        "name": food_type[1],
-        "created_at": food_type[2],
-        "updated_at": food_type[3]
+def cli_check_import(cursor, args):
+    loaders = {
+        "csv": _load_food_storage_csv,
+        "json": _load_food_storage_json,
+        "jsonl": _load_food_storage_jsonl,
+        "columnar": _load_food_storage_columnar
     }
+    food_storage_items = loaders[_file_format(args.file, args.format)](args.file)
 
+    if isinstance(food_storage_items, str):
+        print(food_storage_items, file=sys.stderr)
+        return 1
 
-def update_food_type_by_id(cursor, food_type_id, name):
-    """
-    Update a food type by id in the database.
+    report = validate_food_storage_batch(cursor, food_storage_items)
 
-    :param cursor: sqlite3.Cursor
-    :param food_type_id: int
-    :param name: str
+    if not report["errors"]:
+        print(f"All {report['row_count']} food storage items are valid.")
+        return 0
 
-    Returns (dict):
-        - id: int
-        - name: str
-        - created_at: str
-        - updated_at: str
-    """
-    existing_food_type = read_food_type_by_id(cursor, food_type_id)
+    print_table(["row", "field", "message"],
+                [(error["row"], error["field"], error["message"]) for error in report["errors"]])
 
-    if isinstance(existing_food_type, str):
-        return existing_food_type
+    return 1
 
-    if existing_food_type["name"] == "Other":
-        return "Cannot update the default food type."
 
-    if not name or name.isspace():
-        return "A food type name cannot be empty."
+def cli_import(cursor, args):
+    if args.check:
+        return cli_check_import(cursor, args)
 
-    cursor.execute("SELECT * FROM food_type WHERE name = ?", (name,))
-    existing_food_type_name = cursor.fetchone()
-    if existing_food_type_name is not None:
-        return "A food type with this name already exists."
+    importers = {
+        "csv": import_food_storage_csv,
+        "json": import_food_storage_json,
+        "jsonl": import_food_storage_jsonl,
+        "columnar": import_food_storage_columnar
+    }
+    created = importers[_file_format(args.file, args.format)](cursor, args.file)
 
-    updated_at = datetime.datetime.now()
+    if isinstance(created, str):
+        cursor.connection.rollback()
+        print(created, file=sys.stderr)
+        return 1
 
-    cursor.execute("""
-    UPDATE food_type
-    SET name = ?, updated_at = ?
-    WHERE id = ?
-    """, (name, updated_at, food_type_id))
+    cursor.connection.commit()
+    print(f"Imported {created} food storage items.")
 
-    food_type = read_food_type_by_id(cursor, food_type_id)
+    return 0
 
-    if isinstance(food_type, str):
-        return food_type
 
-    return {
-        "id": food_type["id"],
-        "name": food_type["name"],
-        "created_at": food_type["created_at"],
-        "updated_at": food_type["updated_at"]
+def cli_export(cursor, args):
+    exporters = {
+        "csv": export_food_storage_csv,
+        "json": export_food_storage_json,
+        "jsonl": export_food_storage_jsonl,
+        "columnar": export_food_storage_columnar
     }
+    exported = exporters[_file_format(args.file, args.format)](cursor, args.file)
 
+    print(f"Exported {exported} food storage items.")
 
-def delete_food_type_by_id(cursor, food_type_id):
-    """
-    Delete a food type by id from the database.
+    return 0
 
-    :param cursor: sqlite3.Cursor
-    :param food_type_id: int
-    :return: str
-    """
-    existing_food_type = read_food_type_by_id(cursor, food_type_id)
 
-    if isinstance(existing_food_type, str):
-        return existing_food_type
+def cli_backup(cursor, args):
+    backup = backup_database(cursor, args.file, args.pages)
 
-    if existing_food_type["name"] == "Other":
-        return "Cannot delete the default food type."
+    if isinstance(backup, str):
+        print(backup, file=sys.stderr)
+        return 1
 
-    cursor.execute("""
-    DELETE FROM food_type
-    WHERE id = ?
-    """, (food_type_id,))
+    print(f"Backed up {backup['pages']} pages ({backup['size']} bytes) to {args.file}.")
 
+    return 0
 
-# CRUD OPERATIONS FOR FOOD STORAGE
 
-def create_food_storage(cursor, name, quantity, unit, food_type_id, expiration_date):
-    """
-    Create a new food storage item in the database.
+def cli_types(cursor, args):
+    summary = read_food_type_summary(cursor)
 
-    :param cursor: sqlite3.Cursor
-    :param name: str
-    :param quantity: float
-    :param unit: str
-    :param food_type_id: int
-    :param expiration_date: str
+    if args.format == "json":
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return 0
 
-    Returns (dict):
-        - id: int
-        - name: str
-        - quantity: float
-        - unit: str
-        - food_type_id: int
-        - expiration_date: str
-        - created_at: str
-        - updated_at: str
-    """
-    if not name or name.isspace():
-        return "Name cannot be empty."
+    print_table(["id", "name", "items", "quantities", "nearest_expiration_date"],
+                [(food_type["id"], food_type["name"], food_type["item_count"],
+                  ", ".join(f"{quantity:g} {unit}" for unit, quantity in food_type["quantities"].items()),
+                  food_type["nearest_expiration_date"]) for food_type in summary])
 
-    name = name.strip()
+    return 0
 
-    try:
-        quantity = float(quantity)
-    except ValueError:
-        return "Quantity must be a number."
 
-    if quantity < 0:
-        return "Quantity cannot be negative."
+def cli_totals(cursor, args):
+    food_type_id = None
 
-    if not unit or unit.isspace():
-        return "Unit cannot be empty."
+    if args.food_type:
+        food_type = read_food_type_by_name(cursor, args.food_type)
 
-    unit = unit.strip()
+        if isinstance(food_type, str):
+            print(food_type, file=sys.stderr)
+            return 1
 
-    existing_food_type = read_food_type_by_id(cursor, food_type_id)
+        food_type_id = food_type["id"]
 
-    if isinstance(existing_food_type, str):
-        return existing_food_type
+    totals = read_quantity_totals(cursor, args.by, food_type_id)
 
-    if not expiration_date or expiration_date.isspace():
-        return "Expiration Date cannot be empty."
+    if args.format == "json":
+        json.dump(totals, sys.stdout, indent=2)
+        print()
+        return 0
 
-    try:
-        datetime.datetime.strptime(expiration_date, "%Y-%m-%d")
-    except ValueError:
-        return "Expiration Date must be in the format YYYY-MM-DD."
+    print_table(["name", "totals"],
+                [(group["name"], ", ".join(f"{quantity:g} {unit}" for unit, quantity in group["totals"].items()))
+                 for group in totals])
 
-    created_at = datetime.datetime.now()
-    updated_at = datetime.datetime.now()
+    return 0
 
-    cursor.execute("""
-    INSERT INTO food_storage (name, quantity, unit, food_type_id, expiration_date, created_at, updated_at)
-    VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (name, quantity, unit, food_type_id, expiration_date, created_at, updated_at))
 
-    cursor.execute("SELECT * FROM food_storage WHERE id = ?", (cursor.lastrowid,))
+def cli_forecast(cursor, args):
+    forecast = forecast_depletion(cursor, args.history_days, args.as_of)
 
-    new_food_storage = cursor.fetchone()
+    if isinstance(forecast, str):
+        print(forecast, file=sys.stderr)
+        return 1
 
-    return {
-        "id": new_food_storage[0],
-        "name": new_food_storage[1],
-        "quantity": new_food_storage[2],
-        "unit": new_food_storage[3],
-        "food_type_id": new_food_storage[4],
-        "expiration_date": new_food_storage[5],
-        "created_at": new_food_storage[6],
-        "updated_at": new_food_storage[7]
-    }
+    # Only the items running out, soonest first
+    forecast = sorted((item for item in forecast if item["depletion_date"] is not None),
+                      key=lambda item: (item["depletion_date"], item["id"]))
 
+    if args.format == "json":
+        json.dump(forecast, sys.stdout, indent=2)
+        print()
+        return 0
 
-def read_all_food_storage(cursor):
-    """
-    Retrieve all food storage items from the database.
+    print_table(["id", "name", "quantity", "unit", "daily_consumption", "depletion_date"],
+                [(item["id"], item["name"], f"{item['quantity']:g}", item["unit"],
+                  "" if item["daily_consumption"] is None else f"{item['daily_consumption']:g}",
+                  item["depletion_date"]) for item in forecast])
 
-    :param cursor: sqlite3.Cursor
+    return 0
 
-    Returns (list):
-    list of dictionaries
-        - Each dictionary contains the following
-            - id: int
-            - name: str
-            - quantity: float
-            - unit: str
-            - food_type_id: int
-            - food_type_name: str
-            - expiration_date: str
-            - created_at: str
-            - updated_at: str
-    """
-    cursor.execute("""
-        SELECT
-            food_storage.id,
-            food_storage.name,
-            food_storage.quantity,
-            food_storage.unit,
-            food_storage.food_type_id,
-            food_type.name,
-            food_storage.expiration_date,
-            food_storage.created_at,
-            food_storage.updated_at
-        FROM food_storage
-        LEFT JOIN food_type
-        ON food_storage.food_type_id = food_type.id
-    """)
 
+def cli_serve(cursor, args):
+    # Imported here so the other commands do not load http.server
+    from food_storage_manager_server import serve
 
-    all_food_storage = []
+    serve(args.host, args.port, DATABASE_PATH)
 
-    for food_storage in cursor.fetchall():
-        all_food_storage.append({
-            "id": food_storage[0],
-            "name": food_storage[1],
-            "quantity": food_storage[2],
-            "unit": food_storage[3],
-            "food_type_id": food_storage[4],
-            "food_type_name": food_storage[5],
-            "expiration_date": food_storage[6],
-            "created_at": food_storage[7],
-            "updated_at": food_storage[8]
-        })
+    return 0
 
-    return all_food_storage
 
+def build_argument_parser():
+    parser = argparse.ArgumentParser(prog="food_storage_manager",
+                                     description="Manage the food storage. Starts the GUI without a command.")
+    parser.add_argument("--database", help=f"database file (default: {DATABASE_PATH})")
+    parser.add_argument("--in-memory", action="store_true",
+                        help="load the database file into memory and save it back at checkpoints and on exit")
+    parser.add_argument("--checkpoint-interval", type=int,
+                        help=f"seconds between checkpoints with --in-memory (default: {CHECKPOINT_INTERVAL_SECONDS})")
+    commands = parser.add_subparsers(dest="command", metavar="command")
 
-def read_food_storage_by_id(cursor, food_storage_id):
-    """
-    Retrieve a food storage item by id from the database.
+    add_parser = commands.add_parser("add", help="add a food storage item")
+    add_parser.add_argument("name")
+    add_parser.add_argument("quantity", type=float)
+    add_parser.add_argument("unit")
+    add_parser.add_argument("food_type", help="food type name")
+    add_parser.add_argument("expiration_date", help="YYYY-MM-DD")
+    add_parser.set_defaults(handler=cli_add)
 
-    :param cursor: sqlite3.Cursor
-    :param food_storage_id: int
+    output_formats = ["table", "csv", "json"]
+    file_formats = ["csv", "json", "jsonl", "columnar"]
 
-    Returns (dict):
-        - id: int
-        - name: str
-        - quantity: float
-        - unit: str
-        - food_type_id: int
-        - expiration_date: str
-        - created_at: str
-        - updated_at: str
+    list_parser = commands.add_parser("list", help="list food storage items")
+    list_parser.add_argument("--type", dest="food_type", help="only items of this food type")
+    list_parser.add_argument("--name", help="only items whose name contains this text")
+    list_parser.add_argument("--from", dest="expiration_date_from", help="only items expiring on or after YYYY-MM-DD")
+    list_parser.add_argument("--to", dest="expiration_date_to", help="only items expiring on or before YYYY-MM-DD")
+    list_parser.add_argument("--sort-by", default="id", choices=sorted(FOOD_STORAGE_SORT_COLUMNS))
+    list_parser.add_argument("--descending", action="store_true")
+    list_parser.add_argument("--limit", type=int, help="maximum number of items")
+    list_parser.add_argument("--format", default="table", choices=output_formats)
+    list_parser.set_defaults(handler=cli_list)
+
+    expiring_parser = commands.add_parser("expiring", help="list the items expiring soon")
+    expiring_parser.add_argument("--days", type=int, default=7, help="days ahead (default: 7)")
+    expiring_parser.add_argument("--as-of", help="YYYY-MM-DD, today by default")
+    expiring_parser.add_argument("--expired", action="store_true", help="include the already expired items")
+    expiring_parser.add_argument("--check", action="store_true", help="exit with status 2 when any item is listed")
+    expiring_parser.add_argument("--format", default="table", choices=output_formats)
+    expiring_parser.set_defaults(handler=cli_expiring)
+
+    import_parser = commands.add_parser("import", help="import food storage items from a file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--format", choices=file_formats,
+                               help="guessed from the file extension by default: .csv, .json, .jsonl or .fsc")
+    import_parser.add_argument("--check", action="store_true",
+                               help="only validate the file, listing every invalid value")
+    import_parser.set_defaults(handler=cli_import)
+
+    export_parser = commands.add_parser("export", help="export all food storage items to a file")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--format", choices=file_formats,
+                               help="guessed from the file extension by default: .csv, .json, .jsonl or .fsc")
+    export_parser.set_defaults(handler=cli_export)
+
+    backup_parser = commands.add_parser("backup", help="copy the database to a file while it is in use")
+    backup_parser.add_argument("file")
+    backup_parser.add_argument("--pages", type=int, default=BACKUP_PAGES_PER_STEP,
+                               help=f"pages copied per step (default: {BACKUP_PAGES_PER_STEP})")
+    backup_parser.set_defaults(handler=cli_backup)
+
+    types_parser = commands.add_parser("types", help="list the food types with their inventory totals")
+    types_parser.add_argument("--format", default="table", choices=["table", "json"])
+    types_parser.set_defaults(handler=cli_types)
+
+    totals_parser = commands.add_parser("totals", help="total the quantities in canonical units (kg, l, unit)")
+    totals_parser.add_argument("--by", default="food_type", choices=["food_type", "name"])
+    totals_parser.add_argument("--type", dest="food_type", help="only items of this food type")
+    totals_parser.add_argument("--format", default="table", choices=["table", "json"])
+    totals_parser.set_defaults(handler=cli_totals)
+
+    forecast_parser = commands.add_parser("forecast", help="list the items running out, from their consumption")
+    forecast_parser.add_argument("--history-days", type=int, default=FORECAST_HISTORY_DAYS,
+                                 help=f"days of quantity history to fit (default: {FORECAST_HISTORY_DAYS})")
+    forecast_parser.add_argument("--as-of", help="YYYY-MM-DD, now by default")
+    forecast_parser.add_argument("--format", default="table", choices=["table", "json"])
+    forecast_parser.set_defaults(handler=cli_forecast)
+
+    serve_parser = commands.add_parser("serve", help="serve the HTTP JSON API (see food_storage_manager_server)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    serve_parser.add_argument("--port", type=int, default=8080, help="port to listen on (default: 8080)")
+    serve_parser.set_defaults(handler=cli_serve)
+
+    return parser
+
+
+def run_cli(args):
     """
-    cursor.execute("""
-    SELECT * FROM food_storage
-    WHERE id = ?
-    """, (food_storage_id,))
-    food_storage = cursor.fetchone()
+    Run a command of the command-line interface.
 
-    if food_storage is None:
-        return "A food storage with this id does not exist."
+    :param args: argparse.Namespace from build_argument_parser
+    :return: int with the exit status
+    """
+    connection, cursor = database_connection()
 
-    return {
-        "id": food_storage[0],
-        "name": food_storage[1],
-        "quantity": food_storage[2],
-        "unit": food_storage[3],
-        "food_type_id": food_storage[4],
-        "expiration_date": food_storage[5],
-        "created_at": food_storage[6],
-        "updated_at": food_storage[7]
-    }
+    try:
+        seed_empty_database(cursor)
+        connection.commit()
 
+        return args.handler(cursor, args)
+    finally:
+        if connection.checkpoint_path is not None:
+            # The commands commit what they keep
+            connection.rollback()
+            checkpoint_database(cursor)
 
-def update_food_storage_by_id(cursor, food_storage_id, name, quantity, unit, food_type_id, expiration_date):
-    """
-    Update a food storage item by id in the database.
+        connection.close()
 
-    :param cursor: sqlite3.Cursor
-    :param food_storage_id: int
-    :param name: str
-    :param quantity: float
-    :param unit: str
-    :param food_type_id: int
-    :param expiration_date: str
 
-    Returns (dict):
-        - id: int
-        - name: str
-        - quantity: float
-        - unit: str
-        - food_type_id: int
-        - expiration_date: str
-        - created_at: str
-        - updated_at: str
+# GUI DATABASE WORKER
+
+class DatabaseWorker:
+    """
+    Background thread owning the database connection of the GUI.
+    Jobs run one at a time in the order they were submitted. Their results are handed back to the
+    Tk thread by polling with ROOT.after, so the main loop never waits for the database.
     """
-    existing_food_type = read_food_type_by_id(cursor, food_type_id)
 
-    if isinstance(existing_food_type, str):
-        return existing_food_type
+    def __init__(self, root, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.pending_jobs = 0
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="database-worker", daemon=True)
+        self._thread.start()
+        self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, function, *args, callback=None, error_callback=None, commit=False, quiet=False):
+        """
+        Run function(cursor, *args) on the worker thread, then callback(result) on the Tk thread.
+        When the function raises, the error is shown and error_callback(error) is called instead.
+
+        :param function: callable taking a sqlite3.Cursor as first argument
+        :param callback: callable taking the result of the function, or None
+        :param error_callback: callable taking the exception raised by the function, or None
+        :param commit: bool, commit when the function does not return an error message
+        :param quiet: bool, do not show the busy state for this job, like for background polling
+        """
+        if not quiet:
+            self.pending_jobs += 1
+            set_busy(True)
+
+        self._jobs.put((function, args, callback, error_callback, commit, quiet))
+
+    def stop(self):
+        self._jobs.put(None)
+        self._thread.join()
+
+    def _run(self):
+        connection, cursor = database_connection()
+
+        try:
+            while True:
+                job = self._jobs.get()
+
+                if job is None:
+                    break
+
+                function, args, callback, error_callback, commit, quiet = job
+                start = time.perf_counter()
+
+                try:
+                    result = function(cursor, *args)
+
+                    if connection.in_transaction:
+                        if commit and not isinstance(result, str):
+                            connection.commit()
+                        else:
+                            connection.rollback()
+                            invalidate_food_type_registry()
+
+                    self._results.put((callback, error_callback, result, None, quiet))
+                except Exception as e:
+                    if connection.in_transaction:
+                        connection.rollback()
+                    invalidate_food_type_registry()
+                    self._results.put((callback, error_callback, None, e, quiet))
+
+                if INSTRUMENTATION["enabled"]:
+                    # The whole job, commit included, as the GUI waits for it
+                    name = getattr(function, "func", function).__name__
+                    record_latency(f"job:{name}", time.perf_counter() - start)
+        finally:
+            if connection.checkpoint_path is not None:
+                checkpoint_database(cursor)
+
+            connection.close()
+
+    def _poll(self):
+        while True:
+            try:
+                callback, error_callback, result, error, quiet = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            if not quiet:
+                self.pending_jobs -= 1
+
+            if error is not None:
+                tk.messagebox.showerror("Unknown Error:", str(error))
+
+                if error_callback is not None:
+                    error_callback(error)
+            elif callback is not None:
+                start = time.perf_counter()
+                callback(result)
+
+                if INSTRUMENTATION["enabled"]:
+                    record_latency(f"gui:{callback.__qualname__.replace('.<locals>.', '.')}",
+                                   time.perf_counter() - start)
+
+        set_busy(self.pending_jobs > 0)
+        self.root.after(self.poll_interval, self._poll)
+
+
+def set_busy(busy):
+    ROOT.configure(cursor="watch" if busy else "")
+    STATUS_LABEL.configure(text="Working..." if busy else "")
+
+
+def request_refresh(name, function, callback):
+    """
+    Read data for a view on the worker thread, coalescing repeated requests:
+    while a refresh of the view is running, further requests only schedule one more run after it.
 
-    if not name or name.isspace():
-        return "Name cannot be empty."
+    :param name: str with the name of the view
+    :param function: callable taking a sqlite3.Cursor and returning the data of the view
+    :param callback: callable showing the data on the Tk thread
+    """
+    refresh = PENDING_REFRESHES.setdefault(name, {"running": False, "again": None})
 
-    name = name.strip()
+    if refresh["running"]:
+        # The latest request wins, its function may read newer inputs
+        refresh["again"] = (function, callback)
+        return
 
-    try:
-        quantity = float(quantity)
-    except ValueError:
-        return "Quantity must be a number."
+    def run_again():
+        refresh["running"] = False
 
-    if quantity < 0:
-        return "Quantity cannot be negative."
+        if refresh["again"] is not None:
+            again, refresh["again"] = refresh["again"], None
+            request_refresh(name, *again)
 
-    if not unit or unit.isspace():
-        return "Unit cannot be empty."
+    def on_refresh_done(result):
+        refresh["running"] = False
+        callback(result)
+        run_again()
 
-    unit = unit.strip()
+    def on_refresh_failed(error):
+        run_again()
 
-    if not expiration_date or expiration_date.isspace():
-        return "Expiration Date cannot be empty."
+    refresh["running"] = True
+    DATABASE_WORKER.submit(function, callback=on_refresh_done, error_callback=on_refresh_failed)
 
-    try:
-        datetime.datetime.strptime(expiration_date, "%Y-%m-%d")
-    except ValueError:
-        return "Expiration Date must be in the format YYYY-MM-DD."
 
-    existing_food_storage = read_food_storage_by_id(cursor, food_storage_id)
+# GUI TREEVIEW HELPERS
 
-    if isinstance(existing_food_storage, str):
-        return existing_food_storage
+def sync_treeview(tree, shown_rows, rows):
+    """
+    Make a Treeview show rows, only touching the items that were inserted, changed or removed,
+    so the selection and scroll position of the other items are kept.
+    Items are keyed by their database id and rows must come in a stable order, like ascending id.
 
-    updated_at = datetime.datetime.now()
+    :param tree: ttk.Treeview
+    :param shown_rows: dict of item id to the values shown by the tree, updated in place
+    :param rows: list of tuples with the values of each row, the database id first
+    :return: None
+    """
+    wanted_rows = {str(values[0]) for values in rows}
+    removed_rows = [iid for iid in shown_rows if iid not in wanted_rows]
 
-    cursor.execute("""
-    UPDATE food_storage
-    SET name = ?, quantity = ?, unit = ?, food_type_id = ?, expiration_date = ?, updated_at = ?
-    WHERE id = ?
-    """, (name, quantity, unit, food_type_id, expiration_date, updated_at, food_storage_id))
+    if removed_rows:
+        tree.delete(*removed_rows)
+        for iid in removed_rows:
+            del shown_rows[iid]
 
-    food_storage = read_food_storage_by_id(cursor, food_storage_id)
+    for index, values in enumerate(rows):
+        iid = str(values[0])
+        shown_values = shown_rows.get(iid)
 
-    if isinstance(food_storage, str):
-        return food_storage
+        if shown_values is None:
+            tree.insert('', index, iid=iid, values=values)
+        elif shown_values != values:
+            tree.item(iid, values=values)
+        else:
+            continue
 
-    return {
-        "id": food_storage["id"],
-        "name": food_storage["name"],
-        "quantity": food_storage["quantity"],
-        "unit": food_storage["unit"],
-        "food_type_id": food_storage["food_type_id"],
-        "expiration_date": food_storage["expiration_date"],
-        "created_at": food_storage["created_at"],
-        "updated_at": food_storage["updated_at"]
-    }
+        shown_rows[iid] = values
 
 
-def delete_food_storage_by_id(cursor, food_storage_id):
-    """
-    Delete a food storage item by id from the database.
+def food_storage_tree_values(food_storage):
+    # The listings already read FoodStorageRow tuples of FOOD_STORAGE_TREE_COLUMNS; this is for the dictionaries
+    # returned by the writes and by read_food_storage_by_ids
+    return tuple(food_storage[column] for column in FOOD_STORAGE_TREE_COLUMNS)
 
-    :param cursor: sqlite3.Cursor
-    :param food_storage_id: int
-    :return: None
-    """
-    existing_food_storage = read_food_storage_by_id(cursor, food_storage_id)
 
-    if isinstance(existing_food_storage, str):
-        return existing_food_storage
+def food_type_tree_values(food_type):
+    # Food types read without their summary, like a created one, have no items yet
+    quantities = ", ".join(f"{quantity:g} {unit}" for unit, quantity in food_type.get("quantities", {}).items())
 
-    cursor.execute("""
-    DELETE FROM food_storage
-    WHERE id = ?
-    """, (food_storage_id,))
+    return (food_type["id"], food_type["name"], food_type.get("item_count", 0), quantities,
+            food_type.get("nearest_expiration_date") or "")
 
 
 # GUI FOOD TYPE MANAGEMENT
@@ -567,25 +4153,6 @@ def on_food_type_treeview_select(event):
     FOOD_TYPE_NAME_ENTRY.insert(0, food_type[1])
 
 
-def update_non_existing_food_type_to_other():
-    food_type = read_food_type_by_name(CURSOR, "Other")
-
-    if isinstance(food_type, str):
-        tk.messagebox.showerror("Error", food_type)
-        return
-
-    default_food_type_id = food_type["id"]
-
-    all_food_storage = read_all_food_storage(CURSOR)
-    all_food_types_id = [str(ft["id"]) for ft in read_all_food_types(CURSOR)]
-
-    for food_storage in all_food_storage:
-
-        if str(food_storage["food_type_id"]) not in all_food_types_id:
-            update_food_storage_by_id(CURSOR, food_storage["id"], food_storage["name"], food_storage["quantity"],
-                                      food_storage["unit"], default_food_type_id, food_storage["expiration_date"])
-
-
 def create_food_type_tab():
     global FOOD_TYPE_NAME_ENTRY, FOOD_TYPE_TREE
 
@@ -601,7 +4168,7 @@ def create_food_type_tab():
     tk.Button(food_type_tab, text="Update", command=on_update_food_type).grid(row=1, column=1)
     tk.Button(food_type_tab, text="Delete", command=on_delete_food_type).grid(row=1, column=2)
 
-    columns = ("id", "name")
+    columns = ("id", "name", "items", "quantities", "nearest_expiration_date")
     FOOD_TYPE_TREE = ttk.Treeview(food_type_tab, columns=columns, show="headings")
     for col in columns:
         FOOD_TYPE_TREE.heading(col, text=col)
@@ -613,19 +4180,48 @@ def create_food_type_tab():
     load_food_type_data()
 
 
+@instrumented("gui")
 def load_food_type_data():
-    try:
-        FOOD_TYPE_NAME_ENTRY.delete(0, tk.END)
+    FOOD_TYPE_NAME_ENTRY.delete(0, tk.END)
+
+    refresh_food_type_summary()
+
+
+def refresh_food_type_summary():
+    request_refresh("food_type", read_food_type_summary, show_food_type_data)
+
+
+def show_food_type_data(food_types):
+    sync_treeview(FOOD_TYPE_TREE, FOOD_TYPE_ROWS, [food_type_tree_values(item) for item in food_types])
+    FOOD_TYPE_NAME_COMBOBOX['values'] = [ft["name"] for ft in food_types]
 
-        for item in FOOD_TYPE_TREE.get_children():
-            FOOD_TYPE_TREE.delete(item)
-        food_types = read_all_food_types(CURSOR)
-        for item in food_types:
-            FOOD_TYPE_TREE.insert('', 'end', values=(item["id"], item["name"]))
-    except Exception as e:
-        tk.messagebox.showerror("Unknown Error:", str(e))
 
+def refresh_food_type_row(food_type_id, food_type=None):
+    """
+    Refresh the row of one food type after it was created, updated or deleted, without touching the others.
+
+    :param food_type_id: int
+    :param food_type: dict with the food type, or None when it was deleted
+    """
+    iid = str(food_type_id)
+
+    if food_type is None:
+        if iid in FOOD_TYPE_ROWS:
+            FOOD_TYPE_TREE.delete(iid)
+            del FOOD_TYPE_ROWS[iid]
+    elif iid in FOOD_TYPE_ROWS:
+        # Renaming a food type does not change its totals
+        FOOD_TYPE_ROWS[iid] = food_type_tree_values(food_type)[:2] + FOOD_TYPE_ROWS[iid][2:]
+        FOOD_TYPE_TREE.item(iid, values=FOOD_TYPE_ROWS[iid])
+    else:
+        FOOD_TYPE_ROWS[iid] = food_type_tree_values(food_type)
+        FOOD_TYPE_TREE.insert('', 'end', iid=iid, values=FOOD_TYPE_ROWS[iid])
+
+    FOOD_TYPE_NAME_ENTRY.delete(0, tk.END)
+    FOOD_TYPE_NAME_COMBOBOX['values'] = [values[1] for values in FOOD_TYPE_ROWS.values()]
 
+
+@instrumented("gui")
 def on_create_food_type():
     name = FOOD_TYPE_NAME_ENTRY.get()
 
@@ -633,19 +4229,19 @@ def on_create_food_type():
         tk.messagebox.showerror("Error", "Name cannot be empty.")
         return
 
-    created_food_type = create_food_type(CURSOR, name)
+    def on_created(created_food_type):
+        if isinstance(created_food_type, str):
+            tk.messagebox.showerror("Error", created_food_type)
+            return
 
-    if isinstance(created_food_type, str):
-        tk.messagebox.showerror("Error", created_food_type)
-        return
+        refresh_food_type_row(created_food_type["id"], created_food_type)
 
-    load_food_type_data()
-    load_food_storage_data()
-    CURSOR.connection.commit()
+        tk.messagebox.showinfo("Success", "Food Type created successfully.")
 
-    tk.messagebox.showinfo("Success", "Food Type created successfully.")
+    DATABASE_WORKER.submit(create_food_type, name, callback=on_created, commit=True)
 
 
+@instrumented("gui")
 def on_update_food_type():
     try:
         selected_item = FOOD_TYPE_TREE.selection()[0]
@@ -663,19 +4259,21 @@ def on_update_food_type():
         tk.messagebox.showerror("Error", "Name cannot be empty.")
         return
 
-    updated_food_type = update_food_type_by_id(CURSOR, food_type_id, name)
+    def on_updated(updated_food_type):
+        if isinstance(updated_food_type, str):
+            tk.messagebox.showerror("Error", updated_food_type)
+            return
 
-    if isinstance(updated_food_type, str):
-        tk.messagebox.showerror("Error", updated_food_type)
-        return
+        refresh_food_type_row(updated_food_type["id"], updated_food_type)
+        # Only the rows of this food type change, so the food storage Treeview diff stays small
+        load_food_storage_data()
 
-    load_food_type_data()
-    load_food_storage_data()
-    CURSOR.connection.commit()
+        tk.messagebox.showinfo("Success", "Food Type updated successfully.")
 
-    tk.messagebox.showinfo("Success", "Food Type updated successfully.")
+    DATABASE_WORKER.submit(update_food_type_by_id, food_type_id, name, callback=on_updated, commit=True)
 
 
+@instrumented("gui")
 def on_delete_food_type():
     try:
         selected_item = FOOD_TYPE_TREE.selection()[0]
@@ -688,94 +4286,81 @@ def on_delete_food_type():
 
     food_type_id = FOOD_TYPE_TREE.item(selected_item, "values")[0]
 
-    deleted_food_type = delete_food_type_by_id(CURSOR, food_type_id)
-
-    if isinstance(deleted_food_type, str):
-        tk.messagebox.showerror("Error", deleted_food_type)
-        return
+    def on_deleted(deleted_food_type):
+        if isinstance(deleted_food_type, str):
+            tk.messagebox.showerror("Error", deleted_food_type)
+            return
 
-    update_non_existing_food_type_to_other()
+        refresh_food_type_row(food_type_id)
+        # The food storage items of the deleted food type moved to "Other"
+        refresh_food_type_summary()
+        load_food_storage_data()
 
-    load_food_type_data()
-    load_food_storage_data()
-    CURSOR.connection.commit()
+        tk.messagebox.showinfo("Success", "Food Type deleted successfully.")
 
-    tk.messagebox.showinfo("Success", "Food Type deleted successfully.")
+    DATABASE_WORKER.submit(delete_food_type_by_id, food_type_id, callback=on_deleted, commit=True)
 
 
 # GUI FOOD STORAGE MANAGEMENT
 
 def get_food_storage_inputs():
     """
-    Retrieve the user inputs from the entry fields.
+    Retrieve the user inputs from the entry fields, showing all their errors at once.
+    The food type is only checked by name here; it is looked up on the database worker.
 
     Returns (dict):
         - name: str
         - quantity: float
         - unit: str
-        - food_type: dict
+        - food_type_name: str
         - expiration_date: str
     """
-    name = ENTRY_NAME.get()
-
-    if not name:
-        tk.messagebox.showerror("Error", "Name cannot be empty.")
-        return
-
-    quantity = ENTRY_QUANTITY.get()
-
-    if not quantity:
-        tk.messagebox.showerror("Error", "Quantity cannot be empty.")
-        return
-    try:
-        quantity = float(quantity)
-    except ValueError:
-        tk.messagebox.showerror("Error", "Quantity must be a number.")
-        return
+    inputs = {
+        "name": ENTRY_NAME.get(),
+        "quantity": ENTRY_QUANTITY.get(),
+        "unit": ENTRY_UNITY.get(),
+        "food_type_name": FOOD_TYPE_NAME_COMBOBOX.get(),
+        "expiration_date": ENTRY_EXPIRATION_DATE.get()
+    }
+    values, errors = check_food_storage_fields(inputs)
 
-    if quantity < 0:
-        tk.messagebox.showerror("Error", "Quantity cannot be negative.")
+    if errors:
+        tk.messagebox.showerror("Error", "\n".join(message for field, message in errors))
         return
 
-    unit = ENTRY_UNITY.get()
+    inputs["quantity"] = values[1]
 
-    if not unit:
-        tk.messagebox.showerror("Error", "Unit cannot be empty.")
-        return
+    return inputs
 
-    food_type_name = FOOD_TYPE_NAME_COMBOBOX.get()
 
-    if not food_type_name:
-        tk.messagebox.showerror("Error", "Food Type cannot be empty.")
-        return
+def save_food_storage_inputs(cursor, food_storage_id, inputs):
+    """
+    Create (food_storage_id is None) or update a food storage item from the GUI inputs.
+    Runs on the database worker.
 
-    food_type = read_food_type_by_name(CURSOR, food_type_name)
+    :return: dict shaped like the ones of read_all_food_storage, or str with the error
+    """
+    food_type = read_food_type_by_name(cursor, inputs["food_type_name"])
 
     if isinstance(food_type, str):
-        tk.messagebox.showerror("Error", food_type)
-        return
+        return food_type
 
-    expiration_date = ENTRY_EXPIRATION_DATE.get()
+    if food_storage_id is None:
+        food_storage = create_food_storage(cursor, inputs["name"], inputs["quantity"], inputs["unit"],
+                                           food_type["id"], inputs["expiration_date"])
+    else:
+        food_storage = update_food_storage_by_id(cursor, food_storage_id, inputs["name"], inputs["quantity"],
+                                                 inputs["unit"], food_type["id"], inputs["expiration_date"])
 
-    if not expiration_date:
-        tk.messagebox.showerror("Error", "Expiration Date cannot be empty.")
-        return
+    if isinstance(food_storage, str):
+        return food_storage
 
-    try:
-        datetime.datetime.strptime(expiration_date, "%Y-%m-%d")
-    except ValueError:
-        tk.messagebox.showerror("Error", "Expiration Date must be in the format YYYY-MM-DD.")
-        return
+    food_storage["food_type_name"] = food_type["name"]
 
-    return {
-        "name": name,
-        "quantity": quantity,
-        "unit": unit,
-        "food_type": food_type,
-        "expiration_date": expiration_date
-    }
+    return food_storage
 
 
+@instrumented("gui")
 def on_create_food_storage():
     inputs = get_food_storage_inputs()
 
@@ -783,19 +4368,19 @@ def on_create_food_storage():
         tk.messagebox.showerror("Error", "Please fill in all fields.")
         return
 
-    created_food_storage = create_food_storage(CURSOR, inputs["name"], inputs["quantity"], inputs["unit"],
-                                               inputs["food_type"]["id"], inputs["expiration_date"])
+    def on_created(created_food_storage):
+        if isinstance(created_food_storage, str):
+            tk.messagebox.showerror("Error", created_food_storage)
+            return
 
-    if isinstance(created_food_storage, str):
-        tk.messagebox.showerror("Error", created_food_storage)
-        return
+        refresh_food_storage_row(created_food_storage["id"], created_food_storage)
 
-    load_food_storage_data()
-    CURSOR.connection.commit()
+        tk.messagebox.showinfo("Success", "Food Storage item created successfully.")
 
-    tk.messagebox.showinfo("Success", "Food Storage item created successfully.")
+    DATABASE_WORKER.submit(save_food_storage_inputs, None, inputs, callback=on_created, commit=True)
 
 
+@instrumented("gui")
 def on_update_food_storage():
     try:
         selected_item = FOOD_STORAGE_TREE.selection()[0]
@@ -814,21 +4399,20 @@ def on_update_food_storage():
     if not inputs:
         return
 
-    updated_food_storage = update_food_storage_by_id(CURSOR, food_storage_id, inputs["name"], inputs["quantity"],
-                                                     inputs["unit"], inputs["food_type"]["id"],
-                                                     inputs["expiration_date"])
+    def on_updated(updated_food_storage):
+        # if updated_food_storage is a string, it means an error occurred
+        if isinstance(updated_food_storage, str):
+            tk.messagebox.showerror("Unknown Error", updated_food_storage)
+            return
 
-    # if updated_food_storage is a string, it means an error occurred
-    if isinstance(updated_food_storage, str):
-        tk.messagebox.showerror("Unknown Error", updated_food_storage)
-        return
+        refresh_food_storage_row(updated_food_storage["id"], updated_food_storage)
 
-    load_food_storage_data()
-    CURSOR.connection.commit()
+        tk.messagebox.showinfo("Success", "Food Storage item updated successfully.")
 
-    tk.messagebox.showinfo("Success", "Food Storage item updated successfully.")
+    DATABASE_WORKER.submit(save_food_storage_inputs, food_storage_id, inputs, callback=on_updated, commit=True)
 
 
+@instrumented("gui")
 def on_delete_food_storage():
     food_storage_id = None
 
@@ -842,16 +4426,16 @@ def on_delete_food_storage():
         tk.messagebox.showerror("Error", "Please select an item.")
         return
 
-    deleted_food_storage = delete_food_storage_by_id(CURSOR, food_storage_id)
+    def on_deleted(deleted_food_storage):
+        if isinstance(deleted_food_storage, str):
+            tk.messagebox.showerror("Unknown Error", deleted_food_storage)
+            return
 
-    if isinstance(deleted_food_storage, str):
-        tk.messagebox.showerror("Unknown Error", deleted_food_storage)
-        return
+        refresh_food_storage_row(food_storage_id)
 
-    load_food_storage_data()
-    CURSOR.connection.commit()
+        tk.messagebox.showinfo("Success", "Food Storage item deleted successfully.")
 
-    tk.messagebox.showinfo("Success", "Food Storage item deleted successfully.")
+    DATABASE_WORKER.submit(delete_food_storage_by_id, food_storage_id, callback=on_deleted, commit=True)
 
 
 def on_food_storage_treeview_select(event):
@@ -880,25 +4464,391 @@ def on_food_storage_treeview_select(event):
     ENTRY_EXPIRATION_DATE.insert(0, food_storage[5])
 
 
+def clear_food_storage_inputs():
+    ENTRY_NAME.delete(0, tk.END)
+    ENTRY_QUANTITY.delete(0, tk.END)
+    ENTRY_UNITY.delete(0, tk.END)
+    ENTRY_EXPIRATION_DATE.delete(0, tk.END)
+    FOOD_TYPE_NAME_COMBOBOX.set('')
+
+
+def read_food_storage_view_data(cursor, search_query=""):
+    """
+    Read what the food storage tab shows. Runs on the database worker.
+    Inventories bigger than VIRTUAL_TABLE_THRESHOLD are not read, the virtualized table reads their pages.
+    With a search query only the best FOOD_STORAGE_SEARCH_LIMIT matches are read.
+
+    Returns (dict):
+        - total: int
+        - food_storage: list of FoodStorageRow tuples of FOOD_STORAGE_TREE_COLUMNS, or None
+        - food_type_names: list of str
+        - search_query: str
+    """
+    if search_query:
+        food_storage_items = search_food_storage(cursor, search_query, FOOD_STORAGE_SEARCH_LIMIT,
+                                                 columns=FOOD_STORAGE_TREE_COLUMNS)
+        total = len(food_storage_items)
+    else:
+        total = count_food_storage(cursor)
+        food_storage_items = read_all_food_storage(cursor, columns=FOOD_STORAGE_TREE_COLUMNS) \
+            if total <= VIRTUAL_TABLE_THRESHOLD else None
+
+    return {
+        "total": total,
+        "food_storage": food_storage_items,
+        "food_type_names": [ft["name"] for ft in read_all_food_types(cursor)],
+        "search_query": search_query
+    }
+
+
+@instrumented("gui")
 def load_food_storage_data():
-    try:
-        ENTRY_NAME.delete(0, tk.END)
-        ENTRY_QUANTITY.delete(0, tk.END)
-        ENTRY_UNITY.delete(0, tk.END)
-        ENTRY_EXPIRATION_DATE.delete(0, tk.END)
-        FOOD_TYPE_NAME_COMBOBOX.set('')
+    clear_food_storage_inputs()
+    reload_food_storage_view()
+
+
+def reload_food_storage_view():
+    search_query = FOOD_STORAGE_SEARCH_ENTRY.get().strip()
+    request_refresh("food_storage", functools.partial(read_food_storage_view_data, search_query=search_query),
+                    show_food_storage_data)
+
+
+def clear_food_storage_search():
+    FOOD_STORAGE_SEARCH_ENTRY.delete(0, tk.END)
+    load_food_storage_data()
+
+
+def show_food_storage_data(view_data):
+    FOOD_STORAGE_VIEW["search_query"] = view_data["search_query"]
+
+    if view_data["food_storage"] is None:
+        load_virtual_food_storage_data(view_data["total"])
+    else:
+        FOOD_STORAGE_VIEW["virtual"] = False
+        FOOD_STORAGE_TREE.configure(yscrollcommand=FOOD_STORAGE_SCROLLBAR.set)
+
+        sync_treeview(FOOD_STORAGE_TREE, FOOD_STORAGE_ROWS, view_data["food_storage"])
+
+    FOOD_TYPE_NAME_COMBOBOX['values'] = view_data["food_type_names"]
+
+
+def refresh_food_storage_row(food_storage_id, food_storage=None):
+    """
+    Refresh the row of one food storage item after it was created, updated or deleted, without touching the others.
+    In the virtualized table mode a created or deleted item shifts the rows, so the visible window is read again,
+    and while searching a created item is only shown when it matches the search.
+
+    :param food_storage_id: int
+    :param food_storage: dict shaped like the ones of read_all_food_storage, or None when the item was deleted
+    """
+    # Every food storage write changes the totals of the food types
+    refresh_food_type_summary()
+    apply_food_storage_change(food_storage_id, food_storage)
+    clear_food_storage_inputs()
+
+
+def apply_food_storage_change(food_storage_id, food_storage=None):
+    """
+    Show the new values of one food storage item, or remove it when it was deleted, keeping the user inputs.
+
+    :param food_storage_id: int
+    :param food_storage: dict shaped like the ones of read_all_food_storage, or None when the item was deleted
+    """
+    iid = str(food_storage_id)
+
+    if food_storage is None:
+        if iid in FOOD_STORAGE_ROWS:
+            FOOD_STORAGE_TREE.delete(iid)
+            del FOOD_STORAGE_ROWS[iid]
+
+        if FOOD_STORAGE_VIEW["virtual"]:
+            reload_food_storage_view()
+    elif iid in FOOD_STORAGE_ROWS:
+        FOOD_STORAGE_ROWS[iid] = food_storage_tree_values(food_storage)
+        FOOD_STORAGE_TREE.item(iid, values=FOOD_STORAGE_ROWS[iid])
+    elif FOOD_STORAGE_VIEW["virtual"] or FOOD_STORAGE_VIEW["search_query"]:
+        reload_food_storage_view()
+    else:
+        FOOD_STORAGE_ROWS[iid] = food_storage_tree_values(food_storage)
+        FOOD_STORAGE_TREE.insert('', 'end', iid=iid, values=FOOD_STORAGE_ROWS[iid])
+
+
+# GUI CHANGE SYNCHRONIZATION
+
+def read_view_changes(cursor, sequence):
+    """
+    Read the changes made since sequence, by this or another instance of the application,
+    with the new values of the changed food storage items. Runs on the database worker.
+
+    Returns (dict):
+        - last_sequence: int
+        - reload: bool, True when the views must be read again instead of applying the changes
+        - food_types_changed: bool
+        - food_storage: list of dictionaries shaped like the ones of read_all_food_storage
+        - deleted_food_storage_ids: list of int
+    """
+    changes = read_changes_since(cursor, sequence, CHANGE_POLL_LIMIT)
+    view_changes = {
+        "last_sequence": changes["last_sequence"],
+        "reload": False,
+        "food_types_changed": False,
+        "food_storage": [],
+        "deleted_food_storage_ids": []
+    }
+
+    # Too many changes are cheaper to read as a whole
+    if not changes["complete"] or len(changes["changes"]) == CHANGE_POLL_LIMIT:
+        invalidate_food_type_registry()
+        view_changes["reload"] = True
+        view_changes["last_sequence"] = read_last_change_sequence(cursor)
+        return view_changes
+
+    # Only the last change of each row matters
+    operations = {(change["table_name"], change["id"]): change["operation"] for change in changes["changes"]}
+
+    if any(table_name == "food_type" for table_name, _ in operations):
+        # The food types in memory may come from before the change of another instance
+        invalidate_food_type_registry()
+        view_changes["food_types_changed"] = True
+
+    changed_ids = [row_id for (table_name, row_id), operation in operations.items()
+                   if table_name == "food_storage" and operation != "delete"]
+    view_changes["food_storage"] = read_food_storage_by_ids(cursor, changed_ids)
+
+    found_ids = {food_storage["id"] for food_storage in view_changes["food_storage"]}
+    view_changes["deleted_food_storage_ids"] = [row_id for table_name, row_id in operations
+                                                if table_name == "food_storage" and row_id not in found_ids]
+
+    return view_changes
+
 
-        for item in FOOD_STORAGE_TREE.get_children():
-            FOOD_STORAGE_TREE.delete(item)
-        food_storage_items = read_all_food_storage(CURSOR)
-        for item in food_storage_items:
-            FOOD_STORAGE_TREE.insert('', 'end', values=(
-                item["id"], item["name"], item["quantity"], item["unit"], item["food_type_name"],
-                item["expiration_date"]))
+def show_view_changes(view_changes):
+    CHANGE_SYNC["sequence"] = view_changes["last_sequence"]
+    CHANGE_SYNC["polling"] = False
 
-        FOOD_TYPE_NAME_COMBOBOX['values'] = [ft["name"] for ft in read_all_food_types(CURSOR)]
-    except Exception as e:
-        tk.messagebox.showerror("Unknown Error:", str(e))
+    if view_changes["reload"] or view_changes["food_types_changed"]:
+        # Renaming a food type changes the food type name of its items, which have no change of their own
+        refresh_food_type_summary()
+        reload_food_storage_view()
+        return
+
+    if not view_changes["food_storage"] and not view_changes["deleted_food_storage_ids"]:
+        return
+
+    refresh_food_type_summary()
+
+    for food_storage in view_changes["food_storage"]:
+        apply_food_storage_change(food_storage["id"], food_storage)
+
+    for food_storage_id in view_changes["deleted_food_storage_ids"]:
+        apply_food_storage_change(food_storage_id)
+
+
+def start_change_sync(sequence):
+    CHANGE_SYNC["sequence"] = sequence
+    ROOT.after(CHANGE_POLL_INTERVAL_MS, poll_changes)
+
+
+def poll_changes():
+    """
+    Apply the changes made by other instances of the application every CHANGE_POLL_INTERVAL_MS,
+    reading only the changed rows instead of reloading the views.
+    """
+    if not CHANGE_SYNC["polling"]:
+        CHANGE_SYNC["polling"] = True
+        DATABASE_WORKER.submit(read_view_changes, CHANGE_SYNC["sequence"], callback=show_view_changes,
+                               error_callback=on_poll_changes_failed, quiet=True)
+
+    ROOT.after(CHANGE_POLL_INTERVAL_MS, poll_changes)
+
+
+def on_poll_changes_failed(error):
+    # The next poll reads the same changes again
+    CHANGE_SYNC["polling"] = False
+
+
+# GUI CHECKPOINTS
+
+def schedule_checkpoint():
+    """
+    Save the database served from memory on the database worker every CHECKPOINT_INTERVAL_SECONDS.
+    """
+    def on_checkpoint(checkpoint):
+        if isinstance(checkpoint, str):
+            tk.messagebox.showerror("Error", checkpoint)
+
+    DATABASE_WORKER.submit(checkpoint_database, callback=on_checkpoint, quiet=True)
+    ROOT.after(CHECKPOINT_INTERVAL_SECONDS * 1000, schedule_checkpoint)
+
+
+# GUI VIRTUALIZED FOOD STORAGE TABLE
+
+def load_virtual_food_storage_data(total):
+    """
+    Show the food storage items in the virtualized table mode, keeping the current scroll position.
+
+    :param total: int with the number of food storage items
+    """
+    FOOD_STORAGE_VIEW.update({
+        "virtual": True,
+        "total": total,
+        "rendered_from": 0,
+        "rendered_to": -1,
+        "pages": {},
+        "page_cursors": {0: None},
+        "generation": FOOD_STORAGE_VIEW["generation"] + 1
+    })
+
+    # The scrollbar follows the position in the whole inventory instead of the rows held by the Treeview
+    FOOD_STORAGE_TREE.configure(yscrollcommand="")
+
+    render_food_storage_window(FOOD_STORAGE_VIEW["first_visible"])
+
+
+def read_food_storage_view_pages(cursor, page_numbers, page_cursors):
+    """
+    Read pages of the virtualized table. Runs on the database worker.
+    Pages following a known one are read with its keyset cursor, other pages are reached with an offset.
+
+    :param cursor: sqlite3.Cursor
+    :param page_numbers: list of int, in ascending order
+    :param page_cursors: dict of page number to the cursor of its first item (None for the first page)
+    :return: tuple (dict of page number to list of FoodStorageRow tuples, dict of new page cursors)
+    """
+    pages = {}
+    new_page_cursors = {}
+
+    for page_number in page_numbers:
+        if page_number in page_cursors or page_number in new_page_cursors:
+            after = page_cursors[page_number] if page_number in page_cursors else new_page_cursors[page_number]
+            page = read_food_storage_page(cursor, limit=FOOD_STORAGE_PAGE_SIZE, after=after,
+                                          columns=FOOD_STORAGE_TREE_COLUMNS)
+        else:
+            page = read_food_storage_page(cursor, limit=FOOD_STORAGE_PAGE_SIZE,
+                                          offset=page_number * FOOD_STORAGE_PAGE_SIZE,
+                                          columns=FOOD_STORAGE_TREE_COLUMNS)
+
+        if page["next_cursor"] is not None:
+            new_page_cursors[page_number + 1] = page["next_cursor"]
+
+        pages[page_number] = page["food_storage"]
+
+    return pages, new_page_cursors
+
+
+def load_food_storage_view_pages(page_numbers):
+    """
+    Read missing pages of the virtualized table on the database worker and render the window again when they arrive.
+    Only one read runs at a time; scrolling meanwhile just moves the window that is rendered afterwards.
+
+    :param page_numbers: list of int
+    """
+    if FOOD_STORAGE_VIEW["loading_pages"]:
+        return
+
+    FOOD_STORAGE_VIEW["loading_pages"] = True
+    generation = FOOD_STORAGE_VIEW["generation"]
+
+    def on_pages_loaded(result):
+        FOOD_STORAGE_VIEW["loading_pages"] = False
+
+        # Pages read before a reload of the table are outdated
+        if generation == FOOD_STORAGE_VIEW["generation"]:
+            pages, page_cursors = result
+            FOOD_STORAGE_VIEW["pages"].update(pages)
+            FOOD_STORAGE_VIEW["page_cursors"].update(page_cursors)
+
+        render_food_storage_window(FOOD_STORAGE_VIEW["first_visible"])
+
+    def on_pages_failed(error):
+        # Scrolling asks for the missing pages again
+        FOOD_STORAGE_VIEW["loading_pages"] = False
+
+    DATABASE_WORKER.submit(read_food_storage_view_pages, page_numbers, dict(FOOD_STORAGE_VIEW["page_cursors"]),
+                           callback=on_pages_loaded, error_callback=on_pages_failed)
+
+
+@instrumented("gui")
+def render_food_storage_window(first_visible):
+    """
+    Scroll the virtualized table so first_visible is the top row.
+    The Treeview is only refilled when the new visible rows are not already inside the overscan buffer,
+    and missing pages are read in the background first.
+
+    :param first_visible: int with the position of the top row in the whole inventory
+    """
+    total = FOOD_STORAGE_VIEW["total"]
+    first_visible = max(0, min(first_visible, total - FOOD_STORAGE_VISIBLE_ROWS))
+    visible_to = min(first_visible + FOOD_STORAGE_VISIBLE_ROWS, total)
+    FOOD_STORAGE_VIEW["first_visible"] = first_visible
+
+    if total:
+        FOOD_STORAGE_SCROLLBAR.set(first_visible / total, visible_to / total)
+    else:
+        FOOD_STORAGE_SCROLLBAR.set(0, 1)
+
+    if first_visible < FOOD_STORAGE_VIEW["rendered_from"] or visible_to > FOOD_STORAGE_VIEW["rendered_to"]:
+        rendered_from = max(first_visible - FOOD_STORAGE_OVERSCAN_ROWS, 0)
+        rendered_to = min(visible_to + FOOD_STORAGE_OVERSCAN_ROWS, total)
+
+        first_page = rendered_from // FOOD_STORAGE_PAGE_SIZE
+        last_page = max(rendered_to - 1, 0) // FOOD_STORAGE_PAGE_SIZE
+
+        missing_pages = [page_number for page_number in range(first_page, last_page + 1)
+                         if page_number not in FOOD_STORAGE_VIEW["pages"]]
+
+        if missing_pages:
+            load_food_storage_view_pages(missing_pages)
+            return
+
+        food_storage_items = []
+        for page_number in range(first_page, last_page + 1):
+            food_storage_items.extend(FOOD_STORAGE_VIEW["pages"][page_number])
+
+        page_start = first_page * FOOD_STORAGE_PAGE_SIZE
+        food_storage_items = food_storage_items[rendered_from - page_start:rendered_to - page_start]
+
+        sync_treeview(FOOD_STORAGE_TREE, FOOD_STORAGE_ROWS, food_storage_items)
+
+        FOOD_STORAGE_VIEW["rendered_from"] = rendered_from
+        FOOD_STORAGE_VIEW["rendered_to"] = rendered_from + len(food_storage_items)
+
+        # Only the pages around the window stay cached, so memory does not grow while scrolling
+        for page_number in list(FOOD_STORAGE_VIEW["pages"]):
+            if not first_page - 1 <= page_number <= last_page + 1:
+                del FOOD_STORAGE_VIEW["pages"][page_number]
+
+    rendered_count = FOOD_STORAGE_VIEW["rendered_to"] - FOOD_STORAGE_VIEW["rendered_from"]
+    if rendered_count > 0:
+        FOOD_STORAGE_TREE.yview_moveto((first_visible - FOOD_STORAGE_VIEW["rendered_from"]) / rendered_count)
+
+
+@instrumented("gui")
+def on_food_storage_scroll(*args):
+    if not FOOD_STORAGE_VIEW["virtual"]:
+        FOOD_STORAGE_TREE.yview(*args)
+        return
+
+    first_visible = FOOD_STORAGE_VIEW["first_visible"]
+
+    if args[0] == "moveto":
+        first_visible = int(float(args[1]) * FOOD_STORAGE_VIEW["total"])
+    elif args[0] == "scroll":
+        step = FOOD_STORAGE_VISIBLE_ROWS if args[2] == "pages" else 1
+        first_visible += int(args[1]) * step
+
+    render_food_storage_window(first_visible)
+
+
+def on_food_storage_mouse_wheel(event):
+    if not FOOD_STORAGE_VIEW["virtual"]:
+        return
+
+    # <Button-4>/<Button-5> on X11, <MouseWheel> with a delta on Windows and macOS
+    direction = -1 if event.num == 4 or event.delta > 0 else 1
+    render_food_storage_window(FOOD_STORAGE_VIEW["first_visible"] + direction * 3)
+
+    return "break"
 
 
 def create_food_storage_labels(food_storage_tab):
@@ -918,9 +4868,8 @@ def create_food_storage_entries(food_storage_tab):
     ENTRY_UNITY = tk.Entry(food_storage_tab)
     ENTRY_UNITY.grid(row=2, column=1)
 
-    names = [ft["name"] for ft in read_all_food_types(CURSOR)]
-
-    FOOD_TYPE_NAME_COMBOBOX = ttk.Combobox(food_storage_tab, values=names)
+    # The food type names are filled in when the food storage data is loaded
+    FOOD_TYPE_NAME_COMBOBOX = ttk.Combobox(food_storage_tab, values=[])
     FOOD_TYPE_NAME_COMBOBOX.grid(row=3, column=1)
     ENTRY_EXPIRATION_DATE = tk.Entry(food_storage_tab)
     ENTRY_EXPIRATION_DATE.grid(row=4, column=1)
@@ -932,16 +4881,34 @@ def create_food_storage_buttons(food_storage_tab):
     tk.Button(food_storage_tab, text="Delete", command=on_delete_food_storage).grid(row=5, column=2)
 
 
+def create_food_storage_search(food_storage_tab):
+    global FOOD_STORAGE_SEARCH_ENTRY
+    tk.Label(food_storage_tab, text="Search:").grid(row=6, column=0)
+    FOOD_STORAGE_SEARCH_ENTRY = tk.Entry(food_storage_tab)
+    FOOD_STORAGE_SEARCH_ENTRY.grid(row=6, column=1)
+    FOOD_STORAGE_SEARCH_ENTRY.bind('<Return>', lambda event: load_food_storage_data())
+
+    tk.Button(food_storage_tab, text="Clear", command=clear_food_storage_search).grid(row=6, column=2)
+
+
 def create_food_storage_treeview(food_storage_tab):
-    global FOOD_STORAGE_TREE
-    columns = ("id", "name", "quantity", "unit", "food_type_name", "expiration_date")
-    FOOD_STORAGE_TREE = ttk.Treeview(food_storage_tab, columns=columns, show="headings")
+    global FOOD_STORAGE_TREE, FOOD_STORAGE_SCROLLBAR
+    columns = FOOD_STORAGE_TREE_COLUMNS
+    FOOD_STORAGE_TREE = ttk.Treeview(food_storage_tab, columns=columns, show="headings",
+                                     height=FOOD_STORAGE_VISIBLE_ROWS)
     for col in columns:
         FOOD_STORAGE_TREE.heading(col, text=col)
 
     FOOD_STORAGE_TREE.bind('<<TreeviewSelect>>', on_food_storage_treeview_select)
+    FOOD_STORAGE_TREE.bind('<MouseWheel>', on_food_storage_mouse_wheel)
+    FOOD_STORAGE_TREE.bind('<Button-4>', on_food_storage_mouse_wheel)
+    FOOD_STORAGE_TREE.bind('<Button-5>', on_food_storage_mouse_wheel)
 
-    FOOD_STORAGE_TREE.grid(row=6, column=0, columnspan=3)
+    FOOD_STORAGE_SCROLLBAR = ttk.Scrollbar(food_storage_tab, orient="vertical", command=on_food_storage_scroll)
+    FOOD_STORAGE_TREE.configure(yscrollcommand=FOOD_STORAGE_SCROLLBAR.set)
+
+    FOOD_STORAGE_TREE.grid(row=7, column=0, columnspan=3)
+    FOOD_STORAGE_SCROLLBAR.grid(row=7, column=3, sticky="ns")
 
 
 def create_food_storage_tab():
@@ -953,38 +4920,158 @@ def create_food_storage_tab():
     create_food_storage_labels(food_storage_tab)
     create_food_storage_entries(food_storage_tab)
     create_food_storage_buttons(food_storage_tab)
+    create_food_storage_search(food_storage_tab)
     create_food_storage_treeview(food_storage_tab)
 
     load_food_storage_data()
 
 
+# GUI DIAGNOSTICS
+
+def diagnostics_tree_values(operation):
+    return (operation["operation"], operation["count"], operation["errors"], f"{operation['p50_ms']:.3f}",
+            f"{operation['p99_ms']:.3f}", f"{operation['max_ms']:.3f}", operation["rows"], operation["changes"])
+
+
+def load_diagnostics_data():
+    snapshot = read_instrumentation()
+    DIAGNOSTICS_ENABLED.set(snapshot["enabled"])
+    sync_treeview(DIAGNOSTICS_TREE, DIAGNOSTICS_ROWS,
+                  [diagnostics_tree_values(operation) for operation in snapshot["operations"]])
+
+
+def on_toggle_instrumentation():
+    if DIAGNOSTICS_ENABLED.get():
+        enable_instrumentation()
+    else:
+        disable_instrumentation()
+
+
+def on_reset_instrumentation():
+    reset_instrumentation()
+    load_diagnostics_data()
+
+
+def on_export_instrumentation():
+    file_path = tk.filedialog.asksaveasfilename(defaultextension=".json",
+                                                filetypes=[("JSON", "*.json"), ("CSV", "*.csv")])
+
+    if not file_path:
+        return
+
+    try:
+        dump_instrumentation(file_path)
+    except OSError as e:
+        tk.messagebox.showerror("Error", str(e))
+        return
+
+    tk.messagebox.showinfo("Success", "Diagnostics exported successfully.")
+
+
+def create_diagnostics_tab():
+    global DIAGNOSTICS_TREE, DIAGNOSTICS_ENABLED
+
+    diagnostics_tab = ttk.Frame(TAB_CONTROL)
+    TAB_CONTROL.add(diagnostics_tab, text='Diagnostics')
+
+    DIAGNOSTICS_ENABLED = tk.BooleanVar(value=INSTRUMENTATION["enabled"])
+    tk.Checkbutton(diagnostics_tab, text="Record latencies", variable=DIAGNOSTICS_ENABLED,
+                   command=on_toggle_instrumentation).grid(row=0, column=0)
+
+    tk.Button(diagnostics_tab, text="Refresh", command=load_diagnostics_data).grid(row=1, column=0)
+    tk.Button(diagnostics_tab, text="Reset", command=on_reset_instrumentation).grid(row=1, column=1)
+    tk.Button(diagnostics_tab, text="Export", command=on_export_instrumentation).grid(row=1, column=2)
+
+    columns = ("operation", "count", "errors", "p50_ms", "p99_ms", "max_ms", "rows", "changes")
+    DIAGNOSTICS_TREE = ttk.Treeview(diagnostics_tab, columns=columns, show="headings")
+    for col in columns:
+        DIAGNOSTICS_TREE.heading(col, text=col)
+
+    DIAGNOSTICS_TREE.grid(row=2, column=0, columnspan=3)
+
+    load_diagnostics_data()
+
+
 # MAIN FUNCTION
 
-def main():
-    global CONNECTION, CURSOR, ROOT, TAB_CONTROL
-    CONNECTION, CURSOR = database_connection()
+def import_tkinter():
+    global tk, ttk
+
+    import tkinter
+    import tkinter.ttk
+    import tkinter.messagebox
+    import tkinter.filedialog
+
+    tk, ttk = tkinter, tkinter.ttk
+
 
-    food_types = read_all_food_types(CURSOR)
-    if not food_types:
-        seed_food_types(CURSOR)
-        CONNECTION.commit()
+def run_gui():
+    global ROOT, TAB_CONTROL, STATUS_LABEL, DATABASE_WORKER
+
+    import_tkinter()
+
+    # Setting FOOD_STORAGE_INSTRUMENTATION=1 records latencies from the start, see the Diagnostics tab
+    if os.environ.get("FOOD_STORAGE_INSTRUMENTATION") == "1":
+        enable_instrumentation()
 
     ROOT = tk.Tk()
     ROOT.title("Food Storage Manager")
 
+    STATUS_LABEL = tk.Label(ROOT, anchor="w")
+    DATABASE_WORKER = DatabaseWorker(ROOT)
+    DATABASE_WORKER.submit(seed_empty_database, commit=True)
+    DATABASE_WORKER.submit(prune_change_log, commit=True)
+    DATABASE_WORKER.submit(read_last_change_sequence, callback=start_change_sync)
+
+    # A ":memory:" database has no file to save to
+    if is_memory_database() and DATABASE_PATH != ":memory:":
+        ROOT.after(CHECKPOINT_INTERVAL_SECONDS * 1000, schedule_checkpoint)
+
     TAB_CONTROL = ttk.Notebook(ROOT)
 
     create_food_storage_tab()
     create_food_type_tab()
+    create_diagnostics_tab()
 
     TAB_CONTROL.pack(expand=1, fill='both')
+    STATUS_LABEL.pack(fill='x')
 
-    TAB_CONTROL.bind("<<NotebookTabChanged>>", lambda event: load_food_storage_data() or load_food_type_data())
+    TAB_CONTROL.bind("<<NotebookTabChanged>>",
+                     lambda event: load_food_storage_data() or load_food_type_data() or load_diagnostics_data())
 
     ROOT.mainloop()
 
+    DATABASE_WORKER.stop()
+
+
+def main(argv=None):
+    """
+    Run a command of the command-line interface, or the GUI when no command is given.
+
+    :param argv: list of str, sys.argv[1:] by default
+    :return: int with the exit status
+    """
+    global DATABASE_PATH, DATABASE_IN_MEMORY, CHECKPOINT_INTERVAL_SECONDS
+
+    args = build_argument_parser().parse_args(argv)
+
+    if args.database:
+        DATABASE_PATH = args.database
+
+    if args.in_memory:
+        DATABASE_IN_MEMORY = True
+
+    if args.checkpoint_interval:
+        CHECKPOINT_INTERVAL_SECONDS = args.checkpoint_interval
+
+    if args.command is None:
+        run_gui()
+        return 0
+
+    return run_cli(args)
+
 
 # Run the main function
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
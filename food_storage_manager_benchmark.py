@@ -0,0 +1,372 @@
+"""
+Benchmark of the database layer of food_storage_manager on synthetic inventories.
+
+Every size gets its own temporary database, so the shared food_storage.db is never touched.
+Write operations are rolled back after each sample, so every sample sees the same inventory.
+
+Usage:
+    python food_storage_manager_benchmark.py
+    python food_storage_manager_benchmark.py --sizes 10000 100000 --output before.json
+    python food_storage_manager_benchmark.py --baseline before.json --output after.json
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+
+from food_storage_manager import database_connection, seed_food_types, invalidate_food_type_registry
+from food_storage_manager import read_all_food_types, read_food_type_by_id, read_food_type_by_name, \
+    create_food_type, update_food_type_by_id, delete_food_type_by_id, reassign_orphaned_food_storage, \
+    read_food_type_summary
+from food_storage_manager import read_all_food_storage, read_food_storage_by_id, create_food_storage, \
+    update_food_storage_by_id, delete_food_storage_by_id
+from food_storage_manager import read_food_storage_page, iter_food_storage, count_food_storage
+from food_storage_manager import read_food_storage_by_expiration_date, read_expiring_within, read_expired
+from food_storage_manager import search_food_storage
+from food_storage_manager import read_quantity_totals, forecast_depletion
+from food_storage_manager import create_food_storage_many, import_food_storage_csv, import_food_storage_json
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+FOOD_NAMES = ["Apple", "Banana", "Bean", "Bread", "Butter", "Carrot", "Cheese", "Chicken", "Coffee", "Corn",
+              "Flour", "Honey", "Juice", "Lentil", "Milk", "Oat", "Onion", "Pasta", "Pea", "Pepper",
+              "Potato", "Rice", "Salt", "Soup", "Sugar", "Tea", "Tomato", "Tuna", "Water", "Yogurt"]
+FOOD_KINDS = ["Canned", "Dried", "Fresh", "Frozen", "Organic", "Powdered", "Smoked", "Sweet"]
+UNITS = ["kg", "g", "l", "ml", "unit"]
+
+FIRST_EXPIRATION_DATE = datetime.date(2030, 1, 1)
+EXPIRATION_DAYS = 730
+
+POPULATE_CHUNK_SIZE = 10000
+BATCH_SIZE = 100
+
+
+# SYNTHETIC INVENTORY
+
+def synthetic_food_storage(rng, count, food_type_ids):
+    """
+    Generate food storage items shaped like the input of create_food_storage_many.
+
+    :param rng: random.Random
+    :param count: int
+    :param food_type_ids: list of int
+    :return: generator of dictionaries
+    """
+    for _ in range(count):
+        expiration_date = FIRST_EXPIRATION_DATE + datetime.timedelta(days=rng.randrange(EXPIRATION_DAYS))
+
+        yield {
+            "name": f"{rng.choice(FOOD_KINDS)} {rng.choice(FOOD_NAMES)} {rng.randrange(1000)}",
+            "quantity": rng.randrange(1, 100) / 4,
+            "unit": rng.choice(UNITS),
+            "food_type_id": rng.choice(food_type_ids),
+            "expiration_date": expiration_date.isoformat()
+        }
+
+
+def populate_database(connection, cursor, rng, size):
+    seed_food_types(cursor)
+    food_type_ids = [food_type["id"] for food_type in read_all_food_types(cursor)]
+
+    for start in range(0, size, POPULATE_CHUNK_SIZE):
+        items = list(synthetic_food_storage(rng, min(POPULATE_CHUNK_SIZE, size - start), food_type_ids))
+        created = create_food_storage_many(cursor, items)
+
+        if isinstance(created, str):
+            raise RuntimeError(created)
+
+    connection.commit()
+    cursor.execute("ANALYZE")
+    connection.commit()
+
+
+def write_import_files(directory, rng, food_type_names):
+    items = list(synthetic_food_storage(rng, BATCH_SIZE, [0]))
+    for item in items:
+        del item["food_type_id"]
+        item["food_type_name"] = rng.choice(food_type_names)
+
+    csv_path = os.path.join(directory, "import.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, ["name", "quantity", "unit", "food_type_name", "expiration_date"])
+        writer.writeheader()
+        writer.writerows(items)
+
+    json_path = os.path.join(directory, "import.json")
+    with open(json_path, "w", encoding="utf-8") as file:
+        json.dump(items, file)
+
+    return csv_path, json_path
+
+
+# OPERATIONS
+
+def benchmark_operations(cursor, rng, size, csv_path, json_path):
+    """
+    List the benchmarked operations.
+    Each operation is a dictionary with its name, the timed function, a function building the arguments of
+    a sample (its work is not timed) and whether it writes, in which case every sample is rolled back.
+
+    :return: list of dictionaries
+    """
+    food_types = read_all_food_types(cursor)
+    food_type_ids = [food_type["id"] for food_type in food_types]
+    other_id = read_food_type_by_name(cursor, "Other")["id"]
+    deletable_food_type_ids = [food_type_id for food_type_id in food_type_ids if food_type_id != other_id]
+    food_type_names = [food_type["name"] for food_type in food_types]
+    counter = iter(range(10 ** 9))
+
+    def random_food_storage_id():
+        return rng.randint(1, size)
+
+    def random_date():
+        return (FIRST_EXPIRATION_DATE + datetime.timedelta(days=rng.randrange(EXPIRATION_DAYS))).isoformat()
+
+    def random_food_storage_arguments():
+        return ["Benchmark Item", rng.randrange(1, 100) / 4, rng.choice(UNITS), rng.choice(food_type_ids),
+                random_date()]
+
+    def iterate_all(cursor):
+        for _ in iter_food_storage(cursor):
+            pass
+
+    def orphan_food_type():
+        # Deleting a food type without moving its items leaves them for reassign_orphaned_food_storage
+        cursor.execute("DELETE FROM food_type WHERE id = ?", (rng.choice(deletable_food_type_ids),))
+        invalidate_food_type_registry()
+        return []
+
+    def empty_food_types():
+        cursor.execute("DELETE FROM food_type")
+        invalidate_food_type_registry()
+        return []
+
+    return [
+        {"name": "seed_food_types", "function": seed_food_types, "arguments": empty_food_types, "writes": True},
+        {"name": "create_food_type", "function": create_food_type,
+         "arguments": lambda: [f"Benchmark Type {next(counter)}"], "writes": True},
+        {"name": "read_all_food_types", "function": read_all_food_types, "arguments": list, "writes": False},
+        {"name": "read_food_type_by_id", "function": read_food_type_by_id,
+         "arguments": lambda: [rng.choice(food_type_ids)], "writes": False},
+        {"name": "read_food_type_by_name", "function": read_food_type_by_name,
+         "arguments": lambda: [rng.choice(food_type_names)], "writes": False},
+        {"name": "read_food_type_summary", "function": read_food_type_summary, "arguments": list, "writes": False},
+        {"name": "update_food_type_by_id", "function": update_food_type_by_id,
+         "arguments": lambda: [rng.choice(deletable_food_type_ids), f"Benchmark Type {next(counter)}"],
+         "writes": True},
+        {"name": "delete_food_type_by_id", "function": delete_food_type_by_id,
+         "arguments": lambda: [rng.choice(deletable_food_type_ids)], "writes": True},
+        {"name": "reassign_orphaned_food_storage", "function": reassign_orphaned_food_storage,
+         "arguments": orphan_food_type, "writes": True},
+        {"name": "create_food_storage", "function": create_food_storage,
+         "arguments": random_food_storage_arguments, "writes": True},
+        {"name": "read_all_food_storage", "function": read_all_food_storage, "arguments": list, "writes": False},
+        {"name": "read_food_storage_by_id", "function": read_food_storage_by_id,
+         "arguments": lambda: [random_food_storage_id()], "writes": False},
+        {"name": "update_food_storage_by_id", "function": update_food_storage_by_id,
+         "arguments": lambda: [random_food_storage_id()] + random_food_storage_arguments(), "writes": True},
+        {"name": "delete_food_storage_by_id", "function": delete_food_storage_by_id,
+         "arguments": lambda: [random_food_storage_id()], "writes": True},
+        {"name": "read_food_storage_page", "function": read_food_storage_page,
+         "arguments": lambda: [100, json.dumps([rng.randrange(size), rng.randrange(size)])], "writes": False},
+        {"name": "count_food_storage", "function": count_food_storage,
+         "arguments": lambda: [rng.choice(food_type_ids)], "writes": False},
+        {"name": "iter_food_storage", "function": iterate_all, "arguments": list, "writes": False},
+        {"name": "read_food_storage_by_expiration_date", "function": read_food_storage_by_expiration_date,
+         "arguments": lambda: sorted([random_date(), random_date()]), "writes": False},
+        {"name": "read_expiring_within", "function": read_expiring_within,
+         "arguments": lambda: [7, random_date()], "writes": False},
+        {"name": "read_expired", "function": read_expired,
+         "arguments": lambda: [(FIRST_EXPIRATION_DATE + datetime.timedelta(days=7)).isoformat()], "writes": False},
+        {"name": "search_food_storage", "function": search_food_storage,
+         "arguments": lambda: [rng.choice(FOOD_NAMES)[:3], 50], "writes": False},
+        {"name": "read_quantity_totals", "function": read_quantity_totals, "arguments": list, "writes": False},
+        {"name": "read_quantity_totals_by_name", "function": read_quantity_totals,
+         "arguments": lambda: ["name", rng.choice(food_type_ids)], "writes": False},
+        {"name": "forecast_depletion", "function": forecast_depletion, "arguments": list, "writes": False},
+        {"name": "create_food_storage_many", "function": create_food_storage_many,
+         "arguments": lambda: [list(synthetic_food_storage(rng, BATCH_SIZE, food_type_ids))], "writes": True},
+        {"name": "import_food_storage_csv", "function": import_food_storage_csv,
+         "arguments": lambda: [csv_path], "writes": True},
+        {"name": "import_food_storage_json", "function": import_food_storage_json,
+         "arguments": lambda: [json_path], "writes": True},
+    ]
+
+
+# MEASUREMENT
+
+def percentile(sorted_samples, fraction):
+    """
+    Nearest-rank percentile of already sorted samples.
+
+    :param sorted_samples: list of float
+    :param fraction: float between 0 and 1
+    :return: float
+    """
+    index = max(0, min(len(sorted_samples) - 1, int(round(fraction * len(sorted_samples) + 0.5)) - 1))
+
+    return sorted_samples[index]
+
+
+def measure_operation(connection, cursor, operation, repeat, max_seconds, min_samples):
+    """
+    Time an operation until it ran repeat times, or for max_seconds once it ran min_samples times.
+
+    Returns (dict):
+        - samples: int
+        - p50_ms: float
+        - p99_ms: float
+        - mean_ms: float
+        - max_ms: float
+        - ops_per_second: float
+    """
+    samples = []
+    started_at = time.perf_counter()
+
+    while len(samples) < repeat:
+        if len(samples) >= min_samples and time.perf_counter() - started_at > max_seconds:
+            break
+
+        arguments = operation["arguments"]()
+
+        start = time.perf_counter()
+        result = operation["function"](cursor, *arguments)
+        samples.append(time.perf_counter() - start)
+
+        if operation["writes"]:
+            connection.rollback()
+            invalidate_food_type_registry()
+
+        if isinstance(result, str):
+            raise RuntimeError(f"{operation['name']} failed: {result}")
+
+    samples.sort()
+    total = sum(samples)
+
+    return {
+        "samples": len(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "mean_ms": total / len(samples) * 1000,
+        "max_ms": samples[-1] * 1000,
+        "ops_per_second": len(samples) / total if total else None
+    }
+
+
+def benchmark_size(size, repeat, max_seconds, min_samples, operation_names=None, seed=0):
+    """
+    Build a synthetic inventory of size food storage items in a temporary database and time every operation on it.
+
+    :return: list of dictionaries with the size, the operation name and the measures of measure_operation
+    """
+    rng = random.Random(seed)
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        connection, cursor = database_connection(os.path.join(directory, "benchmark.db"))
+
+        try:
+            start = time.perf_counter()
+            populate_database(connection, cursor, rng, size)
+            print(f"{size} rows: populated in {time.perf_counter() - start:.1f}s")
+
+            food_type_names = [food_type["name"] for food_type in read_all_food_types(cursor)]
+            csv_path, json_path = write_import_files(directory, rng, food_type_names)
+
+            for operation in benchmark_operations(cursor, rng, size, csv_path, json_path):
+                if operation_names and operation["name"] not in operation_names:
+                    continue
+
+                measures = measure_operation(connection, cursor, operation, repeat, max_seconds, min_samples)
+                results.append({"rows": size, "operation": operation["name"], **measures})
+
+                print(f"{size} rows: {operation['name']:<40} p50 {measures['p50_ms']:10.3f} ms"
+                      f"  p99 {measures['p99_ms']:10.3f} ms  ({measures['samples']} samples)")
+        finally:
+            connection.close()
+            invalidate_food_type_registry()
+
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(baseline, results):
+    """
+    Print how the p50 and p99 latencies changed from a previous run, for the operations both runs measured.
+
+    :param baseline: dict read from a previous output file
+    :param results: list of dictionaries of the current run
+    """
+    previous = {(result["rows"], result["operation"]): result for result in baseline["results"]}
+
+    print(f"\nCompared with {baseline['metadata'].get('revision') or 'the baseline'} (new / old):")
+    for result in results:
+        old = previous.get((result["rows"], result["operation"]))
+
+        if old is None or not old["p50_ms"] or not old["p99_ms"]:
+            continue
+
+        print(f"{result['rows']} rows: {result['operation']:<40} p50 x{result['p50_ms'] / old['p50_ms']:.2f}"
+              f"  p99 x{result['p99_ms'] / old['p99_ms']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the food storage database layer.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="number of food storage items of each synthetic inventory")
+    parser.add_argument("--repeat", type=int, default=200, help="samples per operation")
+    parser.add_argument("--max-seconds", type=float, default=10.0,
+                        help="stop sampling an operation after this time, once it has --min-samples samples")
+    parser.add_argument("--min-samples", type=int, default=5)
+    parser.add_argument("--operations", nargs="+", help="only benchmark these operations")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file receiving the results")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare with")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results.extend(benchmark_size(size, args.repeat, args.max_seconds, args.min_samples, args.operations,
+                                      args.seed))
+
+    output = {
+        "metadata": {
+            "revision": git_revision(),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python_version": platform.python_version(),
+            "sqlite_version": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "repeat": args.repeat,
+            "max_seconds": args.max_seconds,
+            "seed": args.seed
+        },
+        "results": results
+    }
+
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            compare_results(json.load(file), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,381 @@
+"""
+HTTP JSON API over the food storage database, built on the standard library only.
+
+Other machines read and update the inventory through this server instead of opening the SQLite file.
+Every GET answer carries an ETag and a Last-Modified header derived from the data version, so a client
+polling with If-None-Match or If-Modified-Since gets 304 Not Modified without the database being queried.
+
+Endpoints:
+    GET    /food-types?limit=&offset=
+    POST   /food-types                 {"name": ...}
+    GET    /food-types/<id>
+    PUT    /food-types/<id>            {"name": ...}
+    DELETE /food-types/<id>
+    GET    /food-storage?limit=&cursor=&offset=&sort_by=&descending=&food_type_id=&name=
+                         &expiration_date_from=&expiration_date_to=
+    POST   /food-storage               {"name", "quantity", "unit", "food_type_id", "expiration_date"}
+    GET    /food-storage/<id>
+    PUT    /food-storage/<id>          {"name", "quantity", "unit", "food_type_id", "expiration_date"}
+    DELETE /food-storage/<id>
+
+Usage:
+    python food_storage_manager.py serve --host 0.0.0.0 --port 8080
+    python food_storage_manager.py --in-memory serve    (serves the database from memory, see DATABASE_IN_MEMORY)
+"""
+import email.utils
+import hashlib
+import http.server
+import json
+import os
+import re
+import threading
+import traceback
+import urllib.parse
+
+from food_storage_manager import FoodStorageRepository, invalidate_food_type_registry
+from food_storage_manager import read_all_food_types, read_food_type_by_id, create_food_type, \
+    update_food_type_by_id, delete_food_type_by_id
+from food_storage_manager import read_food_storage_by_id, create_food_storage, update_food_storage_by_id, \
+    delete_food_storage_by_id, read_food_storage_page
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BODY_SIZE = 1024 * 1024
+
+# Errors of the writes about the item addressed by the path, answered with 404 instead of 400
+NOT_FOUND_FOOD_TYPE = "A food type with this id does not exist."
+NOT_FOUND_FOOD_STORAGE = "A food storage with this id does not exist."
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class FoodStorageServer(http.server.ThreadingHTTPServer):
+    """
+    Threaded HTTP server sharing one FoodStorageRepository between its request threads.
+
+    The data version combines a counter of the writes made through the server with the modification time and
+    size of the database and WAL files, so writes made by the GUI or the command-line interface change it too.
+    Computing it only stats the files and never queries SQLite.
+    """
+    daemon_threads = True
+    # Set to True to silence the request log
+    quiet = False
+
+    def __init__(self, server_address, repository):
+        super().__init__(server_address, FoodStorageRequestHandler)
+        self.repository = repository
+        self._write_count = 0
+        self._write_count_lock = threading.Lock()
+        self._last_version = None
+
+    def note_write(self):
+        with self._write_count_lock:
+            self._write_count += 1
+
+    def data_version(self):
+        """
+        Returns (tuple):
+            - str with the ETag of the current data
+            - float with the epoch time of the last change
+        """
+        stats = []
+        last_modified = 0.0
+
+        for path in (self.repository.database, self.repository.database + "-wal"):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stats.append("-")
+                continue
+
+            stats.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+            last_modified = max(last_modified, stat.st_mtime)
+
+        version = f"{self._write_count}|{'|'.join(stats)}"
+
+        with self._write_count_lock:
+            if version != self._last_version:
+                # Other processes may have changed the food types held by the in-memory registry
+                invalidate_food_type_registry()
+                self._last_version = version
+
+        etag = '"' + hashlib.sha1(version.encode()).hexdigest()[:16] + '"'
+
+        return etag, last_modified
+
+
+class FoodStorageRequestHandler(http.server.BaseHTTPRequestHandler):
+    server_version = "FoodStorageManager/1.0"
+
+    # (method, path pattern, handler method name); the groups of the pattern are passed to the handler
+    ROUTES = [
+        ("GET", r"/food-types", "list_food_types"),
+        ("POST", r"/food-types", "create_food_type"),
+        ("GET", r"/food-types/(\d+)", "read_food_type"),
+        ("PUT", r"/food-types/(\d+)", "update_food_type"),
+        ("DELETE", r"/food-types/(\d+)", "delete_food_type"),
+        ("GET", r"/food-storage", "list_food_storage"),
+        ("POST", r"/food-storage", "create_food_storage"),
+        ("GET", r"/food-storage/(\d+)", "read_food_storage"),
+        ("PUT", r"/food-storage/(\d+)", "update_food_storage"),
+        ("DELETE", r"/food-storage/(\d+)", "delete_food_storage"),
+    ]
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def do_DELETE(self):
+        self.dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    # Dispatching
+
+    def dispatch(self, method):
+        url = urllib.parse.urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+
+        path_matched = False
+        for route_method, pattern, handler_name in self.ROUTES:
+            match = re.fullmatch(pattern, url.path.rstrip("/") or "/")
+
+            if match is None:
+                continue
+
+            path_matched = True
+            if route_method == method:
+                break
+        else:
+            if path_matched:
+                return self.send_json(405, {"error": "Method not allowed."})
+            return self.send_json(404, {"error": "Not found."})
+
+        try:
+            if method == "GET":
+                etag, last_modified = self.server.data_version()
+
+                if self.is_not_modified(etag, last_modified):
+                    return self.send_not_modified(etag, last_modified)
+
+                body = getattr(self, handler_name)(*match.groups())
+                return self.send_json(200, body, etag, last_modified)
+
+            status, body = getattr(self, handler_name)(*match.groups())
+            if status < 400:
+                self.server.note_write()
+            return self.send_json(status, body)
+        except HTTPError as e:
+            return self.send_json(e.status, {"error": e.message})
+        except Exception:
+            # Answered rather than dropping the connection; the details only go to the log
+            self.log_error("Error handling %s %s:\n%s", method, self.path, traceback.format_exc())
+            return self.send_json(500, {"error": "Internal server error."})
+
+    def is_not_modified(self, etag, last_modified):
+        if_none_match = self.headers.get("If-None-Match")
+
+        # If-Modified-Since is only used by clients without an ETag, as it has a one-second resolution
+        if if_none_match is not None:
+            return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")] or \
+                if_none_match.strip() == "*"
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+
+        if if_modified_since is None:
+            return False
+
+        try:
+            since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+        return int(last_modified) <= since
+
+    # Responses
+
+    def send_json(self, status, body, etag=None, last_modified=None):
+        data = json.dumps(body).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", email.utils.formatdate(last_modified, usegmt=True))
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_not_modified(self, etag, last_modified):
+        self.send_response(304)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", email.utils.formatdate(last_modified, usegmt=True))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+    # Request parsing
+
+    def read_json_body(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.")
+
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "The request body is too large.")
+
+        try:
+            body = json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            raise HTTPError(400, "The request body is not valid JSON.")
+
+        if not isinstance(body, dict):
+            raise HTTPError(400, "The request body must be a JSON object.")
+
+        return body
+
+    def body_value(self, body, name, types, description):
+        """
+        Return a field of the JSON body, None when missing, after checking that it has one of the types.
+        """
+        value = body.get(name)
+
+        if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+            raise HTTPError(400, f"{name} must be {description}.")
+
+        return value
+
+    def query_int(self, name, default=None):
+        value = self.query.get(name)
+
+        if value is None:
+            return default
+
+        try:
+            return int(value)
+        except ValueError:
+            raise HTTPError(400, f"{name} must be a number.")
+
+    def page_limit(self):
+        return min(self.query_int("limit", DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE)
+
+    @property
+    def repository(self):
+        return self.server.repository
+
+    def check(self, result, status=400, not_found=None):
+        if isinstance(result, str):
+            raise HTTPError(404 if result == not_found else status, result)
+
+        return result
+
+    # Food types
+
+    def list_food_types(self):
+        limit = self.page_limit()
+        offset = self.query_int("offset", 0)
+
+        if limit < 1 or offset < 0:
+            raise HTTPError(400, "limit must be greater than zero and offset cannot be negative.")
+
+        food_types = read_all_food_types(self.repository)
+        next_offset = offset + limit if offset + limit < len(food_types) else None
+
+        return {"food_types": food_types[offset:offset + limit], "next_offset": next_offset}
+
+    def read_food_type(self, food_type_id):
+        return self.check(read_food_type_by_id(self.repository, int(food_type_id)), 404)
+
+    def food_type_name(self):
+        return self.body_value(self.read_json_body(), "name", str, "text")
+
+    def create_food_type(self):
+        return 201, self.check(create_food_type(self.repository, self.food_type_name()))
+
+    def update_food_type(self, food_type_id):
+        return 200, self.check(update_food_type_by_id(self.repository, int(food_type_id), self.food_type_name()),
+                               not_found=NOT_FOUND_FOOD_TYPE)
+
+    def delete_food_type(self, food_type_id):
+        self.check(delete_food_type_by_id(self.repository, int(food_type_id)), not_found=NOT_FOUND_FOOD_TYPE)
+        return 200, {"id": int(food_type_id)}
+
+    # Food storage
+
+    def list_food_storage(self):
+        return self.check(read_food_storage_page(
+            self.repository,
+            limit=self.page_limit(),
+            after=self.query.get("cursor"),
+            sort_by=self.query.get("sort_by", "id"),
+            descending=self.query.get("descending", "false").lower() in ("1", "true", "yes"),
+            food_type_id=self.query_int("food_type_id"),
+            name=self.query.get("name"),
+            expiration_date_from=self.query.get("expiration_date_from"),
+            expiration_date_to=self.query.get("expiration_date_to"),
+            offset=self.query_int("offset", 0)
+        ))
+
+    def read_food_storage(self, food_storage_id):
+        return self.check(read_food_storage_by_id(self.repository, int(food_storage_id)), 404)
+
+    def food_storage_arguments(self):
+        body = self.read_json_body()
+        return [
+            self.body_value(body, "name", str, "text"),
+            self.body_value(body, "quantity", (int, float, str), "a number"),
+            self.body_value(body, "unit", str, "text"),
+            self.body_value(body, "food_type_id", int, "an integer"),
+            self.body_value(body, "expiration_date", str, "text")
+        ]
+
+    def create_food_storage(self):
+        return 201, self.check(create_food_storage(self.repository, *self.food_storage_arguments()))
+
+    def update_food_storage(self, food_storage_id):
+        # The writes check that the item exists themselves, in the same statement
+        return 200, self.check(update_food_storage_by_id(self.repository, int(food_storage_id),
+                                                         *self.food_storage_arguments()),
+                               not_found=NOT_FOUND_FOOD_STORAGE)
+
+    def delete_food_storage(self, food_storage_id):
+        self.check(delete_food_storage_by_id(self.repository, int(food_storage_id)), not_found=NOT_FOUND_FOOD_STORAGE)
+        return 200, {"id": int(food_storage_id)}
+
+
+def create_server(host="127.0.0.1", port=8080, database=None):
+    """
+    Create the HTTP server with its own connection pool. Call serve_forever() on it to start serving.
+
+    :param host: str
+    :param port: int, 0 for any free port
+    :param database: str with the database file, DATABASE_PATH by default
+    :return: FoodStorageServer
+    """
+    return FoodStorageServer((host, port), FoodStorageRepository(database))
+
+
+def serve(host="127.0.0.1", port=8080, database=None):
+    server = create_server(host, port, database)
+    print(f"Serving the food storage API on http://{server.server_address[0]}:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.repository.close()
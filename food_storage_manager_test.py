@@ -1,13 +1,70 @@
 # Importing database setting up function and seed function
-from food_storage_manager import database_connection, seed_food_types
+from food_storage_manager import database_connection, seed_food_types, migrate_database, MIGRATIONS, \
+    FoodStorageRepository, checkpoint_database
 
 # Importing CRUD functions for food types
+from food_storage_manager import read_food_type_summary
 from food_storage_manager import read_all_food_types, read_food_type_by_id, read_food_type_by_name, create_food_type, \
-    update_food_type_by_id, delete_food_type_by_id
+    update_food_type_by_id, delete_food_type_by_id, reassign_orphaned_food_storage, invalidate_food_type_registry
 
 # Importing CRUD functions for food storage
 from food_storage_manager import read_all_food_storage, read_food_storage_by_id, create_food_storage, \
     update_food_storage_by_id, delete_food_storage_by_id
+
+# Importing paginated and streaming reads for food storage
+from food_storage_manager import read_food_storage_page, iter_food_storage, count_food_storage, \
+    FOOD_STORAGE_COLUMNS, FOOD_STORAGE_SORT_COLUMNS
+
+# Importing expiration queries for food storage
+from food_storage_manager import read_food_storage_by_expiration_date, read_expiring_within, read_expired
+
+# Importing full-text search functions
+from food_storage_manager import search_food_storage
+
+# Importing unit functions and quantity totals
+from food_storage_manager import normalize_unit, register_unit, total_quantities, read_quantity_totals
+
+# Importing quantity history and forecast functions
+from food_storage_manager import read_quantity_history, forecast_depletion
+
+# Importing change log functions
+from food_storage_manager import read_last_change_sequence, read_changes_since, prune_change_log, \
+    read_food_storage_by_ids
+
+# Importing bulk functions for food storage
+from food_storage_manager import create_food_storage_many, import_food_storage_csv, import_food_storage_json, \
+    export_food_storage_csv, export_food_storage_json, validate_food_storage_batch, import_food_storage_jsonl, \
+    export_food_storage_jsonl, import_food_storage_columnar, export_food_storage_columnar, read_food_storage_columnar
+
+# Importing the online backup
+from food_storage_manager import backup_database
+
+# Importing instrumentation functions
+from food_storage_manager import enable_instrumentation, disable_instrumentation, reset_instrumentation, \
+    read_instrumentation, dump_instrumentation
+
+# Importing the command-line interface
+from food_storage_manager import main
+import food_storage_manager
+
+# Importing the HTTP API
+from food_storage_manager_server import create_server, FoodStorageRequestHandler
+
+# Importing the benchmark suite
+from food_storage_manager_benchmark import benchmark_size
+
+import sqlite3
+import datetime
+import threading
+import time
+import subprocess
+import urllib.request
+import urllib.error
+import urllib.parse
+import unittest.mock
+import sys
+import json
+import os
 import pytest
 
 """
@@ -18,7 +75,8 @@ But all its backend functionalities are tested.
 
 @pytest.fixture
 def db_connection():
-    connection, cursor = database_connection()
+    # Every test gets its own empty database in memory, so the tests never touch the database file
+    connection, cursor = database_connection(":memory:")
     yield cursor
     connection.close()
 
@@ -35,6 +93,182 @@ def test_seed_food_types(db_connection):
         assert food_type in names
 
 
+def test_migrate_database(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "old_food_storage.db"))
+    cursor = connection.cursor()
+
+    # Schema of the databases created before the migrations were introduced
+    cursor.execute("""
+    CREATE TABLE food_type (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE food_storage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        quantity REAL NOT NULL,
+        unit TEXT NOT NULL,
+        food_type_id INTEGER NOT NULL,
+        expiration_date TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        FOREIGN KEY (food_type_id) REFERENCES food_type (id)
+    )
+    """)
+    cursor.executemany("INSERT INTO food_type (id, name, created_at, updated_at) VALUES (?, ?, 'now', 'now')",
+                       [(1, "Fruit"), (2, "Fruit"), (3, "Other")])
+    cursor.execute("""
+    INSERT INTO food_storage (name, quantity, unit, food_type_id, expiration_date, created_at, updated_at)
+    VALUES ('Apple', 1, 'Kg', 2, '2030-01-01', '2024-06-05 12:34:56.123456', '2024-06-06 08:00:00.000001')
+    """)
+    # strptime accepted dates without zero padding
+    cursor.execute("""
+    INSERT INTO food_storage (name, quantity, unit, food_type_id, expiration_date, created_at, updated_at)
+    VALUES ('Pear', 1, 'Kg', 3, '2030-1-5', '2024-06-05 12:34:56', '2024-06-05 12:34:56')
+    """)
+    connection.commit()
+
+    assert migrate_database(cursor) == len(MIGRATIONS)
+    cursor.execute("PRAGMA user_version")
+    assert cursor.fetchone()[0] == len(MIGRATIONS)
+
+    assert [food_type["id"] for food_type in read_all_food_types(cursor)] == [1, 3]
+
+    food_storage = read_all_food_storage(cursor)[0]
+    assert food_storage["food_type_id"] == 1
+    assert food_storage["expiration_date"] == "2030-01-01"
+    assert food_storage["created_at"] == "2024-06-05 12:34:56"
+    assert food_storage["updated_at"] == "2024-06-06 08:00:00"
+    assert read_all_food_storage(cursor)[1]["expiration_date"] == "2030-01-05"
+
+    cursor.execute("SELECT typeof(expiration_date), typeof(created_at), typeof(updated_at) FROM food_storage")
+    assert cursor.fetchall() == [("integer", "integer", "integer")] * 2
+
+    # The food type summary starts from the existing food storage items
+    assert read_food_type_summary(cursor)[0]["quantities"] == {"Kg": 1}
+
+    # New ids keep counting from the ids used before the migration
+    cursor.execute("DELETE FROM food_type WHERE id = 3")
+    assert create_food_type(cursor, "Vegetable")["id"] == 4
+
+    with pytest.raises(sqlite3.IntegrityError):
+        cursor.execute("INSERT INTO food_type (name, created_at, updated_at) VALUES ('Fruit', 'now', 'now')")
+
+    # Running the migrations again does nothing
+    assert migrate_database(cursor) == len(MIGRATIONS)
+    connection.close()
+
+
+def test_migrate_database_concurrently(tmp_path, monkeypatch):
+    database = str(tmp_path / "concurrent_food_storage.db")
+    applied = []
+    monkeypatch.setattr(food_storage_manager, "MIGRATIONS",
+                        [lambda cursor, migration=migration: applied.append(migration) or migration(cursor)
+                         for migration in MIGRATIONS])
+
+    first_connection = sqlite3.connect(database)
+    second_connection = sqlite3.connect(database)
+
+    # The second process migrates the database after the first one found it empty, but before it got the lock
+    def migrate_second_database(statement):
+        if statement.startswith("BEGIN") and not applied:
+            migrate_database(second_connection.cursor())
+
+    first_connection.set_trace_callback(migrate_second_database)
+    assert migrate_database(first_connection.cursor()) == len(MIGRATIONS)
+    assert applied == MIGRATIONS
+
+    first_connection.close()
+    second_connection.close()
+
+
+def test_food_storage_repository(tmp_path):
+    database = str(tmp_path / "repository_food_storage.db")
+    repository = FoodStorageRepository(database, pool_size=3)
+
+    seed_food_types(repository)
+    food_type = read_food_type_by_name(repository, "Other")
+    created_food_storage = create_food_storage(repository, "Repository Rice", 1, "Kg", food_type["id"], "2030-01-01")
+
+    # Writes are committed, so other connections see them
+    connection = sqlite3.connect(database)
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert connection.execute("SELECT name FROM food_storage").fetchall() == [("Repository Rice",)]
+
+    # Errors roll the transaction back
+    assert create_food_type(repository, "") == "A food type name cannot be empty."
+    with pytest.raises(sqlite3.OperationalError):
+        repository.write(lambda cursor: (create_food_type(cursor, "Rolled Back"), cursor.execute("SELECT wrong")))
+    assert read_food_type_by_name(repository, "Rolled Back") == "A food type with this name does not exist."
+
+    # Readers run in parallel with a writer holding its transaction open
+    read_results = []
+
+    def slow_write(cursor):
+        update_food_storage_by_id(cursor, created_food_storage["id"], "Repository Beans", 2, "Kg", food_type["id"],
+                                  "2030-01-01")
+        reader = threading.Thread(target=lambda: read_results.append(read_all_food_storage(repository)))
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+
+    repository.write(slow_write)
+    assert [food_storage["name"] for food_storage in read_results[0]] == ["Repository Rice"]
+    assert read_food_storage_by_id(repository, created_food_storage["id"])["name"] == "Repository Beans"
+
+    connection.close()
+    repository.close()
+
+
+def test_in_memory_database(tmp_path):
+    database = str(tmp_path / "memory_food_storage.db")
+    connection, cursor = database_connection(database)
+    food_type = create_food_type(cursor, "On Disk Type")
+    create_food_storage(cursor, "On Disk", 1, "Kg", food_type["id"], "2030-01-01")
+    connection.commit()
+    connection.close()
+
+    def names_on_disk():
+        disk_connection = sqlite3.connect(database)
+        names = [name for name, in disk_connection.execute("SELECT name FROM food_storage ORDER BY id")]
+        disk_connection.close()
+        return names
+
+    # The file is loaded at start, and only written by the checkpoints
+    connection, cursor = database_connection(database, in_memory=True)
+    assert [food_storage["name"] for food_storage in read_all_food_storage(cursor)] == ["On Disk"]
+    create_food_storage(cursor, "In Memory", 1, "Kg", food_type["id"], "2030-01-01")
+    assert checkpoint_database(cursor) == "Cannot checkpoint the database during a transaction."
+    connection.commit()
+    assert names_on_disk() == ["On Disk"]
+
+    assert checkpoint_database(cursor)["saved"]
+    assert names_on_disk() == ["On Disk", "In Memory"]
+    assert checkpoint_database(cursor) == {"saved": False}
+    connection.close()
+
+    # Repositories checkpoint on a timer and when closed
+    repository = FoodStorageRepository(database, in_memory=True, checkpoint_interval=0.05)
+    assert repository.pool_size == 1
+    create_food_storage(repository, "Timed", 1, "Kg", food_type["id"], "2030-01-01")
+    deadline = time.monotonic() + 5
+    while "Timed" not in names_on_disk() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert names_on_disk() == ["On Disk", "In Memory", "Timed"]
+
+    create_food_storage(repository, "Closed", 1, "Kg", food_type["id"], "2030-01-01")
+    repository.close()
+    assert names_on_disk() == ["On Disk", "In Memory", "Timed", "Closed"]
+
+    connection, cursor = database_connection(database)
+    assert checkpoint_database(cursor) == "The database is not loaded from a file into memory."
+    connection.close()
+
+
 # Testing CRUD functions for food types
 
 def test_create_food_type(db_connection):
@@ -161,6 +395,127 @@ def test_delete_food_type_by_id(db_connection):
     assert deleted_food_type == "A food type with this id does not exist."
 
 
+def test_delete_food_type_by_id_moves_food_storage_to_other(db_connection):
+    seed_food_types(db_connection)
+    other_food_type = read_food_type_by_name(db_connection, "Other")
+    deleted_food_type = create_food_type(db_connection, "Deleted Food Type")
+    kept_food_type = create_food_type(db_connection, "Kept Food Type")
+
+    moved_food_storage = create_food_storage(db_connection, "Moved", 1, "Kg", deleted_food_type["id"], "2030-01-01")
+    kept_food_storage = create_food_storage(db_connection, "Kept", 1, "Kg", kept_food_type["id"], "2030-01-01")
+
+    assert delete_food_type_by_id(db_connection, deleted_food_type["id"]) is None
+
+    assert read_food_storage_by_id(db_connection, moved_food_storage["id"])["food_type_id"] == other_food_type["id"]
+    assert read_food_storage_by_id(db_connection, kept_food_storage["id"]) == kept_food_storage
+
+
+def test_reassign_orphaned_food_storage(db_connection):
+    seed_food_types(db_connection)
+    other_food_type = read_food_type_by_name(db_connection, "Other")
+    food_type = create_food_type(db_connection, "Orphan Food Type")
+    orphaned_food_storage = create_food_storage(db_connection, "Orphan", 1, "Kg", food_type["id"], "2030-01-01")
+
+    # Simulate a food type removed outside of delete_food_type_by_id
+    db_connection.execute("DELETE FROM food_type WHERE id = ?", (food_type["id"],))
+    invalidate_food_type_registry()
+
+    assert reassign_orphaned_food_storage(db_connection) >= 1
+    assert read_food_storage_by_id(db_connection, orphaned_food_storage["id"])["food_type_id"] == other_food_type["id"]
+    assert reassign_orphaned_food_storage(db_connection) == 0
+
+
+def test_read_food_type_summary(db_connection):
+    def summary_of(food_type_id):
+        return next(item for item in read_food_type_summary(db_connection) if item["id"] == food_type_id)
+
+    seed_food_types(db_connection)
+    food_type = create_food_type(db_connection, "Summarized Type")
+    other_food_type = create_food_type(db_connection, "Other Summarized Type")
+    assert summary_of(food_type["id"]) == {"id": food_type["id"], "name": "Summarized Type", "item_count": 0,
+                                           "quantities": {}, "nearest_expiration_date": None}
+
+    rice = create_food_storage(db_connection, "Rice", 2, "kg", food_type["id"], "2030-03-01")
+    beans = create_food_storage(db_connection, "Beans", 0.5, "kg", food_type["id"], "2030-01-01")
+    milk = create_food_storage(db_connection, "Milk", 1, "l", food_type["id"], "2030-02-01")
+    assert summary_of(food_type["id"])["item_count"] == 3
+    assert summary_of(food_type["id"])["quantities"] == {"kg": 2.5, "l": 1}
+    assert summary_of(food_type["id"])["nearest_expiration_date"] == "2030-01-01"
+
+    # Moving the item holding the nearest expiration date to another food type looks for the next one
+    update_food_storage_by_id(db_connection, beans["id"], "Beans", 0.5, "kg", other_food_type["id"], "2030-01-01")
+    assert summary_of(food_type["id"])["quantities"] == {"kg": 2, "l": 1}
+    assert summary_of(food_type["id"])["nearest_expiration_date"] == "2030-02-01"
+    assert summary_of(other_food_type["id"])["item_count"] == 1
+
+    update_food_storage_by_id(db_connection, milk["id"], "Milk", 3, "kg", food_type["id"], "2030-04-01")
+    assert summary_of(food_type["id"])["quantities"] == {"kg": 5}
+    assert summary_of(food_type["id"])["nearest_expiration_date"] == "2030-03-01"
+
+    delete_food_storage_by_id(db_connection, rice["id"])
+    delete_food_storage_by_id(db_connection, milk["id"])
+    assert summary_of(food_type["id"])["item_count"] == 0
+    assert summary_of(food_type["id"])["quantities"] == {}
+
+    # Deleting a food type moves its totals to "Other"
+    other = read_food_type_by_name(db_connection, "Other")
+    other_count = summary_of(other["id"])["item_count"]
+    delete_food_type_by_id(db_connection, other_food_type["id"])
+    assert summary_of(other["id"])["item_count"] == other_count + 1
+
+
+def test_food_type_registry(db_connection):
+    seed_food_types(db_connection)
+    read_all_food_types(db_connection)
+
+    statements = []
+    db_connection.connection.set_trace_callback(statements.append)
+
+    food_type = read_food_type_by_name(db_connection, "Other")
+    assert read_food_type_by_id(db_connection, food_type["id"]) == food_type
+    assert read_food_type_by_id(db_connection, str(food_type["id"])) == food_type
+    assert create_food_type(db_connection, "Other") == "A food type with this name already exists."
+    assert statements == []
+
+    created_food_type = create_food_type(db_connection, "Registry Food Type")
+    updated_food_type = update_food_type_by_id(db_connection, created_food_type["id"], "Renamed Registry Food Type")
+    assert read_food_type_by_name(db_connection, "Registry Food Type") == "A food type with this name does not exist."
+    assert read_food_type_by_name(db_connection, "Renamed Registry Food Type") == updated_food_type
+
+    delete_food_type_by_id(db_connection, created_food_type["id"])
+    assert read_food_type_by_id(db_connection, created_food_type["id"]) == "A food type with this id does not exist."
+    db_connection.connection.set_trace_callback(None)
+
+    # Changes are written to the database, not only to the registry
+    invalidate_food_type_registry()
+    assert read_food_type_by_name(db_connection, "Renamed Registry Food Type") == \
+           "A food type with this name does not exist."
+    assert read_food_type_by_name(db_connection, "Other") == food_type
+
+
+def test_food_type_registry_rollback(db_connection):
+    seed_food_types(db_connection)
+    db_connection.connection.commit()
+    fruit = read_food_type_by_name(db_connection, "Fruit")
+
+    # Changes of a rolled back transaction leave the registry
+    assert not isinstance(create_food_type(db_connection, "Rolled Back Type"), str)
+    db_connection.connection.rollback()
+    assert read_food_type_by_name(db_connection, "Rolled Back Type") == "A food type with this name does not exist."
+    assert not isinstance(create_food_type(db_connection, "Rolled Back Type"), str)
+    db_connection.connection.rollback()
+
+    assert update_food_type_by_id(db_connection, fruit["id"], "Rolled Back Fruit")["name"] == "Rolled Back Fruit"
+    db_connection.connection.rollback()
+    assert read_food_type_by_name(db_connection, "Fruit") == fruit
+    assert read_food_type_by_name(db_connection, "Rolled Back Fruit") == "A food type with this name does not exist."
+
+    # Committed changes are kept
+    created_food_type = create_food_type(db_connection, "Committed Type")
+    db_connection.connection.commit()
+    assert read_food_type_by_name(db_connection, "Committed Type") == created_food_type
+
+
 # Testing CRUD functions for food storage
 
 def test_create_food_storage(db_connection):
@@ -170,6 +525,8 @@ def test_create_food_storage(db_connection):
 
     assert created_food_storage["name"] == "Valid Food Storage"
     assert created_food_storage["quantity"] == 10
+    assert isinstance(created_food_storage["quantity"], float)
+    assert read_food_storage_by_id(db_connection, created_food_storage["id"]) == created_food_storage
     assert created_food_storage["unit"] == "Kg"
     assert created_food_storage["food_type_id"] == created_food_type["id"]
     assert created_food_storage["expiration_date"] == "2021-01-01"
@@ -302,6 +659,7 @@ def test_update_food_storage_by_id(db_connection):
                                                          food_storage["food_type_id"], "2021-01-01")
         assert updated_food_storage["name"] == f"Updated Food Storage{food_storage_id}"
         assert updated_food_storage["quantity"] == 20
+        assert isinstance(updated_food_storage["quantity"], float)
         assert updated_food_storage["unit"] == "L"
         assert updated_food_storage["food_type_id"] == food_storage["food_type_id"]
         assert updated_food_storage["expiration_date"] == "2021-01-01"
@@ -390,4 +748,793 @@ def test_delete_food_storage_by_id(db_connection):
     assert deleted_food_storage == "A food storage with this id does not exist."
 
 
+def test_writes_are_single_statements(db_connection):
+    seed_food_types(db_connection)
+    food_type = create_food_type(db_connection, "Single Statement Type")
+    food_storage = create_food_storage(db_connection, "Single Statement Rice", 1, "kg", food_type["id"], "2030-01-01")
+
+    statements = []
+    db_connection.connection.set_trace_callback(statements.append)
+
+    # The trace callback repeats a statement for each trigger step it runs and reports the internal statements
+    # of the search index with a "--" prefix, so only the distinct statements made by the functions count
+    writes = [
+        lambda: create_food_type(db_connection, "Another Single Statement Type"),
+        lambda: update_food_type_by_id(db_connection, food_type["id"], "Renamed Single Statement Type"),
+        lambda: create_food_storage(db_connection, "Single Statement Beans", 1, "kg", food_type["id"], "2030-01-01"),
+        lambda: update_food_storage_by_id(db_connection, food_storage["id"], "Single Statement Rice", 2, "kg",
+                                          food_type["id"], "2030-01-01"),
+        lambda: delete_food_storage_by_id(db_connection, food_storage["id"])
+    ]
+    for write in writes:
+        statements.clear()
+        assert not isinstance(write(), str)
+        assert len({statement for statement in statements if not statement.startswith("--")}) == 1
+    db_connection.connection.set_trace_callback(None)
+
+    # A food type deleted by another connection is still in the registry, but the write checks the table
+    db_connection.execute("DELETE FROM food_type WHERE id = ?", (food_type["id"],))
+    assert create_food_storage(db_connection, "Stale Rice", 1, "kg", food_type["id"], "2030-01-01") == \
+           "A food type with this id does not exist."
+    assert read_food_type_by_id(db_connection, food_type["id"]) == "A food type with this id does not exist."
+
+
+# Testing paginated and streaming reads for food storage
+
+def test_read_food_storage_page(db_connection):
+    food_type = create_food_type(db_connection, "Paged Food Type")
+    for number in range(5):
+        create_food_storage(db_connection, f"Paged {number}", number, "Kg", food_type["id"], f"2030-01-0{5 - number}")
+
+    page = read_food_storage_page(db_connection, limit=2, food_type_id=food_type["id"], sort_by="expiration_date")
+    assert [food_storage["name"] for food_storage in page["food_storage"]] == ["Paged 4", "Paged 3"]
+    assert page["next_cursor"] is not None
+
+    page = read_food_storage_page(db_connection, limit=2, after=page["next_cursor"], food_type_id=food_type["id"],
+                                  sort_by="expiration_date")
+    assert [food_storage["name"] for food_storage in page["food_storage"]] == ["Paged 2", "Paged 1"]
+
+    page = read_food_storage_page(db_connection, limit=2, after=page["next_cursor"], food_type_id=food_type["id"],
+                                  sort_by="expiration_date")
+    assert [food_storage["name"] for food_storage in page["food_storage"]] == ["Paged 0"]
+    assert page["next_cursor"] is None
+
+    page = read_food_storage_page(db_connection, limit=10, food_type_id=food_type["id"], descending=True,
+                                  name="Paged", expiration_date_from="2030-01-02", expiration_date_to="2030-01-04")
+    assert [food_storage["name"] for food_storage in page["food_storage"]] == ["Paged 3", "Paged 2", "Paged 1"]
+    assert page["food_storage"][0]["food_type_name"] == "Paged Food Type"
+
+    page = read_food_storage_page(db_connection, limit=2, offset=3, food_type_id=food_type["id"],
+                                  sort_by="expiration_date")
+    assert [food_storage["name"] for food_storage in page["food_storage"]] == ["Paged 1", "Paged 0"]
+    assert page["next_cursor"] is None
+
+    assert read_food_storage_page(db_connection, limit=0) == "Limit must be greater than zero."
+    assert read_food_storage_page(db_connection, offset=-1) == "Offset cannot be negative."
+    assert read_food_storage_page(db_connection, limit="wrong") == "Limit must be a number."
+    assert read_food_storage_page(db_connection, after="wrong") == "Invalid page cursor."
+    assert read_food_storage_page(db_connection, after="[[1], [2]]") == "Invalid page cursor."
+    assert read_food_storage_page(db_connection, after='[1, "2"]') == "Invalid page cursor."
+    assert read_food_storage_page(db_connection, sort_by="wrong") == "Cannot sort by wrong."
+
+
+def test_read_food_storage_page_across_null_sort_values(db_connection):
+    food_type = create_food_type(db_connection, "Nullable Food Type")
+    orphan_type = create_food_type(db_connection, "Deleted Food Type")
+    for number in range(6):
+        food_storage = create_food_storage(db_connection, f"Nullable {number}", 1, "Kg",
+                                           orphan_type["id"] if number % 3 == 0 else food_type["id"],
+                                           f"2030-01-0{number + 1}")
+        if number % 2 == 0:
+            db_connection.execute("UPDATE food_storage SET expiration_date = NULL WHERE id = ?", (food_storage["id"],))
+    db_connection.execute("DELETE FROM food_type WHERE id = ?", (orphan_type["id"],))
+
+    for sort_by in ("expiration_date", "food_type_name"):
+        for descending in (False, True):
+            expected = read_food_storage_page(db_connection, limit=100, sort_by=sort_by, descending=descending,
+                                              name="Nullable")["food_storage"]
+            assert len(expected) == 6
+
+            paged = []
+            after = None
+            while True:
+                page = read_food_storage_page(db_connection, limit=1, after=after, sort_by=sort_by,
+                                              descending=descending, name="Nullable")
+                paged.extend(page["food_storage"])
+                after = page["next_cursor"]
+                if after is None:
+                    break
+
+            assert paged == expected
+
+            # Skipping items after the cursor crosses from the non-NULL to the NULL sort values too
+            after = read_food_storage_page(db_connection, limit=1, sort_by=sort_by, descending=descending,
+                                           name="Nullable")["next_cursor"]
+            assert read_food_storage_page(db_connection, limit=2, after=after, offset=3, sort_by=sort_by,
+                                          descending=descending, name="Nullable")["food_storage"] == expected[4:6]
+
+    # The pages after a cursor read the expiration date index as a range, without sorting
+    for descending, after in ((True, [20000, 5]), (False, [None, 5])):
+        sql, parameters = food_storage_manager._build_food_storage_query(
+            "expiration_date", descending, None, None, None, None, after)
+        plan = [row[3] for row in db_connection.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()]
+        assert any("food_storage_expiration_date_index (expiration_date<?)" in step or
+                   "food_storage_expiration_date_index (expiration_date>?)" in step for step in plan)
+        assert not any(step.startswith("SCAN") or "TEMP B-TREE" in step for step in plan)
+
+
+def test_read_food_storage_page_sort_indexes(db_connection):
+    # Every sort column of food_storage reads the pages after a cursor from its index
+    for sort_by in FOOD_STORAGE_SORT_COLUMNS.keys() - {"food_type_name"}:
+        for descending in (False, True):
+            sql, parameters = food_storage_manager._build_food_storage_query(
+                sort_by, descending, None, None, None, None, [1, 1])
+            plan = [row[3] for row in db_connection.execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()]
+            assert not any(step.startswith("SCAN") or "TEMP B-TREE" in step for step in plan), (sort_by, plan)
+
+
+def test_food_storage_column_projection(db_connection):
+    food_type = create_food_type(db_connection, "Projected Food Type")
+    for number in range(5):
+        create_food_storage(db_connection, f"Projected {number}", number, "Kg", food_type["id"], f"2030-01-0{number + 1}")
+
+    columns = ("id", "name", "expiration_date")
+    all_food_storage = read_all_food_storage(db_connection)
+    rows = read_all_food_storage(db_connection, columns=columns)
+    assert [row._asdict() for row in rows] == [{column: item[column] for column in columns}
+                                               for item in all_food_storage]
+    assert rows[-1].name == "Projected 4"
+    assert rows[-1].expiration_date == "2030-01-05"
+    assert rows[-1] == (all_food_storage[-1]["id"], "Projected 4", "2030-01-05")
+
+    # All the columns give the same values as the dictionaries
+    full_rows = read_all_food_storage(db_connection, columns=FOOD_STORAGE_COLUMNS)
+    assert [row._asdict() for row in full_rows] == all_food_storage
+
+    page = read_food_storage_page(db_connection, limit=2, food_type_id=food_type["id"], sort_by="expiration_date",
+                                  descending=True, columns=["name"])
+    assert page["food_storage"] == [("Projected 4",), ("Projected 3",)]
+    page = read_food_storage_page(db_connection, limit=2, after=page["next_cursor"], food_type_id=food_type["id"],
+                                  sort_by="expiration_date", descending=True, columns=["name"])
+    assert [row.name for row in page["food_storage"]] == ["Projected 2", "Projected 1"]
+
+    streamed_rows = iter_food_storage(db_connection, chunk_size=2, food_type_id=food_type["id"], columns=["quantity"])
+    assert [row.quantity for row in streamed_rows] == [0, 1, 2, 3, 4]
+    assert [row.id for row in search_food_storage(db_connection, "projected", columns=["id"])] == \
+        [item["id"] for item in all_food_storage[-5:]]
+
+    assert read_all_food_storage(db_connection, columns=["weight"]) == "Unknown column weight."
+    assert read_food_storage_page(db_connection, columns=[]) == "Columns cannot be empty."
+    assert search_food_storage(db_connection, "projected", columns=["id", "id"]) == "Columns cannot be repeated."
+    with pytest.raises(ValueError):
+        list(iter_food_storage(db_connection, columns=["weight"]))
+
+
+def test_count_food_storage(db_connection):
+    food_type = create_food_type(db_connection, "Counted Food Type")
+    for number in range(3):
+        create_food_storage(db_connection, f"Counted {number}", number, "Kg", food_type["id"], f"2030-01-0{number + 1}")
+
+    assert count_food_storage(db_connection) == len(read_all_food_storage(db_connection))
+    assert count_food_storage(db_connection, food_type_id=food_type["id"]) == 3
+    assert count_food_storage(db_connection, food_type_id=food_type["id"], expiration_date_from="2030-01-02") == 2
+    assert count_food_storage(db_connection, name="Counted", expiration_date_to="2030-01-01") == 1
+    assert count_food_storage(db_connection, expiration_date_from="2030-13-01") == "Dates must be in the format YYYY-MM-DD."
+
+    # Counting reads food_storage alone, without the join and the order of the listing
+    statements = []
+    db_connection.connection.set_trace_callback(statements.append)
+    count_food_storage(db_connection, food_type_id=food_type["id"])
+    db_connection.connection.set_trace_callback(None)
+    assert len(statements) == 1 and "JOIN" not in statements[0] and "ORDER BY" not in statements[0]
+
+
+def test_iter_food_storage(db_connection):
+    food_type = create_food_type(db_connection, "Streamed Food Type")
+    for number in range(5):
+        create_food_storage(db_connection, f"Streamed {number}", number, "Kg", food_type["id"], "2030-01-01")
+
+    streamed_food_storage = list(iter_food_storage(db_connection, chunk_size=2, food_type_id=food_type["id"]))
+    assert [food_storage["name"] for food_storage in streamed_food_storage] == [f"Streamed {number}"
+                                                                               for number in range(5)]
+
+    all_food_storage = read_all_food_storage(db_connection)
+    assert list(iter_food_storage(db_connection)) == all_food_storage
+
+
+# Testing expiration queries for food storage
+
+def create_expiring_food_storage(db_connection):
+    food_type = create_food_type(db_connection, "Expiring Food Type")
+    for expiration_date in ["1900-01-03", "1900-01-01", "1900-01-10", "1900-01-05"]:
+        create_food_storage(db_connection, f"Expiring {expiration_date}", 1, "Kg", food_type["id"], expiration_date)
+
+
+def test_read_food_storage_by_expiration_date(db_connection):
+    create_expiring_food_storage(db_connection)
+
+    food_storage = read_food_storage_by_expiration_date(db_connection, "1900-01-01", "1900-01-05")
+    assert [item["expiration_date"] for item in food_storage] == ["1900-01-01", "1900-01-03", "1900-01-05"]
+    assert food_storage[0]["food_type_name"] == "Expiring Food Type"
+
+    assert read_food_storage_by_expiration_date(db_connection, "1900-01-02", "wrong") == \
+           "Dates must be in the format YYYY-MM-DD."
+    assert read_food_storage_by_expiration_date(db_connection, "1900-01-05", "1900-01-01") == \
+           "The start date cannot be after the end date."
+
+
+def test_read_expiring_within(db_connection):
+    create_expiring_food_storage(db_connection)
+
+    food_storage = read_expiring_within(db_connection, 7, as_of="1900-01-03")
+    assert [item["expiration_date"] for item in food_storage] == ["1900-01-03", "1900-01-05", "1900-01-10"]
+
+    food_storage = read_expiring_within(db_connection, 0, as_of="1900-01-03")
+    assert [item["expiration_date"] for item in food_storage] == ["1900-01-03"]
+
+    # Days past the last date datetime can hold reach until that date
+    everything_after = read_food_storage_by_expiration_date(db_connection, "1900-01-03", "9999-12-31")
+    assert read_expiring_within(db_connection, 5000000, as_of="1900-01-03") == everything_after
+    assert read_expiring_within(db_connection, 10 ** 12, as_of="1900-01-03") == everything_after
+
+    assert read_expiring_within(db_connection, -1) == "Days cannot be negative."
+    assert read_expiring_within(db_connection, "wrong") == "Days must be a number."
+    assert read_expiring_within(db_connection, float("inf")) == "Days must be a number."
+    assert read_expiring_within(db_connection, 1, as_of="1900-30-01") == "Dates must be in the format YYYY-MM-DD."
+
+
+def test_read_expired(db_connection):
+    create_expiring_food_storage(db_connection)
+
+    food_storage = read_expired(db_connection, as_of="1900-01-05")
+    assert [item["expiration_date"] for item in food_storage] == ["1900-01-01", "1900-01-03"]
+
+    assert read_expired(db_connection, as_of="wrong") == "Dates must be in the format YYYY-MM-DD."
+
+
+# Testing full-text search for food storage
+
+def test_search_food_storage(db_connection):
+    food_type = create_food_type(db_connection, "Searchable Grain")
+    apple = create_food_storage(db_connection, "Quxapple Juice", 1, "l", food_type["id"], "2030-01-01")
+    pie = create_food_storage(db_connection, "Quxapple Pie", 2, "unit", food_type["id"], "2030-01-02")
+
+    assert [item["id"] for item in search_food_storage(db_connection, "quxapp")] == [apple["id"], pie["id"]]
+    assert [item["id"] for item in search_food_storage(db_connection, "quxapple pie")] == [pie["id"]]
+    assert search_food_storage(db_connection, "quxapple juice")[0]["food_type_name"] == "Searchable Grain"
+    assert len(search_food_storage(db_connection, "quxapple", limit=1)) == 1
+
+    # The index follows updates and deletes of the food storage items and renames of their food types
+    update_food_storage_by_id(db_connection, pie["id"], "Quxpear Pie", 2, "unit", food_type["id"], "2030-01-02")
+    assert [item["id"] for item in search_food_storage(db_connection, "quxpear")] == [pie["id"]]
+
+    update_food_type_by_id(db_connection, food_type["id"], "Searchable Cereal")
+    assert len(search_food_storage(db_connection, "quxpear cereal")) == 1
+
+    delete_food_storage_by_id(db_connection, apple["id"])
+    assert search_food_storage(db_connection, "quxapple") == []
+
+    # FTS5 syntax typed by the user is searched as plain words
+    assert search_food_storage(db_connection, 'quxpear" OR "*') == []
+    assert search_food_storage(db_connection, "   ") == []
+    assert search_food_storage(db_connection, "quxpear", limit=0) == "Limit must be at least 1."
+
+
+# Testing unit functions and quantity totals
+
+def test_normalize_unit(monkeypatch):
+    monkeypatch.setattr(food_storage_manager, "UNIT_REGISTRY", dict(food_storage_manager.UNIT_REGISTRY))
+
+    assert normalize_unit("Kg") == ("kg", 1.0)
+    assert normalize_unit(" g ") == ("kg", 0.001)
+    assert normalize_unit("Fl. Oz") == ("l", 0.0295735295625)
+    assert normalize_unit("cans") == ("unit", 1.0)
+    assert normalize_unit(" sacks ") == ("sacks", 1.0)
+
+    assert register_unit("Sack", "mass", 25) == {"name": "sack", "dimension": "mass", "factor": 25.0}
+    assert normalize_unit("SACK") == ("kg", 25.0)
+    assert register_unit("sack", "energy", 1) == "Unknown dimension energy."
+    assert register_unit("sack", "mass", 0) == "Factor must be greater than zero."
+    assert register_unit(" ", "mass", 1) == "Unit cannot be empty."
+
+
+def test_read_quantity_totals(db_connection, monkeypatch):
+    seed_food_types(db_connection)
+    food_type = create_food_type(db_connection, "Totaled Type")
+    create_food_storage(db_connection, "Totaled Rice", 2, "kg", food_type["id"], "2030-01-01")
+    create_food_storage(db_connection, "Totaled Rice", 500, "g", food_type["id"], "2030-01-01")
+    create_food_storage(db_connection, "Totaled Rice", 1, "lb", food_type["id"], "2030-01-01")
+    create_food_storage(db_connection, "Totaled Milk", 250, "ml", food_type["id"], "2030-01-01")
+    create_food_storage(db_connection, "Totaled Milk", 2, "bottles", food_type["id"], "2030-01-01")
+    create_food_storage(db_connection, "Totaled Milk", 3, "crates", food_type["id"], "2030-01-01")
+
+    expected_food_type_totals = {"kg": 2.95359237, "l": 0.25, "unit": 2, "crates": 3}
+    expected_name_totals = [
+        {"name": "Totaled Milk", "totals": {"l": 0.25, "unit": 2, "crates": 3}},
+        {"name": "Totaled Rice", "totals": {"kg": 2.95359237}}
+    ]
+
+    totals = read_quantity_totals(db_connection, food_type_id=food_type["id"])
+    assert [(item["id"], item["name"]) for item in totals] == [(food_type["id"], "Totaled Type")]
+    assert totals[0]["totals"] == expected_food_type_totals
+    assert read_quantity_totals(db_connection, "name", food_type["id"]) == expected_name_totals
+    assert len(read_quantity_totals(db_connection)) == len(read_all_food_types(db_connection))
+    assert read_quantity_totals(db_connection, "unit") == "Cannot group by unit."
+
+    # Without numpy, the totals are computed by the plain Python fallback
+    monkeypatch.setattr(food_storage_manager, "numpy", False)
+    assert read_quantity_totals(db_connection, "name", food_type["id"]) == expected_name_totals
+    assert total_quantities([], [], []) == {}
+
+
+def test_total_quantities_with_numpy():
+    numpy = pytest.importorskip("numpy")
+    keys = ["a", "b", "a", "c", "b"]
+    units = ["g", "kg", "lb", "crates", "ml"]
+    quantities = numpy.array([500, 1, 1, 2, 250])
+
+    assert total_quantities(keys, units, quantities) == {
+        "a": {"kg": 0.95359237},
+        "b": {"kg": 1, "l": 0.25},
+        "c": {"crates": 2}
+    }
+
+
+# Testing quantity history and forecast functions
+
+def test_read_quantity_history(db_connection):
+    seed_food_types(db_connection)
+    other = read_food_type_by_name(db_connection, "Other")
+    rice = create_food_storage(db_connection, "History Rice", 3, "kg", other["id"], "2030-01-01")
+    assert [point["quantity"] for point in read_quantity_history(db_connection, rice["id"])] == [3]
+
+    # Within the same second, the last quantity replaces the previous one
+    update_food_storage_by_id(db_connection, rice["id"], "History Rice", 2, "kg", other["id"], "2030-01-01")
+    assert [point["quantity"] for point in read_quantity_history(db_connection, rice["id"])] == [2]
+
+    # Quantities in another unit are not comparable, so the history starts again
+    db_connection.execute("INSERT INTO quantity_history VALUES (?, 0, 5)", (rice["id"],))
+    update_food_storage_by_id(db_connection, rice["id"], "History Rice", 2000, "g", other["id"], "2030-01-01")
+    assert [point["quantity"] for point in read_quantity_history(db_connection, rice["id"])] == [2000]
+
+    delete_food_storage_by_id(db_connection, rice["id"])
+    assert read_quantity_history(db_connection, rice["id"]) == []
+
+
+def test_forecast_depletion(db_connection, monkeypatch):
+    seed_food_types(db_connection)
+    other = read_food_type_by_name(db_connection, "Other")
+    rice = create_food_storage(db_connection, "Forecast Rice", 6, "kg", other["id"], "2031-01-01")
+    beans = create_food_storage(db_connection, "Forecast Beans", 5, "kg", other["id"], "2031-01-01")
+    milk = create_food_storage(db_connection, "Forecast Milk", 0, "l", other["id"], "2031-01-01")
+    salt = create_food_storage(db_connection, "Forecast Salt", 1, "kg", other["id"], "2031-01-01")
+
+    # The forecast is made at the end of 2030-01-10, so the points are days before 2030-01-11
+    reference = int(datetime.datetime(2030, 1, 11).timestamp())
+    history = {
+        rice["id"]: [(-9, 2), (-8, 12), (-6, 10), (-4, 8), (-2, 6)],
+        beans["id"]: [(-6, 5), (-3, 5)],
+        milk["id"]: [(-3, 2), (-1, 0)]
+    }
+    db_connection.execute("DELETE FROM quantity_history")
+    db_connection.executemany("INSERT INTO quantity_history VALUES (?, ?, ?)", [
+        (food_storage_id, reference + day * 86400, quantity)
+        for food_storage_id, points in history.items() for day, quantity in points
+    ])
+
+    forecast = forecast_depletion(db_connection, as_of="2030-01-10")
+    by_id = {item["id"]: item for item in forecast}
+    assert [item["id"] for item in forecast] == sorted(by_id)
+
+    # The restock on day -8 starts the fitted run: one kg a day, 6 kg left on day -2
+    assert by_id[rice["id"]]["daily_consumption"] == 1
+    assert by_id[rice["id"]]["depletion_date"] == "2030-01-15"
+    assert by_id[beans["id"]]["daily_consumption"] is None
+    assert by_id[beans["id"]]["depletion_date"] is None
+    assert by_id[milk["id"]]["depletion_date"] == "2030-01-10"
+    assert by_id[salt["id"]]["depletion_date"] is None
+
+    # Without numpy, the plain Python fallback fits the same rates
+    monkeypatch.setattr(food_storage_manager, "numpy", False)
+    assert forecast_depletion(db_connection, as_of="2030-01-10") == forecast
+
+    assert forecast_depletion(db_connection, history_days=0) == "Days must be greater than zero."
+    assert forecast_depletion(db_connection, as_of="10/01/2030") == "Dates must be in the format YYYY-MM-DD."
+
+
+# Testing change log functions
+
+def test_read_changes_since(db_connection):
+    sequence = read_last_change_sequence(db_connection)
+
+    food_type = create_food_type(db_connection, "Logged Grain")
+    rice = create_food_storage(db_connection, "Logged Rice", 1, "kg", food_type["id"], "2030-01-01")
+    beans = create_food_storage(db_connection, "Logged Beans", 2, "kg", food_type["id"], "2030-01-02")
+    update_food_storage_by_id(db_connection, rice["id"], "Logged Rice", 3, "kg", food_type["id"], "2030-01-01")
+    delete_food_storage_by_id(db_connection, beans["id"])
+
+    changes = read_changes_since(db_connection, sequence)
+    assert [(change["table_name"], change["id"], change["operation"]) for change in changes["changes"]] == [
+        ("food_type", food_type["id"], "insert"),
+        ("food_storage", rice["id"], "insert"),
+        ("food_storage", beans["id"], "insert"),
+        ("food_storage", rice["id"], "update"),
+        ("food_storage", beans["id"], "delete"),
+    ]
+    assert changes["complete"]
+    assert changes["last_sequence"] == read_last_change_sequence(db_connection)
+
+    # Reading in pages resumes after the last sequence returned
+    first_page = read_changes_since(db_connection, sequence, limit=2)
+    assert len(first_page["changes"]) == 2
+    assert read_changes_since(db_connection, first_page["last_sequence"])["changes"] == changes["changes"][2:]
+    assert read_changes_since(db_connection, changes["last_sequence"])["changes"] == []
+
+    # Deleted ids are skipped when reading the new values of the changed items
+    assert [item["id"] for item in read_food_storage_by_ids(db_connection, [beans["id"], rice["id"]])] == [rice["id"]]
+    assert read_food_storage_by_ids(db_connection, [rice["id"]])[0]["quantity"] == 3
+
+    # Once the changes are pruned, a reader behind them has to read everything again
+    assert prune_change_log(db_connection, -1) >= 5
+    assert not read_changes_since(db_connection, sequence)["complete"]
+    assert read_changes_since(db_connection, changes["last_sequence"])["complete"]
+    assert read_changes_since(db_connection, "first") == "Sequence and limit must be numbers."
+
+
+# Testing bulk functions for food storage
+
+def test_create_food_storage_many(db_connection):
+    created_food_type = create_food_type(db_connection, "Bulk Food Type")
+    count_before = len(read_all_food_storage(db_connection))
+
+    created_count = create_food_storage_many(db_connection, [
+        {"name": " Bulk Rice ", "quantity": "5", "unit": "Kg", "food_type_name": "Bulk Food Type",
+         "expiration_date": "2030-01-01"},
+        {"name": "Bulk Beans", "quantity": 2, "unit": "Kg", "food_type_id": created_food_type["id"],
+         "expiration_date": "2030-02-01"},
+    ])
+    assert created_count == 2
+
+    all_food_storage = read_all_food_storage(db_connection)
+    assert len(all_food_storage) == count_before + 2
+    names = [food_storage["name"] for food_storage in all_food_storage]
+    assert "Bulk Rice" in names
+    assert "Bulk Beans" in names
+
+    created_count = create_food_storage_many(db_connection, [
+        {"name": "Valid", "quantity": 1, "unit": "Kg", "food_type_id": created_food_type["id"],
+         "expiration_date": "2030-01-01"},
+        {"name": "", "quantity": 1, "unit": "Kg", "food_type_id": created_food_type["id"],
+         "expiration_date": "2030-01-01"},
+        {"name": "Wrong Type", "quantity": 1, "unit": "Kg", "food_type_name": "Invalid Food Type",
+         "expiration_date": "2030-01-01"},
+        {"name": "Wrong Date", "quantity": 1, "unit": "Kg", "food_type_id": created_food_type["id"],
+         "expiration_date": "2030-30-01"},
+    ])
+    assert created_count == "Row 2: Name cannot be empty.\n" \
+                            "Row 3: A food type with this name does not exist.\n" \
+                            "Row 4: Expiration Date must be in the format YYYY-MM-DD."
+    assert len(read_all_food_storage(db_connection)) == count_before + 2
+
+
+def test_validate_food_storage_batch(db_connection):
+    created_food_type = create_food_type(db_connection, "Validated Food Type")
+
+    report = validate_food_storage_batch(db_connection, [
+        {"name": " Valid ", "quantity": "1.5", "unit": "Kg", "food_type_name": "Validated Food Type",
+         "expiration_date": "2030-01-02"},
+        {"name": "", "quantity": "-1", "unit": " ", "food_type_id": 9999, "expiration_date": "2030-02-30"},
+        {"name": 5, "quantity": "nan", "unit": "Kg", "expiration_date": "2030-1-2"},
+    ])
+    assert report["row_count"] == 3
+    assert report["rows"] == [("Valid", 1.5, "Kg", created_food_type["id"], 21916)]
+    assert report["errors"] == [
+        {"row": 2, "field": "name", "message": "Name cannot be empty."},
+        {"row": 2, "field": "quantity", "message": "Quantity cannot be negative."},
+        {"row": 2, "field": "unit", "message": "Unit cannot be empty."},
+        {"row": 2, "field": "food_type_id", "message": "A food type with this id does not exist."},
+        {"row": 2, "field": "expiration_date", "message": "Expiration Date must be in the format YYYY-MM-DD."},
+        {"row": 3, "field": "name", "message": "Name must be text."},
+        {"row": 3, "field": "quantity", "message": "Quantity must be a number."},
+        {"row": 3, "field": "food_type_name", "message": "Food Type cannot be empty."},
+    ]
+    assert validate_food_storage_batch(db_connection, []) == {"row_count": 0, "rows": [], "errors": []}
+
+
+def test_import_food_storage_csv(db_connection, tmp_path):
+    create_food_type(db_connection, "Csv Food Type")
+    count_before = len(read_all_food_storage(db_connection))
+
+    csv_file = tmp_path / "food_storage.csv"
+    csv_file.write_text("name,quantity,unit,food_type_name,expiration_date\n"
+                        "Csv Rice,5,Kg,Csv Food Type,2030-01-01\n"
+                        "Csv Beans,2.5,Kg,Csv Food Type,2030-02-01\n")
+
+    assert import_food_storage_csv(db_connection, str(csv_file)) == 2
+    assert len(read_all_food_storage(db_connection)) == count_before + 2
+
+    csv_file.write_text("name,quantity,unit,food_type_name,expiration_date\n"
+                        "Csv Rice,-5,Kg,Csv Food Type,2030-01-01\n")
+    assert import_food_storage_csv(db_connection, str(csv_file)) == "Row 1: Quantity cannot be negative."
+
+
+def test_import_food_storage_json(db_connection, tmp_path):
+    create_food_type(db_connection, "Json Food Type")
+    count_before = len(read_all_food_storage(db_connection))
+
+    json_file = tmp_path / "food_storage.json"
+    json_file.write_text('[{"name": "Json Rice", "quantity": 5, "unit": "Kg", "food_type_name": "Json Food Type", '
+                         '"expiration_date": "2030-01-01"}]')
+
+    assert import_food_storage_json(db_connection, str(json_file)) == 1
+    assert len(read_all_food_storage(db_connection)) == count_before + 1
+
+    json_file.write_text('{"name": "Json Rice"}')
+    assert import_food_storage_json(db_connection, str(json_file)) == "The JSON file must contain a list of objects."
+
+    json_file.write_text('not json')
+    assert import_food_storage_json(db_connection, str(json_file)) == "The file is not valid JSON."
+
+
+def test_export_food_storage(db_connection, tmp_path):
+    food_type = create_food_type(db_connection, "Exported Type")
+    create_food_storage(db_connection, "Exported Item", 1.5, "Kg", food_type["id"], "2030-01-01")
+    count = count_food_storage(db_connection)
+
+    assert export_food_storage_csv(db_connection, str(tmp_path / "export.csv")) == count
+    assert export_food_storage_json(db_connection, str(tmp_path / "export.json")) == count
+
+    exported = json.loads((tmp_path / "export.json").read_text())
+    assert exported[-1]["name"] == "Exported Item"
+    assert exported[-1]["food_type_name"] == "Exported Type"
+
+    assert export_food_storage_jsonl(db_connection, str(tmp_path / "export.jsonl")) == count
+    assert export_food_storage_columnar(db_connection, str(tmp_path / "export.fsc")) == count
+
+    exported_lines = (tmp_path / "export.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in exported_lines] == exported
+
+    with open(tmp_path / "export.fsc", "rb") as columnar_file:
+        assert list(read_food_storage_columnar(columnar_file)) == exported
+
+    # Exported files can be imported again
+    assert import_food_storage_csv(db_connection, str(tmp_path / "export.csv")) == count
+    assert import_food_storage_json(db_connection, str(tmp_path / "export.json")) == count
+    assert import_food_storage_jsonl(db_connection, str(tmp_path / "export.jsonl")) == count
+    assert import_food_storage_columnar(db_connection, str(tmp_path / "export.fsc")) == count
+
+    (tmp_path / "truncated.fsc").write_bytes((tmp_path / "export.fsc").read_bytes()[:-10])
+    assert import_food_storage_columnar(db_connection, str(tmp_path / "truncated.fsc")) == \
+           "The file is not a valid columnar export."
+
+
+def test_export_food_storage_columnar_blocks(db_connection, tmp_path, monkeypatch):
+    monkeypatch.setattr(food_storage_manager, "COLUMNAR_BLOCK_SIZE", 2)
+    food_type = create_food_type(db_connection, "Columnar Type")
+    create_food_storage(db_connection, "Caf\u00e9 \u00e0 la cr\u00e8me", 0.25, "L", food_type["id"], "2030-01-01")
+    create_food_storage(db_connection, "", 1, "Kg", food_type["id"], "2030-01-01")
+    orphan = create_food_storage(db_connection, "Orphan", 3, "Kg", food_type["id"], "2030-01-02")
+    db_connection.execute("UPDATE food_storage SET food_type_id = 9999 WHERE id = ?", (orphan["id"],))
+
+    assert export_food_storage_columnar(db_connection, str(tmp_path / "export.fsc")) == \
+           count_food_storage(db_connection)
+
+    with open(tmp_path / "export.fsc", "rb") as columnar_file:
+        assert list(read_food_storage_columnar(columnar_file)) == [
+            {column: food_storage[column] for column in food_storage_manager.EXPORT_COLUMNS}
+            for food_storage in read_all_food_storage(db_connection)
+        ]
+
+
+# Testing the online backup
+
+def test_backup_database(tmp_path):
+    repository = FoodStorageRepository(str(tmp_path / "live.db"))
+    food_type = create_food_type(repository, "Backed Up Type")
+    create_food_storage(repository, "Backed Up Item", 1, "Kg", food_type["id"], "2030-01-01")
+
+    steps = []
+    backup = backup_database(repository, str(tmp_path / "backup.db"), pages=2,
+                             progress=lambda remaining, total: steps.append((remaining, total)))
+    assert backup["pages"] == steps[-1][1]
+    assert steps[-1][0] == 0
+    assert len(steps) > 1
+
+    backup_connection = sqlite3.connect(tmp_path / "backup.db")
+    assert backup_connection.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert backup_connection.execute("SELECT name FROM food_storage").fetchall() == [("Backed Up Item",)]
+    backup_connection.close()
+    assert not os.path.exists(tmp_path / "backup.db.partial")
+
+    assert backup_database(repository, str(tmp_path / "live.db")) == "Cannot back up the database onto itself."
+    assert backup_database(repository, str(tmp_path / "backup.db"), pages=0) == "Pages must be greater than zero."
+    repository.close()
+
+
+# Testing the command-line interface
+
+def test_command_line_interface(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(food_storage_manager, "DATABASE_PATH", str(tmp_path / "cli_food_storage.db"))
+
+    assert main(["add", "Apple", "2", "Kg", "Fruit", "2030-01-03"]) == 0
+    assert main(["add", "Old Milk", "1", "L", "Dairy", "2000-01-01"]) == 0
+    assert main(["add", "Pear", "1", "Kg", "Not A Type", "2030-01-01"]) == 1
+    assert "A food type with this name does not exist." in capsys.readouterr().err
+
+    assert main(["list", "--format", "json", "--sort-by", "expiration_date"]) == 0
+    assert [item["name"] for item in json.loads(capsys.readouterr().out)] == ["Old Milk", "Apple"]
+
+    assert main(["list", "--type", "Fruit"]) == 0
+    assert "Old Milk" not in capsys.readouterr().out
+
+    assert main(["expiring", "--days", "7", "--as-of", "2030-01-01", "--check"]) == 2
+    assert main(["expiring", "--days", "1", "--as-of", "2030-01-01", "--check"]) == 0
+    assert main(["expiring", "--as-of", "2030-01-01", "--expired", "--format", "csv"]) == 0
+    assert "Old Milk" in capsys.readouterr().out
+
+    assert main(["export", str(tmp_path / "export.csv")]) == 0
+    assert main(["import", "--check", str(tmp_path / "export.csv")]) == 0
+    assert "All 2 food storage items are valid." in capsys.readouterr().out
+    assert main(["backup", str(tmp_path / "backup.db")]) == 0
+    assert "Backed up" in capsys.readouterr().out
+    assert main(["import", str(tmp_path / "export.csv")]) == 0
+    assert "Imported 2 food storage items." in capsys.readouterr().out
+
+    assert main(["types", "--format", "json"]) == 0
+    fruit = next(item for item in json.loads(capsys.readouterr().out) if item["name"] == "Fruit")
+    assert fruit["item_count"] == 2
+
+    assert main(["totals", "--by", "name", "--type", "Fruit", "--format", "json"]) == 0
+    assert json.loads(capsys.readouterr().out) == [{"name": "Apple", "totals": {"kg": 4}}]
+
+    # The database served from memory is saved back on exit
+    monkeypatch.setattr(food_storage_manager, "DATABASE_IN_MEMORY", False)
+    assert main(["--in-memory", "add", "Plum", "1", "Kg", "Fruit", "2030-01-01"]) == 0
+    connection = sqlite3.connect(tmp_path / "cli_food_storage.db")
+    assert connection.execute("SELECT count(*) FROM food_storage WHERE name = 'Plum'").fetchone()[0] == 1
+    connection.close()
+
+
+def test_library_import_does_not_load_tkinter():
+    result = subprocess.run([sys.executable, "-c", "import sys, food_storage_manager; print('tkinter' in sys.modules)"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+
+    assert result.stdout.strip() == "False"
+
+
+# Testing the HTTP API
+
+def test_http_api(tmp_path, monkeypatch):
+    server = create_server("127.0.0.1", 0, str(tmp_path / "http_food_storage.db"))
+    server.quiet = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def request(method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        http_request = urllib.request.Request(base_url + path, data, headers or {}, method=method)
+        try:
+            with urllib.request.urlopen(http_request) as response:
+                return response.status, response.headers, json.loads(response.read() or b"null")
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, json.loads(e.read() or b"null")
+
+    try:
+        status, _, fruit = request("POST", "/food-types", {"name": "Fruit"})
+        assert status == 201 and fruit["name"] == "Fruit"
+        assert request("POST", "/food-types", {"name": "Fruit"})[0] == 400
+
+        for name in ["Apple", "Banana", "Cherry"]:
+            status, _, item = request("POST", "/food-storage", {"name": name, "quantity": 1, "unit": "Kg",
+                                                                 "food_type_id": fruit["id"],
+                                                                 "expiration_date": "2030-01-01"})
+            assert status == 201
+
+        # Keyset pagination
+        status, headers, page = request("GET", "/food-storage?limit=2")
+        assert [item["name"] for item in page["food_storage"]] == ["Apple", "Banana"]
+        next_page = request("GET", "/food-storage?limit=2&cursor=" + urllib.parse.quote(page["next_cursor"]))[2]
+        assert [item["name"] for item in next_page["food_storage"]] == ["Cherry"]
+
+        # An unchanged poll is answered from the data version, without querying the database
+        etag = headers["ETag"]
+        reset_instrumentation()
+        enable_instrumentation()
+        try:
+            assert request("GET", "/food-storage?limit=2", headers={"If-None-Match": etag})[0] == 304
+            assert request("GET", "/food-storage?limit=2",
+                           headers={"If-Modified-Since": headers["Last-Modified"]})[0] == 304
+        finally:
+            disable_instrumentation()
+        assert read_instrumentation()["operations"] == []
+
+        assert request("PUT", f"/food-storage/{item['id']}", {"name": "Cherries", "quantity": 2, "unit": "Kg",
+                                                               "food_type_id": fruit["id"],
+                                                               "expiration_date": "2030-01-02"})[0] == 200
+        status, headers, _ = request("GET", "/food-storage?limit=2", headers={"If-None-Match": etag})
+        assert status == 200 and headers["ETag"] != etag
+
+        assert request("GET", f"/food-storage/{item['id']}")[2]["name"] == "Cherries"
+        assert request("DELETE", f"/food-storage/{item['id']}")[0] == 200
+        assert request("GET", f"/food-storage/{item['id']}")[0] == 404
+        assert request("DELETE", f"/food-storage/{item['id']}")[0] == 404
+        assert request("PUT", "/food-types/9999", {"name": "Missing"})[0] == 404
+        assert request("GET", "/food-types?limit=1")[2] == {"food_types": [fruit], "next_offset": None}
+        assert request("DELETE", "/food-types")[0] == 405
+        assert request("GET", "/nothing")[0] == 404
+
+        # Values of the wrong type are answered with 400, unexpected failures with 500
+        assert request("POST", "/food-types", {"name": 5}) == (400, unittest.mock.ANY, {"error": "name must be text."})
+        assert request("PUT", f"/food-types/{fruit['id']}", {"name": ["x"]})[0] == 400
+        assert request("POST", "/food-storage", {"name": "Plum", "quantity": [1], "unit": "Kg",
+                                                 "food_type_id": fruit["id"], "expiration_date": "2030-01-01"})[0] == 400
+        assert request("GET", "/food-storage?cursor=" + urllib.parse.quote("[[1],[2]]")) == \
+               (400, unittest.mock.ANY, {"error": "Invalid page cursor."})
+
+        def fail(handler):
+            raise RuntimeError("Unexpected")
+
+        monkeypatch.setattr(FoodStorageRequestHandler, "list_food_types", fail)
+        assert request("GET", "/food-types") == (500, unittest.mock.ANY, {"error": "Internal server error."})
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.repository.close()
+
+
+# Testing instrumentation
+
+def test_instrumentation(db_connection, tmp_path):
+    reset_instrumentation()
+    read_all_food_storage(db_connection)
+    assert read_instrumentation()["operations"] == []
+
+    enable_instrumentation()
+    try:
+        seed_food_types(db_connection)
+        food_type = read_food_type_by_name(db_connection, "Other")
+        create_food_storage(db_connection, "Traced Item", 1, "Kg", food_type["id"], "2030-01-01")
+        create_food_storage(db_connection, "Traced Item", 1, "Kg", -1, "2030-01-01")
+        read_all_food_storage(db_connection)
+    finally:
+        disable_instrumentation()
+
+    snapshot = read_instrumentation()
+    operations = {operation["operation"]: operation for operation in snapshot["operations"]}
+
+    assert operations["crud:create_food_storage"]["count"] == 2
+    assert operations["crud:create_food_storage"]["errors"] == 1
+    # The item, its search index entry and its food type summary
+    assert operations["crud:create_food_storage"]["changes"] >= 3
+    assert operations["crud:read_all_food_storage"]["rows"] == count_food_storage(db_connection)
+    assert operations["crud:read_all_food_storage"]["p50_ms"] <= operations["crud:read_all_food_storage"]["max_ms"]
+    assert sum(operations["crud:read_all_food_storage"]["buckets"].values()) == 1
+
+    # The bound values are masked, so both inserts share one statement
+    inserts = [statement for statement in snapshot["statements"]
+               if statement["operation"] == "crud:create_food_storage" and
+               statement["statement"].startswith("INSERT INTO food_storage")]
+    assert len(inserts) == 1
+    assert "'Traced Item'" in "".join(statement["statement"] for statement in snapshot["recent_statements"])
+
+    dump_instrumentation(str(tmp_path / "instrumentation.json"))
+    dump_instrumentation(str(tmp_path / "instrumentation.csv"))
+    assert "crud:create_food_storage" in (tmp_path / "instrumentation.json").read_text()
+    assert (tmp_path / "instrumentation.csv").read_text().startswith("operation,count,errors")
+
+    reset_instrumentation()
+    assert read_instrumentation()["statements"] == []
+
+
+# Testing the benchmark suite
+
+def test_benchmark_size():
+    results = benchmark_size(300, repeat=2, max_seconds=0, min_samples=1)
+
+    operations = {result["operation"] for result in results}
+    assert {"seed_food_types", "reassign_orphaned_food_storage", "read_all_food_storage"} <= operations
+    assert all(result["rows"] == 300 and result["samples"] == 1 for result in results)
+
+
+
 pytest.main(["-v", "--tb=line", "-rN", __file__])